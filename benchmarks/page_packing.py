@@ -0,0 +1,85 @@
+"""Measures Bitmap.get_bitmap page packing throughput
+
+Compares the per-bit packing loop that get_bitmap used to run against the
+current band transposing packer, on a random 128x64 frame. A PAGE_LAYOUT
+bitmap, which needs no packing, is timed as well. When gaugette is not
+installed the package falls back to its stand-in in
+ssd1306extras.fake_gaugette.
+
+Usage::
+
+    python benchmarks/page_packing.py [frames]
+"""
+import os
+import random
+import sys
+import timeit
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ssd1306extras import bitmap  # noqa: E402
+
+
+WIDTH = 128
+HEIGHT = 64
+
+
+def per_bit_pack(bmap):
+    """The original per-bit packing loop, kept as the reference implementation
+    """
+    width = bmap.width
+    page_size = width * 8
+    gaug_bytes = bytearray(width * bmap.height / 8)
+
+    for i, bit in enumerate(bmap.bits):
+        if bit:
+            page = i / page_size
+            bit_shift = (i % page_size) / width
+            byte_pos = i % width + (page * width)
+            gaug_bytes[byte_pos] = gaug_bytes[byte_pos] | (0x01 << bit_shift)
+
+    return gaug_bytes
+
+
+def random_bitmap(width, height, seed=1306):
+    bmap = bitmap.Bitmap(width, height)
+    rand = random.Random(seed)
+    for i in range(len(bmap.bits)):
+        bmap.bits[i] = rand.random() < 0.5
+    return bmap
+
+
+def page_layout_copy(bmap):
+    page_bmap = bitmap.Bitmap(bmap.width, bmap.height, bitmap.PAGE_LAYOUT)
+    page_bmap.draw_bitmap(bmap)
+    return page_bmap
+
+
+def frames_per_second(func, frames):
+    seconds = min(timeit.repeat(func, number=frames, repeat=3))
+    return frames / seconds
+
+
+def main(frames=200):
+    bmap = random_bitmap(WIDTH, HEIGHT)
+    page_bmap = page_layout_copy(bmap)
+
+    if per_bit_pack(bmap) != bmap.get_bitmap().data:
+        raise AssertionError('Packed output differs from the per-bit reference')
+    if page_bmap.get_bitmap().data != bmap.get_bitmap().data:
+        raise AssertionError('Page layout output differs from the row layout')
+
+    before = frames_per_second(lambda: per_bit_pack(bmap), frames)
+    after = frames_per_second(bmap.get_bitmap, frames)
+    page_layout = frames_per_second(page_bmap.get_bitmap, frames)
+
+    print('{0}x{1} frame, {2} frames per run'.format(WIDTH, HEIGHT, frames))
+    print('per-bit loop:   {0:10.1f} frames/sec'.format(before))
+    print('band transpose: {0:10.1f} frames/sec'.format(after))
+    print('page layout:    {0:10.1f} frames/sec'.format(page_layout))
+    print('speedup:        {0:10.1f}x / {1:.1f}x'.format(after / before, page_layout / before))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,417 @@
+"""Measures the speed of the rendering pipeline against a fake display
+
+Covers bitmap blits, page packing, text rasterization, menu scrolling, panel
+compositing and presenting a full frame. When gaugette is not installed the
+package falls back to its stand-in in ssd1306extras.fake_gaugette, so the
+suite runs on any machine.
+
+Each benchmark reports operations per second, the best of several runs, and
+the memory one operation allocates. Where tracemalloc is available this is
+the peak traced memory. Python 2 has no tracemalloc, so there it is the size
+of the objects the operation leaves allocated, its result included, found by
+comparing gc.get_objects() before and after. The two are not comparable, so
+the method is saved with the results.
+
+Results can be saved as a baseline and later runs compared against it. The
+comparison exits with status 1 when a benchmark got slower, or allocates
+more, by more than the threshold, so it can gate a change.
+
+Usage::
+
+    python benchmarks/suite.py [-k NAME] [--save FILE] [--compare FILE] [--threshold 0.1]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+# Run from a checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ssd1306extras import bitmap, glyph, menu, panel, ssd1306, textcache, widget  # noqa: E402
+from ssd1306extras.util import text  # noqa: E402
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# Fonts tried in turn when --font is not given. PIL's built in font is used if
+# none exist, and the glyph atlas benchmark is skipped.
+FONT_FILES = ['/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf',
+              '/usr/share/fonts/TTF/DejaVuSansMono.ttf',
+              '/Library/Fonts/Courier New.ttf']
+
+WIDTH = 128
+HEIGHT = 64
+
+# Minimum seconds a timed run lasts, the number of operations is raised until it does
+MIN_RUN_SECONDS = 0.2
+
+REPEAT = 3
+
+# Allocation growth below this many kilobytes is never reported as a regression
+ALLOC_SLACK_KB = 0.5
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Registers a benchmark
+
+    The decorated function does the setup and returns the operation to time,
+    or None if the benchmark cannot run here.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def random_bitmap(width, height, layout=bitmap.ROW_LAYOUT, seed=1306):
+    bmap = bitmap.Bitmap(width, height, layout)
+    rand = random.Random(seed)
+    for i in range(width * height):
+        bmap.bits[i] = rand.random() < 0.5
+    return bmap
+
+
+def create_display():
+    return ssd1306.SSD1306(rows=HEIGHT, cols=WIDTH)
+
+
+@benchmark('blit.row_to_page')
+def blit_row_to_page(font_file):
+    dest = bitmap.Bitmap(WIDTH, HEIGHT, bitmap.PAGE_LAYOUT)
+    source = random_bitmap(40, 20)
+    return lambda: dest.draw_bitmap(source, 13, 5)
+
+
+@benchmark('blit.page_to_page')
+def blit_page_to_page(font_file):
+    dest = bitmap.Bitmap(WIDTH, HEIGHT, bitmap.PAGE_LAYOUT)
+    source = random_bitmap(64, 16, bitmap.PAGE_LAYOUT)
+    return lambda: dest.draw_bitmap(source, 32, 16)
+
+
+@benchmark('blit.bit_array_or')
+def blit_bit_array(font_file):
+    dest = bitmap.Bitmap(WIDTH, HEIGHT)
+    source = random_bitmap(12, 14)
+    return lambda: dest.draw_bit_array(source.bits, 50, 9, 12, 14, op=bitmap.OP_OR)
+
+
+@benchmark('pack.row_layout')
+def pack_row_layout(font_file):
+    return random_bitmap(WIDTH, HEIGHT).get_bitmap
+
+
+@benchmark('pack.page_layout')
+def pack_page_layout(font_file):
+    return random_bitmap(WIDTH, HEIGHT, bitmap.PAGE_LAYOUT).get_bitmap
+
+
+@benchmark('pack.dirty_blocks')
+def pack_dirty_blocks(font_file):
+    bmap = random_bitmap(WIDTH, HEIGHT, bitmap.PAGE_LAYOUT)
+
+    def operation():
+        bmap.mark_dirty(20, 4, 60, 20)
+        bmap.get_dirty_blocks()
+    return operation
+
+
+@benchmark('text.pil')
+def text_pil(font_file):
+    margin = text.find_top_margin(font_file, 12, 16)
+    return lambda: text.image('Benchmark 1306', font_file, 12, WIDTH, 16, expand=True, margin=margin)
+
+
+@benchmark('text.cache_hit')
+def text_cache_hit(font_file):
+    margin = text.find_top_margin(font_file, 12, 16)
+    return lambda: textcache.render('Benchmark 1306', font_file, 12, WIDTH, 16, expand=True, margin=margin)
+
+
+@benchmark('text.glyph_atlas')
+def text_glyph_atlas(font_file):
+    if font_file is None:
+        return None
+    margin = text.find_top_margin(font_file, 12, 16)
+    glyph.render('Benchmark 1306', font_file, 12, WIDTH, 16, expand=True, margin=margin)
+    return lambda: glyph.render('Benchmark 1306', font_file, 12, WIDTH, 16, expand=True, margin=margin)
+
+
+@benchmark('menu.scroll')
+def menu_scroll(font_file):
+    item_list = ['Item {0}'.format(i) for i in range(40)]
+    text_menu = menu.TextListMenu(create_display(), item_list)
+    if font_file is not None:
+        text_menu.set_font(font_file, 12)
+    text_menu.draw()
+
+    # Walks down the list and back up again
+    state = {'step': 1}
+
+    def operation():
+        if text_menu.selected_index + state['step'] not in range(len(item_list)):
+            state['step'] = -state['step']
+        if state['step'] > 0:
+            text_menu.next()
+        else:
+            text_menu.prev()
+    return operation
+
+
+def create_panel(font_file):
+    test_panel = panel.Panel(create_display())
+    label = widget.TextWidget(WIDTH, 16)
+    label.font_file = font_file
+    label.text = 'Volume'
+    progress = widget.ProgressWidget(WIDTH, 8)
+    test_panel.add_widget(label, 0, 0)
+    test_panel.add_widget(progress, 0, 24)
+    test_panel.draw()
+
+    # Alternates between two readings so every operation changes the panel
+    readings = [0.25, 0.75]
+    state = {'frame': 0}
+
+    def update():
+        state['frame'] += 1
+        progress.percent = readings[state['frame'] % 2]
+    return test_panel, update
+
+
+@benchmark('panel.composite')
+def panel_composite(font_file):
+    test_panel, update = create_panel(font_file)
+
+    def operation():
+        update()
+        test_panel.bitmap
+    return operation
+
+
+@benchmark('panel.present')
+def panel_present(font_file):
+    test_panel, update = create_panel(font_file)
+
+    def operation():
+        update()
+        test_panel.draw()
+    return operation
+
+
+@benchmark('panel.present_full')
+def panel_present_full(font_file):
+    test_panel, update = create_panel(font_file)
+    return lambda: test_panel.draw(refresh=True)
+
+
+def ops_per_second(operation):
+    """Returns the best rate of several runs of an operation
+    """
+    number = 1
+    while True:
+        seconds = timeit.timeit(operation, number=number)
+        if seconds >= MIN_RUN_SECONDS:
+            break
+        number *= 2 if seconds <= 0 else max(2, int(MIN_RUN_SECONDS / seconds) + 1)
+
+    best = min([seconds] + timeit.repeat(operation, number=number, repeat=REPEAT - 1))
+    return number / best
+
+
+# How allocated_kb measures on this interpreter
+ALLOC_METHOD = 'retained' if tracemalloc is None else 'peak'
+
+
+def allocated_kb(operation):
+    """Returns the kilobytes an operation allocates
+
+    Returns:
+        Peak traced memory above the starting point while running the
+        operation once, or without tracemalloc, the size of the objects it
+        leaves allocated
+    """
+    if tracemalloc is None:
+        return retained_kb(operation)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return (peak - start) / 1024.0
+
+
+def retained_kb(operation):
+    """Returns the kilobytes of the objects an operation leaves allocated
+
+    Counts the objects the garbage collector tracks that are new after
+    running the operation once, along with the new objects they refer to
+    directly, such as the bitarray of a new Bitmap. Objects freed before the
+    operation returns are not seen.
+    """
+    gc.collect()
+    gc.disable()
+    try:
+        # Keeping the old objects alive stops their ids being reused
+        old_objects = gc.get_objects()
+        old_ids = set(id(obj) for obj in old_objects)
+        old_ids.update([id(old_objects), id(old_ids)])
+
+        result = operation()
+        new_objects = [obj for obj in gc.get_objects() if id(obj) not in old_ids]
+        if result is not None and id(result) not in old_ids:
+            new_objects.append(result)
+
+        # Untracked objects, such as strings and bitarrays, are only found
+        # through the new objects that refer to them
+        counted = set()
+        size = 0
+        for obj in new_objects:
+            for item in [obj] + gc.get_referents(obj):
+                if id(item) in counted or id(item) in old_ids or item is new_objects:
+                    continue
+                if item is not obj and gc.is_tracked(item):
+                    continue
+                counted.add(id(item))
+                size += sys.getsizeof(item)
+    finally:
+        gc.enable()
+
+    return size / 1024.0
+
+
+def find_font():
+    for font_file in FONT_FILES:
+        if os.path.isfile(font_file):
+            return font_file
+    return None
+
+
+def run(names=None, font_file=None):
+    """Runs the benchmarks
+
+    Args:
+        names (list): Substrings selecting the benchmarks to run, all run if empty
+        font_file (str): Font for the text benchmarks
+
+    Returns:
+        Dict of ops_per_sec and alloc_kb keyed by benchmark name
+    """
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and not any(selected in name for selected in names):
+            continue
+
+        operation = setup(font_file)
+        if operation is None:
+            print('{0:24} skipped'.format(name))
+            continue
+
+        rate = ops_per_second(operation)
+        alloc = allocated_kb(operation)
+        results[name] = {'ops_per_sec': rate, 'alloc_kb': alloc}
+        print('{0:24} {1:12.1f} ops/sec {2:>10} KB {3}'.format(name, rate, _format_alloc(alloc), ALLOC_METHOD))
+
+    return results
+
+
+def compare(results, baseline, threshold, compare_alloc=True):
+    """Prints each benchmark's change against a baseline
+
+    Args:
+        results (dict): Results of this run
+        baseline (dict): Saved results
+        threshold (float): Slowdown or allocation growth, as a fraction,
+            reported as a regression
+        compare_alloc (bool): If False, only speed is compared, as when the
+            baseline measured allocations another way
+
+    Returns:
+        List of the names of benchmarks that got slower, or allocate more,
+        by more than threshold
+    """
+    regressions = []
+    print('')
+    print('{0:24} {1:>14} {2:>14} {3:>8} {4:>12} {5:>12}'.format('benchmark', 'baseline', 'current', 'change',
+                                                             'baseline KB', 'current KB'))
+
+    for name in sorted(results):
+        if name not in baseline:
+            print('{0:24} {1:>14} {2:14.1f}'.format(name, 'new', results[name]['ops_per_sec']))
+            continue
+
+        before = baseline[name]['ops_per_sec']
+        after = results[name]['ops_per_sec']
+        change = (after - before) / before
+        flags = []
+        if change < -threshold:
+            flags.append('SLOWER')
+
+        alloc_before = baseline[name].get('alloc_kb')
+        alloc_after = results[name]['alloc_kb']
+        if compare_alloc and alloc_before is not None and alloc_after is not None and \
+                alloc_after > alloc_before * (1 + threshold) + ALLOC_SLACK_KB:
+            flags.append('ALLOCATES MORE')
+
+        if flags:
+            regressions.append(name)
+        print('{0:24} {1:14.1f} {2:14.1f} {3:+7.1%} {4:>12} {5:>12}{6}'.format(
+            name, before, after, change, _format_alloc(alloc_before), _format_alloc(alloc_after),
+            ''.join('  ' + flag for flag in flags)))
+
+    return regressions
+
+
+def _format_alloc(alloc):
+    return 'n/a' if alloc is None else '{0:.2f}'.format(alloc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the ssd1306extras rendering pipeline')
+    parser.add_argument('-k', dest='names', action='append', default=[],
+                        help='Only run benchmarks whose name contains this, may be repeated')
+    parser.add_argument('--font', default=None, help='Font file for the text benchmarks')
+    parser.add_argument('--save', metavar='FILE', help='Save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='Compare the results against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Slowdown or allocation growth, as a fraction, reported as a regression (default 0.1)')
+    args = parser.parse_args(argv)
+
+    font_file = args.font or find_font()
+    print('Python {0}, font {1}, {2} allocations'.format(platform.python_version(), font_file or 'built in',
+                                                         ALLOC_METHOD))
+
+    results = run(args.names, font_file)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'font': font_file, 'alloc_method': ALLOC_METHOD,
+                       'results': results}, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        same_method = baseline.get('alloc_method') == ALLOC_METHOD
+        if not same_method:
+            print('Baseline measured allocations differently, only comparing speed')
+        if compare(results, baseline['results'], args.threshold, compare_alloc=same_method):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
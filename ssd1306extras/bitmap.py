@@ -4,70 +4,283 @@ from bitarray import bitarray
 import ssd1306extras.ssd1306
 
 
+# Pixels are stored row after row, one bit per pixel
+ROW_LAYOUT = 'row'
+
+# Pixels are stored in the SSD1306 page layout: one byte per column for every
+# band of 8 rows, with the top row of the band in the least significant bit
+PAGE_LAYOUT = 'page'
+
+# Raster operations for combining drawn pixels with the pixels under them
+OP_COPY = 'copy'
+OP_OR = 'or'
+OP_AND_NOT = 'and_not'
+OP_XOR = 'xor'
+
+
 class Bitmap(object):
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, layout=ROW_LAYOUT):
+        """Creates an empty bitmap
+
+        Args:
+            width (int): Number of columns
+            height (int): Number of rows
+            layout (str): ROW_LAYOUT or PAGE_LAYOUT. A PAGE_LAYOUT bitmap keeps
+                its bits in the order the display expects, so get_bitmap does
+                not need to convert them.
+        """
+        if layout not in (ROW_LAYOUT, PAGE_LAYOUT):
+            raise ValueError('Unknown bitmap layout: {0}'.format(layout))
+
         self.width = width
         self.height = height
-        self.bits = bitarray(width * height)
+        self.layout = layout
+
+        if layout == PAGE_LAYOUT:
+            self.bits = bitarray(width * self.page_count * 8, endian='little')
+        else:
+            self.bits = bitarray(width * height)
         self.bits.setall(False)
 
-    def draw_image(self, image, x=0, y=0, invert=False):
+        # Column spans changed since the last get_dirty_blocks, keyed by page.
+        # A new bitmap has never been displayed so it starts out dirty.
+        self._dirty = {}
+        self.mark_dirty(0, 0, width, height)
+
+    @property
+    def page_count(self):
+        """Number of 8 row display pages needed to hold the bitmap
+        """
+        return (self.height + 7) / 8
+
+    def draw_image(self, image, x=0, y=0, invert=False, box=None):
         """Adds a PIL Image file to the bitmap
 
+        A mode 1 image is read from its packed bytes, without creating a
+        Python object per pixel. Other modes are read pixel by pixel, with any
+        non zero pixel set.
+
         Args:
             image (Image): Mode 1 PIL Image
             x (int): Horizontal start position for image
             y (int): Vertical start position for image
+            invert (bool): If True, the image is drawn inverted
+            box (tuple): Optional (left, upper, right, lower) area of the
+                image to draw, as used by Image.crop
         """
         image_width, image_height = image.size
-        image_bit_array = bitarray([byte for byte in image.getdata()])
+
+        if image.mode == '1':
+            # Rows of a mode 1 image are packed most significant bit first
+            # and padded to a whole byte
+            image_bit_array = bitarray(endian='big')
+            image_bit_array.frombytes(image.tobytes())
+            stride = ((image_width + 7) / 8) * 8
+        else:
+            image_bit_array = bitarray([byte for byte in image.getdata()])
+            stride = image_width
 
         if invert:
             image_bit_array.invert()
 
-        self.draw_bit_array(image_bit_array, x, y, image_width, image_height)
+        if box is None:
+            box = (0, 0, image_width, image_height)
+
+        left, upper, right, lower = box
+        self.draw_bit_array(image_bit_array, x, y, right - left, lower - upper, stride=stride,
+                            offset=(upper * stride) + left)
 
-    def draw_bitmap(self, bitmap, x=0, y=0):
+    def draw_bitmap(self, bitmap, x=0, y=0, op=OP_COPY, mask=None):
         """Adds a Bitmap to the bitmap
 
         Args:
             bitmap (Bitmap): Bitmap to add to the current bitmap
             x (int): Horizontal start position for image
             y (int): Vertical start position for image
+            op (str): Raster operation combining the bitmap with the pixels
+                under it, one of OP_COPY, OP_OR, OP_AND_NOT or OP_XOR
+            mask (Bitmap): Optional bitmap the size of bitmap. Only pixels
+                set in the mask are drawn.
         """
-        self.draw_bit_array(bitmap.bits, x, y, bitmap.width, bitmap.height)
+        if bitmap.layout == ROW_LAYOUT and (mask is None or mask.layout == ROW_LAYOUT):
+            self.draw_bit_array(bitmap.bits, x, y, bitmap.width, bitmap.height, op=op,
+                                mask=mask.bits if mask is not None else None)
+            return
 
-    def draw_bit_array(self, bit_array, x, y, array_width, array_height):
+        if self.layout == PAGE_LAYOUT and bitmap.layout == PAGE_LAYOUT and not y % 8 and \
+                (mask is None or mask.layout == PAGE_LAYOUT):
+            self._draw_pages(bitmap, x, y, op, mask)
+            return
 
-        # Calculate the number of columns that fit on the bitmap
-        draw_cols = array_width if array_width + x < self.width else (self.width - x)
+        def source_row(row, col, count):
+            return bitmap.bits[bitmap._row_slice(row, col, count)]
 
-        # Calculate the number of rows that fit on the bitmap
-        draw_rows = array_height if array_height + y < self.height else (self.height - y)
+        mask_row = None
+        if mask is not None:
+            def mask_row(row, col, count):
+                return mask.bits[mask._row_slice(row, col, count)]
 
-        image_col_start = 0
-        # Adjust image start position and number of columns if negative horizontal position
-        if x < 0:
-            image_col_start = abs(x)
-            draw_cols = array_width - image_col_start
-            x = 0
+        self._draw_rows(source_row, x, y, bitmap.width, bitmap.height, op, mask_row)
 
-        image_row_start = 0
-        # Adjust image starting row for negative vertical position
-        if y < 0:
-            image_row_start = abs(y)
+    def draw_bit_array(self, bit_array, x, y, array_width, array_height, stride=None, offset=0, op=OP_COPY,
+                       mask=None):
+        """Adds a row ordered bitarray to the bitmap
+
+        Args:
+            bit_array (bitarray): Bits for the area being drawn, row after row
+            x (int): Horizontal start position for the area
+            y (int): Vertical start position for the area
+            array_width (int): Number of columns in the area
+            array_height (int): Number of rows in the area
+            stride (int): Number of bits from the start of one row to the
+                next, defaults to array_width. Use this to draw rows padded
+                to a byte boundary, or part of a wider array.
+            offset (int): Index of the area's first bit in bit_array
+            op (str): Raster operation combining the area with the pixels
+                under it, one of OP_COPY, OP_OR, OP_AND_NOT or OP_XOR
+            mask (bitarray): Optional bits laid out like bit_array. Only
+                pixels set in the mask are drawn.
+        """
+        if stride is None:
+            stride = array_width
+
+        def source_row(row, col, count):
+            start = offset + (row * stride) + col
+            return bit_array[start:start + count]
+
+        mask_row = None
+        if mask is not None:
+            def mask_row(row, col, count):
+                start = offset + (row * stride) + col
+                return mask[start:start + count]
+
+        self._draw_rows(source_row, x, y, array_width, array_height, op, mask_row)
+
+    def invert_block(self, x, y, width, height):
+        """Inverts the pixels of a block, such as a selection highlight
+
+        Args:
+            x (int): Starting column to invert
+            y (int): Starting row to invert
+            width (int): Number of columns to invert
+            height (int): Number of rows to invert
+        """
+        ones = bitarray(max(0, width))
+        ones.setall(True)
+
+        def source_row(row, col, count):
+            return ones[:count]
+
+        self._draw_rows(source_row, x, y, width, height, OP_XOR)
+
+    def _draw_rows(self, source_row, x, y, source_width, source_height, op=OP_COPY, mask_row=None):
+        """Draws rows from a source onto the bitmap, clipping to the bitmap edges
+
+        Args:
+            source_row (function): Called with (row, col, count), returns a
+                bitarray of count bits from the source row starting at col
+            x (int): Horizontal start position for the source
+            y (int): Vertical start position for the source
+            source_width (int): Number of columns in the source
+            source_height (int): Number of rows in the source
+            op (str): Raster operation
+            mask_row (function): Like source_row, for the mask, or None
+        """
+        col_start = max(0, -x)
+        col_end = min(source_width, self.width - x)
+        row_start = max(0, -y)
+        row_end = min(source_height, self.height - y)
+
+        draw_cols = col_end - col_start
+        if draw_cols <= 0:
+            return
+
+        self._copy_rows(source_row, range(row_start, row_end), y, col_start, x, draw_cols, op, mask_row)
+
+    def _copy_rows(self, source_row, rows, y, col_start, x, draw_cols, op=OP_COPY, mask_row=None):
+        """Draws already clipped source rows, marking the rows that change as dirty
+        """
+        changed_rows = []
+        for row in rows:
+            row_slice = self._row_slice(row + y, col_start + x, draw_cols)
+            row_bits = source_row(row, col_start, draw_cols)
+
+            if op != OP_COPY or mask_row is not None:
+                mask_bits = mask_row(row, col_start, draw_cols) if mask_row is not None else None
+                row_bits = _raster_op(op, self.bits[row_slice], row_bits, mask_bits)
+
+            if self.bits[row_slice] != row_bits:
+                self.bits[row_slice] = row_bits
+                changed_rows.append(row + y)
+
+        if changed_rows:
+            self.mark_dirty(col_start + x, changed_rows[0], draw_cols, changed_rows[-1] - changed_rows[0] + 1)
+
+    def _draw_pages(self, bitmap, x, y, op=OP_COPY, mask=None):
+        """Draws a PAGE_LAYOUT bitmap onto this PAGE_LAYOUT bitmap a page at a time
+
+        Only used when y falls on a page boundary so both bitmaps share their
+        page alignment. Each column of a page is a whole byte in both bitmaps,
+        so raster operations work on whole bytes. A page that would only be
+        partly drawn falls back to drawing rows.
+        """
+        col_start = max(0, -x)
+        col_end = min(bitmap.width, self.width - x)
+        draw_cols = col_end - col_start
+        if draw_cols <= 0:
+            return
+
+        for page in range(max(0, -y) / 8, bitmap.page_count):
+            row = page * 8
+            if row + y >= self.height:
+                break
+
+            if row + 8 > bitmap.height or row + y + 8 > self.height:
+                def source_row(row, col, count):
+                    return bitmap.bits[bitmap._row_slice(row, col, count)]
+
+                mask_row = None
+                if mask is not None:
+                    def mask_row(row, col, count):
+                        return mask.bits[mask._row_slice(row, col, count)]
+
+                self._copy_rows(source_row, range(row, min(bitmap.height, self.height - y)), y, col_start, x,
+                                draw_cols, op, mask_row)
+                break
 
-        start_row = (y * self.width) + x
+            start = (((row + y) / 8 * self.width) + col_start + x) * 8
+            end = start + (draw_cols * 8)
+            source_start = ((page * bitmap.width) + col_start) * 8
+            page_bits = bitmap.bits[source_start:source_start + (draw_cols * 8)]
 
-        for i in range(image_row_start, draw_rows):
-            image_start = (i * array_width) + image_col_start
-            image_end = image_start + draw_cols
+            if op != OP_COPY or mask is not None:
+                mask_bits = mask.bits[source_start:source_start + (draw_cols * 8)] if mask is not None else None
+                page_bits = _raster_op(op, self.bits[start:end], page_bits, mask_bits)
 
-            start = (i * self.width) + start_row
-            end = start + draw_cols
+            if self.bits[start:end] != page_bits:
+                self.bits[start:end] = page_bits
+                self.mark_dirty(col_start + x, row + y, draw_cols, 8)
 
-            self.bits[start:end] = bit_array[image_start:image_end]
+    def _row_slice(self, row, col, count):
+        """Returns the slice of self.bits holding count pixels of a row
+
+        Args:
+            row (int): Row of the pixels
+            col (int): Column of the first pixel
+            count (int): Number of pixels
+        """
+        if self.layout == PAGE_LAYOUT:
+            start = ((((row / 8) * self.width) + col) * 8) + (row % 8)
+            return slice(start, start + (count * 8), 8)
+
+        start = (row * self.width) + col
+        return slice(start, start + count)
+
+    def get_pixel(self, x, y):
+        """Returns True if the pixel at the given position is set
+        """
+        return self.bits[self._row_slice(y, x, 1).start]
 
     def draw_rect(self, x, y, width, height):
         self.set_pixels(x, y, width, height, True)
@@ -101,35 +314,152 @@ class Bitmap(object):
         if height + y > self.height:
             height = self.height - y
 
+        if width <= 0 or height <= 0:
+            return
+
+        changed_rows = []
         for row in range(y, y + height):
-            start = (row * self.width) + y
-            end = start + width
-            self.bits[start:end] = status
+            row_slice = self._row_slice(row, x, width)
+            row_bits = self.bits[row_slice]
+            if (row_bits.all() if status else not row_bits.any()):
+                continue
+            self.bits[row_slice] = status
+            changed_rows.append(row)
+
+        if changed_rows:
+            self.mark_dirty(x, changed_rows[0], width, changed_rows[-1] - changed_rows[0] + 1)
 
     def copy(self):
         """Returns a copy of this bitmap
         """
-        new_bitmap = Bitmap(self.width, self.height)
+        new_bitmap = Bitmap(self.width, self.height, self.layout)
         new_bitmap.bits = self.bits.copy()
+        new_bitmap._dirty = dict((page, list(span)) for page, span in self._dirty.items())
         return new_bitmap
 
+    def crop(self, x, y, width, height):
+        """Returns a new bitmap holding an area of this one
+
+        Parts of the area outside this bitmap are left blank.
+
+        Args:
+            x (int): Column of the left of the area
+            y (int): Row of the top of the area
+            width (int): Width of the area
+            height (int): Height of the area
+        """
+        cropped = Bitmap(width, height, self.layout)
+        cropped.draw_bitmap(self, -x, -y)
+        cropped.mark_clean()
+        return cropped
+
     def invert(self):
         """Inverts the bitmap
         """
         self.bits.invert()
 
+        # Keep the rows padding out the last page blank
+        if self.layout == PAGE_LAYOUT:
+            for row in range(self.height, self.page_count * 8):
+                self.bits[self._row_slice(row, 0, self.width)] = False
+
+        self.mark_dirty(0, 0, self.width, self.height)
+
+    def scroll(self, dy):
+        """Moves the contents of the bitmap up or down, clearing the rows scrolled into view
+
+        Args:
+            dy (int): Number of rows to move the contents down, negative to move them up
+        """
+        if dy == 0:
+            return
+
+        if abs(dy) >= self.height:
+            self.clear()
+            return
+
+        if self.layout == ROW_LAYOUT or dy % 8 == 0:
+            # Whole rows, or whole pages, are contiguous so the move is a single slice
+            shift = abs(dy) * self.width
+            if dy > 0:
+                self.bits[shift:] = self.bits[:-shift]
+                self.bits[:shift] = False
+            else:
+                self.bits[:-shift] = self.bits[shift:]
+                self.bits[-shift:] = False
+
+            if self.layout == PAGE_LAYOUT:
+                for row in range(self.height, self.page_count * 8):
+                    self.bits[self._row_slice(row, 0, self.width)] = False
+        else:
+            rows = range(self.height - 1, -1, -1) if dy > 0 else range(self.height)
+            for row in rows:
+                row_slice = self._row_slice(row, 0, self.width)
+                if 0 <= row - dy < self.height:
+                    self.bits[row_slice] = self.bits[self._row_slice(row - dy, 0, self.width)]
+                else:
+                    self.bits[row_slice] = False
+
+        self.mark_dirty(0, 0, self.width, self.height)
+
     def clear(self):
         """Clears the bitmap
         """
-        self.bits.setall(False)
+        if self.bits.any():
+            self.bits.setall(False)
+            self.mark_dirty(0, 0, self.width, self.height)
+
+    def mark_dirty(self, x, y, width, height):
+        """Records an area as changed so it is sent by the next get_dirty_blocks
+
+        Args:
+            x (int): Starting column of the area
+            y (int): Starting row of the area
+            width (int): Number of columns in the area
+            height (int): Number of rows in the area
+        """
+        col_start = max(0, x)
+        col_end = min(self.width, x + width)
+        row_start = max(0, y)
+        row_end = min(self.height, y + height)
+
+        if col_end <= col_start or row_end <= row_start:
+            return
+
+        for page in range(row_start / 8, ((row_end - 1) / 8) + 1):
+            span = self._dirty.get(page)
+            if span is None:
+                self._dirty[page] = [col_start, col_end]
+            else:
+                span[0] = min(span[0], col_start)
+                span[1] = max(span[1], col_end)
+
+    def mark_clean(self):
+        """Forgets all recorded changes
+        """
+        self._dirty = {}
+
+    @property
+    def is_dirty(self):
+        """True if the bitmap changed since the last get_dirty_blocks
+        """
+        return bool(self._dirty)
+
+    def dirty_spans(self):
+        """Returns the changed areas as page column spans
+
+        Returns:
+            Sorted list of 3-tuples holding the page, first column and the
+            column after the last changed one.
+        """
+        return [(page, span[0], span[1]) for page, span in sorted(self._dirty.items())]
 
     def dump(self):
         """Outputs a visual representation for the bitmap
         """
         for row in range(self.height):
             line = ''
-            for col in range(self.width):
-                bit = self.bits[(row*self.width)+col]
+            for bit in self.bits[self._row_slice(row, 0, self.width)]:
                 line += '*' if bit else ' '
             print '|{0}|'.format(line)
 
@@ -137,21 +467,119 @@ class Bitmap(object):
         """Creates a gaugette Bitmap
         """
         mode = ssd1306extras.ssd1306.SSD1306.MEMORY_MODE_HORIZ
-        width = self.width
-        height = self.height
-        page_size = width * 8
-        gaug_bytes = bytearray(width * height / 8)
-
-        for i, bit in enumerate(self.bits):
-            if bit:
-                page = i/page_size
-                bit_shift = (i % page_size) / width
-                byte_pos = i % width + (page * width)
-                gaug_bytes[byte_pos] = gaug_bytes[byte_pos] | (0x01 << bit_shift)
-
-        gaug_bitmap = ssd1306extras.ssd1306.SSD1306.Bitmap(width, height, list(gaug_bytes), mode)
+
+        if self.layout == PAGE_LAYOUT:
+            gaug_bytes = bytearray(self.bits.tobytes())
+        else:
+            gaug_bytes = self._pack_pages(0, self.page_count, 0, self.width)
+
+        gaug_bitmap = ssd1306extras.ssd1306.SSD1306.Bitmap(self.width, self.page_count * 8, gaug_bytes, mode)
         return gaug_bitmap
 
+    def get_dirty_blocks(self):
+        """Creates gaugette Bitmaps holding only the changed areas and marks the bitmap clean
+
+        Changed column spans on neighbouring pages are combined into one block
+        when they cover the same columns.
+
+        Returns:
+            List of 3-tuples holding the start row, start column and gaugette
+            Bitmap for each block.
+        """
+        mode = ssd1306extras.ssd1306.SSD1306.MEMORY_MODE_HORIZ
+        blocks = []
+        block = None
+
+        for page, col_start, col_end in self.dirty_spans():
+            if block is not None and block[1] == page and block[2:] == [col_start, col_end]:
+                block[1] = page + 1
+                continue
+            block = [page, page + 1, col_start, col_end]
+            blocks.append(block)
+
+        gaug_blocks = []
+        for page_start, page_end, col_start, col_end in blocks:
+            gaug_bytes = self._pack_pages(page_start, page_end, col_start, col_end)
+            gaug_bitmap = ssd1306extras.ssd1306.SSD1306.Bitmap(col_end - col_start, (page_end - page_start) * 8,
+                                                               gaug_bytes, mode)
+            gaug_blocks.append((page_start * 8, col_start, gaug_bitmap))
+
+        self.mark_clean()
+        return gaug_blocks
+
+    def _pack_pages(self, page_start, page_end, col_start, col_end):
+        """Packs an area of the bitmap into SSD1306 page bytes
+
+        A ROW_LAYOUT bitmap has every band of 8 rows transposed by assigning
+        each row to every 8th bit of a little endian bitarray, which leaves bit
+        n of each column byte holding row n of the band. A partial last band is
+        padded with zeros. A PAGE_LAYOUT bitmap already holds page bytes.
+
+        Args:
+            page_start (int): First page to pack
+            page_end (int): Page after the last one to pack
+            col_start (int): First column to pack
+            col_end (int): Column after the last one to pack
+
+        Returns:
+            bytearray with one byte per column for every page, in page order
+        """
+        width = self.width
+        cols = col_end - col_start
+        gaug_bytes = bytearray()
+
+        if self.layout == PAGE_LAYOUT:
+            for page in range(page_start, page_end):
+                start = ((page * width) + col_start) * 8
+                gaug_bytes.extend(self.bits[start:start + (cols * 8)].tobytes())
+            return gaug_bytes
+
+        band = bitarray(cols * 8, endian='little')
+
+        for band_row in range(page_start * 8, min(page_end * 8, self.height), 8):
+            band.setall(False)
+            for bit in range(min(8, self.height - band_row)):
+                row_start = ((band_row + bit) * width) + col_start
+                band[bit::8] = self.bits[row_start:row_start + cols]
+            gaug_bytes.extend(band.tobytes())
+
+        return gaug_bytes
+
+
+def _raster_op(op, dest, source, mask=None):
+    """Combines source bits with destination bits
+
+    Args:
+        op (str): OP_COPY, OP_OR, OP_AND_NOT or OP_XOR
+        dest (bitarray): Bits being drawn over
+        source (bitarray): Bits being drawn
+        mask (bitarray): Optional bits selecting which results are kept
+
+    Returns:
+        bitarray holding the new destination bits
+    """
+    # Bitwise operations need both sides in the same bit order
+    if source.endian() != dest.endian():
+        source = bitarray(source, endian=dest.endian())
+    if mask is not None and mask.endian() != dest.endian():
+        mask = bitarray(mask, endian=dest.endian())
+
+    if op == OP_COPY:
+        result = source
+    elif op == OP_OR:
+        result = dest | source
+    elif op == OP_AND_NOT:
+        result = dest & ~source
+    elif op == OP_XOR:
+        result = dest ^ source
+    else:
+        raise ValueError('Unknown raster operation: {0}'.format(op))
+
+    if mask is None:
+        return result
+
+    return (dest & ~mask) | (result & mask)
+
 
 def image_to_bitmap(image_path):
     img = Image.open(image_path)
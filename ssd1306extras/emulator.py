@@ -0,0 +1,287 @@
+import collections
+import contextlib
+
+from PIL import Image
+
+import ssd1306
+
+
+# Bus traffic between two calls to end_frame. seconds is the modeled time the
+# traffic spends on the bus.
+FrameRecord = collections.namedtuple('FrameRecord', ['label', 'commands', 'command_bytes', 'data_bytes',
+                                                     'transfers', 'seconds'])
+
+# Number of argument bytes following each command that takes arguments
+_COMMAND_ARGS = {
+    0x20: 1,  # SET_MEMORY_MODE
+    0x21: 2,  # SET_COL_ADDRESS
+    0x22: 2,  # SET_PAGE_ADDRESS
+    0x26: 6,  # RIGHT_HORIZ_SCROLL
+    0x27: 6,  # LEFT_HORIZ_SCROLL
+    0x29: 5,  # VERT_AND_RIGHT_HORIZ_SCROLL
+    0x2A: 5,  # VERT_AND_LEFT_HORIZ_SCROLL
+    0x81: 1,  # SET_CONTRAST
+    0x8D: 1,  # CHARGE_PUMP
+    0xA3: 2,  # SET_VERTICAL_SCROLL_AREA
+    0xA8: 1,  # SET_MULTIPLEX
+    0xD3: 1,  # SET_DISPLAY_OFFSET
+    0xD5: 1,  # SET_DISPLAY_CLOCK_DIV
+    0xD9: 1,  # SET_PRECHARGE
+    0xDA: 1,  # SET_COM_PINS
+    0xDB: 1,  # SET_VCOM_DETECT
+}
+
+
+class EmulatedSSD1306(ssd1306.SSD1306):
+    """SSD1306 that keeps its display RAM in memory instead of using a bus
+
+    Commands and data are decoded the way the controller would decode them,
+    so everything drawn through display_block ends up in the emulated display
+    RAM and can be exported as an image. Every byte is counted, and the time
+    it would spend on the bus is modeled from the bus clock. No GPIO or SPI
+    device is opened.
+
+    Wrap an interaction in record() to see what it costs:
+
+        with display.record('next') as frames:
+            menu.next()
+        print frames[0].data_bytes
+    """
+
+    # Bits clocked per byte. 8 for SPI, 9 for I2C where every byte is acknowledged.
+    bits_per_byte = 8
+
+    # Seconds added to every command and data call, such as the time taken to
+    # switch the D/C pin and start a transfer
+    transfer_overhead = 0.0
+
+    def __init__(self, rows=32, cols=128, buffer_rows=64, buffer_cols=128, bus_hz=8000000):
+        """Creates an emulated display
+
+        Args:
+            rows (int): Rows of the display
+            cols (int): Columns of the display
+            buffer_rows (int): Rows of the gaugette bitmap used by display()
+            buffer_cols (int): Columns of the gaugette bitmap used by display()
+            bus_hz (int): Bus clock used to model transfer times
+        """
+        self.rows = rows
+        self.cols = cols
+        self.buffer_rows = buffer_rows
+        self.mem_bytes = buffer_rows * buffer_cols / 8
+        self.bitmap = self.Bitmap(buffer_cols, buffer_rows)
+        self.flipped = False
+        self.bus_hz = bus_hz
+
+        self.gddram = bytearray(self.GDDRAM_PAGES * self.GDDRAM_COLS)
+        self.frames = []
+        self._pending_args = []
+        self._start_frame()
+        self.reset()
+
+        # Starts switched on, so calling begin() is optional
+        self.display_on = True
+
+    def reset(self):
+        """Resets the controller registers as the reset pin would
+
+        The display RAM keeps its contents.
+        """
+        self.invalidate_shadow()
+        self.scrolling = False
+        self.start_line = 0
+
+        self.memory_mode = self.MEMORY_MODE_PAGE
+        self.col_start = 0
+        self.col_end = self.GDDRAM_COLS - 1
+        self.page_start = 0
+        self.page_end = self.GDDRAM_PAGES - 1
+        self.col = 0
+        self.page = 0
+
+        self.display_on = False
+        self.inverted = False
+        self.contrast = 0x7F
+        self._pending_args = []
+
+    def command(self, *bytes):
+        self._commands += 1
+        self._command_bytes += len(bytes)
+        self._seconds += self._transfer_seconds(len(bytes))
+
+        for byte in bytes:
+            self._decode(byte)
+
+    def data(self, bytes):
+        self._transfers += 1
+        self._data_bytes += len(bytes)
+        self._seconds += self._transfer_seconds(len(bytes))
+
+        for byte in bytes:
+            self._write(byte)
+
+    def end_frame(self, label=None):
+        """Closes the current frame and starts counting a new one
+
+        Args:
+            label (str): Name stored with the frame
+
+        Returns:
+            FrameRecord of the traffic since the last frame ended
+        """
+        frame = FrameRecord(label, self._commands, self._command_bytes, self._data_bytes, self._transfers,
+                            self._seconds)
+        self.frames.append(frame)
+        self._start_frame()
+        return frame
+
+    @contextlib.contextmanager
+    def record(self, label=None):
+        """Records the traffic of the wrapped code as a single frame
+
+        Traffic from before the block is closed off as a frame of its own
+        first, unless there was none.
+
+        Yields:
+            List the FrameRecord is appended to when the block ends
+        """
+        if self._commands or self._transfers:
+            self.end_frame()
+
+        frames = []
+        yield frames
+        frames.append(self.end_frame(label))
+
+    def totals(self):
+        """Returns the traffic of every frame, including the unfinished one
+
+        Returns:
+            FrameRecord with the label 'total'
+        """
+        frames = self.frames + [FrameRecord(None, self._commands, self._command_bytes, self._data_bytes,
+                                            self._transfers, self._seconds)]
+        return FrameRecord('total', *[sum(field) for field in zip(*[frame[1:] for frame in frames])])
+
+    def clear_frames(self):
+        """Forgets the recorded frames
+        """
+        self.frames = []
+        self._start_frame()
+
+    def image(self):
+        """Returns what the display shows as a mode 1 PIL image
+
+        The start line, inversion and display on/off state are applied.
+        Hardware scrolling is not animated.
+        """
+        image = Image.new('1', (self.cols, self.rows))
+        if not self.display_on:
+            return image
+
+        ram_rows = self.GDDRAM_PAGES * 8
+        pixels = image.load()
+        for y in range(self.rows):
+            ram_row = (self.start_line + y) % ram_rows
+            offset = (ram_row >> 3) * self.GDDRAM_COLS
+            mask = 1 << (ram_row & 7)
+            for x in range(self.cols):
+                if bool(self.gddram[offset + x] & mask) != self.inverted:
+                    pixels[x, y] = 1
+
+        return image
+
+    def gddram_image(self):
+        """Returns the whole display RAM as a mode 1 PIL image, ignoring the start line
+        """
+        image = Image.new('1', (self.GDDRAM_COLS, self.GDDRAM_PAGES * 8))
+        pixels = image.load()
+        for page in range(self.GDDRAM_PAGES):
+            for x in range(self.GDDRAM_COLS):
+                byte = self.gddram[(page * self.GDDRAM_COLS) + x]
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        pixels[x, (page * 8) + bit] = 1
+        return image
+
+    def save(self, path):
+        """Saves what the display shows as an image file
+        """
+        self.image().save(path)
+
+    def _start_frame(self):
+        self._commands = 0
+        self._command_bytes = 0
+        self._data_bytes = 0
+        self._transfers = 0
+        self._seconds = 0.0
+
+    def _transfer_seconds(self, byte_count):
+        return ((byte_count * self.bits_per_byte) / float(self.bus_hz)) + self.transfer_overhead
+
+    def _decode(self, byte):
+        """Feeds one command byte to the controller's command decoder
+        """
+        if self._pending_args:
+            self._pending_args.append(byte)
+        elif byte in _COMMAND_ARGS:
+            self._pending_args = [byte]
+        else:
+            self._execute(byte, [])
+            return
+
+        command = self._pending_args[0]
+        args = self._pending_args[1:]
+        if len(args) == _COMMAND_ARGS[command]:
+            self._pending_args = []
+            self._execute(command, args)
+
+    def _execute(self, command, args):
+        if command == self.SET_MEMORY_MODE:
+            self.memory_mode = args[0] & 0x03
+        elif command == self.SET_COL_ADDRESS:
+            self.col_start = self.col = args[0] & 0x7F
+            self.col_end = args[1] & 0x7F
+        elif command == self.SET_PAGE_ADDRESS:
+            self.page_start = self.page = args[0] & 0x07
+            self.page_end = args[1] & 0x07
+        elif command in (self.ACTIVATE_SCROLL, self.DEACTIVATE_SCROLL):
+            self.scrolling = command == self.ACTIVATE_SCROLL
+        elif self.SET_START_LINE <= command <= self.SET_START_LINE | 0x3F:
+            self.start_line = command & 0x3F
+        elif command == 0x81:
+            # Set contrast
+            self.contrast = args[0]
+        elif command in (0xA6, 0xA7):
+            # Normal or inverted display
+            self.inverted = command == 0xA7
+        elif command in (0xAE, 0xAF):
+            # Display off or on
+            self.display_on = command == 0xAF
+        elif 0xB0 <= command <= 0xB7:
+            # Page start address for page addressing mode
+            self.page = command & 0x07
+        elif command <= 0x0F:
+            # Lower and higher nibbles of the column for page addressing mode
+            self.col = (self.col & 0xF0) | command
+        elif command <= 0x1F:
+            self.col = (self.col & 0x0F) | ((command & 0x07) << 4)
+
+    def _write(self, byte):
+        """Writes one data byte at the address pointer and advances it
+        """
+        self.gddram[(self.page * self.GDDRAM_COLS) + self.col] = byte
+
+        if self.memory_mode == self.MEMORY_MODE_HORIZ:
+            if self.col < self.col_end:
+                self.col += 1
+            else:
+                self.col = self.col_start
+                self.page = self.page + 1 if self.page < self.page_end else self.page_start
+        elif self.memory_mode == self.MEMORY_MODE_VERT:
+            if self.page < self.page_end:
+                self.page += 1
+            else:
+                self.page = self.page_start
+                self.col = self.col + 1 if self.col < self.col_end else self.col_start
+        else:
+            self.col = self.col + 1 if self.col < self.col_end else self.col_start
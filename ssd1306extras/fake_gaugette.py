@@ -0,0 +1,132 @@
+"""Stand-in for gaugette.ssd1306 used when gaugette is not installed
+
+Mirrors the parts of py-gaugette's SSD1306 that ssd1306extras uses, so
+EmulatedSSD1306 and the benchmarks run without SPI or GPIO. Commands and data
+are counted instead of being written to a bus, so nothing reaches a real
+display.
+"""
+
+
+class SSD1306(object):
+
+    EXTERNAL_VCC = 0x1
+    SWITCH_CAP_VCC = 0x2
+
+    SET_LOW_COLUMN = 0x00
+    SET_HIGH_COLUMN = 0x10
+    SET_MEMORY_MODE = 0x20
+    SET_COL_ADDRESS = 0x21
+    SET_PAGE_ADDRESS = 0x22
+    RIGHT_HORIZ_SCROLL = 0x26
+    LEFT_HORIZ_SCROLL = 0x27
+    VERT_AND_RIGHT_HORIZ_SCROLL = 0x29
+    VERT_AND_LEFT_HORIZ_SCROLL = 0x2A
+    DEACTIVATE_SCROLL = 0x2E
+    ACTIVATE_SCROLL = 0x2F
+    SET_START_LINE = 0x40
+    SET_CONTRAST = 0x81
+    CHARGE_PUMP = 0x8D
+    SEG_REMAP = 0xA0
+    SET_VERTICAL_SCROLL_AREA = 0xA3
+    DISPLAY_ALL_ON_RESUME = 0xA4
+    DISPLAY_ALL_ON = 0xA5
+    NORMAL_DISPLAY = 0xA6
+    INVERT_DISPLAY = 0xA7
+    DISPLAY_OFF = 0xAE
+    DISPLAY_ON = 0xAF
+    COM_SCAN_INC = 0xC0
+    COM_SCAN_DEC = 0xC8
+    SET_DISPLAY_OFFSET = 0xD3
+    SET_COM_PINS = 0xDA
+    SET_VCOM_DETECT = 0xDB
+    SET_DISPLAY_CLOCK_DIV = 0xD5
+    SET_PRECHARGE = 0xD9
+    SET_MULTIPLEX = 0xA8
+
+    MEMORY_MODE_HORIZ = 0x00
+    MEMORY_MODE_VERT = 0x01
+    MEMORY_MODE_PAGE = 0x02
+
+    def __init__(self, bus=0, device=0, dc_pin='P9_15', reset_pin='P9_13', buffer_rows=64, buffer_cols=128,
+                 rows=32, cols=128):
+        self.cols = cols
+        self.rows = rows
+        self.buffer_rows = buffer_rows
+        self.bitmap = self.Bitmap(buffer_cols, buffer_rows)
+
+        self.commands = 0
+        self.command_bytes = 0
+        self.data_bytes = 0
+
+    def reset(self):
+        pass
+
+    def command(self, *bytes):
+        self.commands += 1
+        self.command_bytes += len(bytes)
+
+    def data(self, bytes):
+        self.data_bytes += len(bytes)
+
+    def begin(self, vcc_state=SWITCH_CAP_VCC):
+        self.reset()
+        self.command(self.DISPLAY_OFF)
+        self.command(self.DISPLAY_ON)
+
+    def clear_display(self):
+        self.bitmap.clear()
+
+    def invert_display(self):
+        self.command(self.INVERT_DISPLAY)
+
+    def flip_display(self, flipped=True):
+        self.command(self.COM_SCAN_DEC if flipped else self.COM_SCAN_INC)
+        self.command(self.SEG_REMAP | (0x01 if flipped else 0x00))
+
+    def normal_display(self):
+        self.command(self.NORMAL_DISPLAY)
+
+    def set_contrast(self, contrast=0x7f):
+        self.command(self.SET_CONTRAST, contrast)
+
+    def display(self):
+        self.display_block(self.bitmap, 0, 0, self.cols)
+
+    def display_block(self, bitmap, row, col, col_count, col_offset=0):
+        page_count = bitmap.rows >> 3
+        page_start = row >> 3
+        page_end = page_start + page_count - 1
+        self.command(self.SET_MEMORY_MODE, self.MEMORY_MODE_VERT)
+        self.command(self.SET_PAGE_ADDRESS, page_start, page_end)
+        self.command(self.SET_COL_ADDRESS, col, col + col_count - 1)
+        start = col_offset * page_count
+        length = col_count * page_count
+        self.data(bitmap.data[start:start + length])
+
+    class Bitmap(object):
+
+        def __init__(self, cols, rows):
+            self.rows = rows
+            self.cols = cols
+            self.bytes_per_col = rows / 8
+            self.data = [0] * (self.cols * self.bytes_per_col)
+
+        def clear(self):
+            for i in range(len(self.data)):
+                self.data[i] = 0
+
+        def dump(self):
+            pass
+
+        def draw_pixel(self, x, y, on=True):
+            if x < 0 or x >= self.cols or y < 0 or y >= self.rows:
+                return
+            mem_col = x
+            mem_row = y / 8
+            bit_mask = 1 << (y % 8)
+            offset = mem_row + (self.rows / 8 * mem_col)
+            if on:
+                self.data[offset] |= bit_mask
+            else:
+                self.data[offset] &= (0xFF - bit_mask)
+
@@ -0,0 +1,335 @@
+import collections
+
+from PIL import Image, ImageDraw
+from bitarray import bitarray
+
+import bitmap
+import instrument
+import util.cache
+import util.text
+
+
+# Blank space rendered around each glyph so no ink is clipped while measuring
+_PAD = 32
+
+# Glyph drawn after text to find where the pen ended up. Fonts rarely kern it.
+_REFERENCE = '|'
+
+# Glyph standing on the baseline, drawn next to glyphs that descend below it
+_BASELINE_REFERENCE = 'H'
+
+# Drawn after measured text to keep PIL from clipping it. PIL sizes its mask
+# from the hinted outlines but draws monochrome bitmaps, which can be larger.
+# The spaces widen the mask and the accented capital, which does not descend,
+# heightens it.
+_TAIL = '   \xc9   '
+
+# Number of glyph atlases kept unless changed with set_cache_size
+DEFAULT_CACHE_SIZE = 8
+
+# A rasterized glyph. bits holds the rows of its ink box, x and y place the
+# box relative to the pen position and the baseline. bits is None for glyphs
+# without ink, such as a space.
+Glyph = collections.namedtuple('Glyph', ['bits', 'width', 'height', 'x', 'y'])
+
+
+class GlyphAtlas(object):
+    """Rasterizes the glyphs of a font once and composes strings from them
+
+    Glyphs, advance widths and kerning are measured from PIL's own rendering
+    the first time they are needed, so rendering a string afterwards only asks
+    PIL for the size of its mask, without rasterizing anything. The output
+    matches util.text.image, including the ink PIL clips off where its
+    monochrome glyphs come out larger than the mask.
+    """
+
+    def __init__(self, font_file, size):
+        """Creates an empty atlas
+
+        Args:
+            font_file (str): Path to a TrueType or OpenType font file
+            size (int): Font size of the text
+
+        Raises:
+            ValueError: If no font file is given. PIL's built in bitmap font
+                is not supported.
+        """
+        if font_file is None:
+            raise ValueError('A glyph atlas needs a font file')
+
+        self.font_file = font_file
+        self.size = size
+        self._font = util.text._create_font(font_file, size)
+
+        # Glyphs keyed by (char, first). The first glyph of a string is
+        # placed differently when it has a negative left bearing.
+        self._glyphs = {}
+        self._advances = {}
+        self._kerning = {}
+        self._pen_ends = {}
+        self._tops = {}
+        self._reference = None
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def glyph(self, char, first=False):
+        """Returns the rasterized glyph for a character
+
+        Args:
+            char (str): Single character
+            first (bool): If True, returns the glyph as placed at the start of a string
+        """
+        key = (char, first)
+        try:
+            return self._glyphs[key]
+        except KeyError:
+            pass
+
+        glyph = self._rasterize(char, first)
+        self._glyphs[key] = glyph
+        return glyph
+
+    def advance(self, char):
+        """Returns the number of columns the pen moves after drawing a character
+        """
+        try:
+            return self._advances[char]
+        except KeyError:
+            pass
+
+        advance = self._pen_end(char) - self._shift(char)
+        self._advances[char] = advance
+        return advance
+
+    def kerning(self, left, right):
+        """Returns the columns added between two characters drawn next to each other
+        """
+        key = left + right
+        try:
+            return self._kerning[key]
+        except KeyError:
+            pass
+
+        kerning = self._pen_end(key) - self._pen_end(left) - self.advance(right)
+        self._kerning[key] = kerning
+        return kerning
+
+    def text_width(self, text):
+        """Returns the width of text as PIL measures it when expanding an image to fit
+        """
+        return self._font.getsize(text)[0] if text else 0
+
+    def render(self, text, width, height, expand=False, margin=None, invert=False):
+        """Composes a string into a new bitmap
+
+        Takes the same arguments as util.text.image and produces the same pixels.
+
+        Args:
+            text (str): Text to be rendered
+            width (int): Width of the bitmap
+            height (int): Height of the bitmap
+            expand (bool): If True, the bitmap will be horizontally expanded to fit the text
+            margin (Margin): Placement for text
+            invert (bool): If True, the bitmap has the text inverted
+
+        Returns:
+            Row layout Bitmap with the text drawn on it
+        """
+        if margin is None:
+            margin = util.text.Margin(0, 0, 0, 0)
+
+        if text:
+            # PIL draws the text into a mask sized from the hinted outlines,
+            # which clips monochrome glyphs that come out larger. The mask is
+            # measured without rasterizing anything.
+            (mask_width, mask_height), (offset_x, offset_y) = self._font.font.getsize(text)
+            if expand:
+                # mask_width + offset_x is what text_width returns
+                width = max(width, mask_width + offset_x + margin.left + margin.right)
+
+        text_bitmap = bitmap.Bitmap(width, height)
+
+        if text:
+            mask = bitmap.Bitmap(mask_width, mask_height)
+            placed = self._layout(text)
+
+            # The baseline is raised off the bottom of the mask by the lowest
+            # descent in the text
+            baseline = mask_height - max([0] + [glyph.y + glyph.height for glyph, _ in placed if glyph.bits])
+
+            # Kerned glyph boxes overlap, so the ink is combined rather than copied
+            for glyph, x in placed:
+                if glyph.bits is not None:
+                    mask.draw_bit_array(glyph.bits, x + glyph.x - offset_x, baseline + glyph.y, glyph.width,
+                                        glyph.height, op=bitmap.OP_OR)
+
+            text_bitmap.draw_bitmap(mask, margin.left + offset_x, margin.top + offset_y)
+
+        if invert:
+            text_bitmap.invert()
+
+        return text_bitmap
+
+    def _layout(self, text):
+        """Places the glyphs of text along a line starting at column 0
+
+        Returns:
+            List of (Glyph, pen column) pairs
+        """
+        # PIL moves the whole line right when the first glyph has a negative
+        # left bearing
+        pen = self._shift(text[0])
+        placed = []
+        for i, char in enumerate(text):
+            placed.append((self.glyph(char), pen))
+            pen += self.advance(char)
+            if i + 1 < len(text):
+                pen += self.kerning(char, text[i + 1])
+
+        return placed
+
+    def _shift(self, char):
+        """Returns how far PIL moves a line starting with a character to the right
+        """
+        first = self.glyph(char, first=True)
+        if first.bits is None:
+            return 0
+        return first.x - self.glyph(char).x
+
+    def _rasterize(self, char, first):
+        if first:
+            image, _ = self._draw(char)
+            pen = _PAD
+        else:
+            # A space has no ink, so nothing shifts the line it starts
+            image, _ = self._draw(' ' + char)
+            pen = _PAD + self._pen_end(' ')
+
+        bbox = image.getbbox()
+        if bbox is None:
+            return Glyph(None, 0, 0, 0, 0)
+
+        ink = image.crop(bbox)
+        width, height = ink.size
+        return Glyph(bitarray([byte for byte in ink.getdata()]), width, height, bbox[0] - pen, self._top(char))
+
+    def _top(self, char):
+        """Returns the row of the top of a character's ink, relative to the baseline
+
+        PIL stands each line on the lowest descent among its glyphs, so only
+        a position relative to the baseline carries over between strings.
+        """
+        try:
+            return self._tops[char]
+        except KeyError:
+            pass
+
+        image, mask_bottom = self._draw(char)
+        left, top, right, bottom = image.getbbox()
+
+        if bottom < mask_bottom or char == _BASELINE_REFERENCE:
+            # Nothing descends, so the baseline is the bottom of the mask
+            top -= mask_bottom
+        else:
+            # Compare with a glyph standing on the baseline in the same line
+            reference_top = self._top(_BASELINE_REFERENCE)
+            image, _ = self._draw(_BASELINE_REFERENCE + ' ' + char)
+            split = image.getbbox()[0]
+            while image.crop((split, 0, split + 1, image.size[1])).getbbox() is not None:
+                split += 1
+            top = (reference_top + image.crop((split, 0, image.size[0], image.size[1])).getbbox()[1] -
+                   image.crop((0, 0, split, image.size[1])).getbbox()[1])
+
+        self._tops[char] = top
+        return top
+
+    def _draw(self, text):
+        """Draws text with PIL without clipping any of its ink
+
+        Returns:
+            2-tuple of the image and the row of the bottom of PIL's mask
+        """
+        text += _TAIL
+        text_width, text_height = self._font.getsize(text)
+        image = Image.new('1', (text_width + (2 * _PAD), text_height + (2 * _PAD)))
+        ImageDraw.Draw(image).text((_PAD, _PAD), text, font=self._font, fill=255)
+
+        # Crop the tail off again, finding the left edge of its glyph's ink
+        column = image.getbbox()[2]
+        while image.crop((column - 1, 0, column, image.size[1])).getbbox() is not None:
+            column -= 1
+
+        return image.crop((0, 0, column, image.size[1])), _PAD + text_height
+
+    def _pen_end(self, text):
+        """Returns where the pen ends up after drawing text, as seen by PIL
+
+        Draws text followed by a reference glyph, whose ink is the last in the
+        image.
+        """
+        try:
+            return self._pen_ends[text]
+        except KeyError:
+            pass
+
+        if self._reference is None:
+            self._reference = self._rasterize(_REFERENCE, True)
+        reference = self._reference
+        right = self._draw(text + _REFERENCE)[0].getbbox()[2]
+
+        pen_end = right - reference.width - reference.x - _PAD
+        self._pen_ends[text] = pen_end
+        return pen_end
+
+
+_cache = util.cache.LRUCache(DEFAULT_CACHE_SIZE)
+instrument.register_cache('glyph_atlas', _cache.info)
+
+
+def atlas(font_file, size):
+    """Returns the shared glyph atlas for a font
+
+    Args:
+        font_file (str): Path to the font file
+        size (int): Font size of the text
+
+    Raises:
+        ValueError: If no font file is given
+    """
+    if font_file is None:
+        raise ValueError('A glyph atlas needs a font file')
+
+    return _cache.get((font_file, size), lambda: GlyphAtlas(font_file, size))
+
+
+def render(text, font_file, size, width, height, expand=False, margin=None, invert=False):
+    """Composes a string from the shared glyph atlas for its font
+
+    Takes the same arguments as textcache.render.
+
+    Returns:
+        Row layout Bitmap with the text drawn on it
+    """
+    return atlas(font_file, size).render(text, width, height, expand=expand, margin=margin, invert=invert)
+
+
+def cache_info():
+    """Returns the glyph atlas cache counters
+
+    Returns:
+        CacheInfo namedtuple
+    """
+    return _cache.info()
+
+
+def set_cache_size(max_atlases):
+    """Sets the number of glyph atlases kept in the cache
+    """
+    _cache.max_entries = max_atlases
+
+
+def clear_cache():
+    """Empties the glyph atlas cache
+    """
+    _cache.clear()
@@ -0,0 +1,244 @@
+"""Timing of the phases of drawing a frame
+
+Panel.draw and TextListMenu.draw each count as a frame. While a frame is
+drawn, the time spent in each phase is recorded:
+
+    render      text rasterization and widget bitmaps
+    composite   drawing widgets and items into the framebuffer
+    pack        diffing and packing the framebuffer into gaugette bitmaps
+    transmit    display_block calls, or handing blocks to a transmitter
+
+Phases nested inside another phase are subtracted from it, so each second is
+counted in exactly one phase. Timing costs two clock reads per phase and is
+on by default. Results are kept as a window of recent samples for each phase,
+from which snapshot() computes percentiles, and each finished frame is passed
+to the callbacks added with add_callback.
+"""
+import collections
+import contextlib
+import threading
+import time
+
+
+# Timing of one frame. phases maps each phase name to the seconds spent in it.
+FrameProfile = collections.namedtuple('FrameProfile', ['name', 'seconds', 'phases'])
+
+# Distribution of the recent samples of a phase or frame, in seconds. count and
+# total cover every sample since the last reset.
+PhaseStats = collections.namedtuple('PhaseStats', ['count', 'total', 'p50', 'p95', 'max'])
+
+# Hit rate of a cache, None before the first lookup
+CacheStats = collections.namedtuple('CacheStats', ['hits', 'misses', 'hit_rate'])
+
+Snapshot = collections.namedtuple('Snapshot', ['frames', 'phases', 'caches'])
+
+RENDER = 'render'
+COMPOSITE = 'composite'
+PACK = 'pack'
+TRANSMIT = 'transmit'
+
+# Number of recent samples kept for each phase and frame
+DEFAULT_WINDOW = 512
+
+
+class Recorder(object):
+    """Collects phase and frame timings
+
+    Safe to use from several threads. Each thread times its own frames.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, clock=time.time):
+        """Creates an empty recorder
+
+        Args:
+            window (int): Number of recent samples kept for each phase and frame
+            clock (callable): Returns the current time in seconds
+        """
+        self.enabled = True
+        self.window = window
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._local = _ThreadState()
+        self._callbacks = []
+        self._caches = collections.OrderedDict()
+        self.reset()
+
+    def reset(self):
+        """Forgets every sample
+        """
+        with self._lock:
+            self._phases = {}
+            self._frames = {}
+
+    def phase(self, name):
+        """Returns a context manager timing the wrapped code as a phase
+        """
+        return _Phase(self, name)
+
+    @contextlib.contextmanager
+    def frame(self, name):
+        """Times the wrapped code as a frame
+
+        A frame drawn inside another frame, such as a panel inside a panel,
+        is counted as part of the outer one.
+        """
+        if not self.enabled or self._local.frame is not None:
+            yield
+            return
+
+        phases = {}
+        self._local.frame = phases
+        start = self.clock()
+        try:
+            yield
+        finally:
+            seconds = self.clock() - start
+            self._local.frame = None
+            self._add_sample(self._frames, name, seconds)
+
+            profile = FrameProfile(name, seconds, phases)
+            for callback in list(self._callbacks):
+                callback(profile)
+
+    def add_callback(self, callback):
+        """Calls a function with a FrameProfile after every frame
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def remove_callback(self, callback):
+        with self._lock:
+            self._callbacks.remove(callback)
+
+    def register_cache(self, name, info):
+        """Adds a cache to the snapshots
+
+        Args:
+            name (str): Name the cache is reported under
+            info (callable): Returns the cache's CacheInfo
+        """
+        self._caches[name] = info
+
+    def snapshot(self):
+        """Returns the statistics of the recent samples
+
+        Returns:
+            Snapshot namedtuple with dicts of PhaseStats keyed by frame and
+            phase name, and of CacheStats keyed by cache name
+        """
+        with self._lock:
+            frames = dict((name, _stats(samples)) for name, samples in self._frames.items())
+            phases = dict((name, _stats(samples)) for name, samples in self._phases.items())
+
+        caches = {}
+        for name, info in self._caches.items():
+            counters = info()
+            lookups = counters.hits + counters.misses
+            hit_rate = float(counters.hits) / lookups if lookups else None
+            caches[name] = CacheStats(counters.hits, counters.misses, hit_rate)
+
+        return Snapshot(frames, phases, caches)
+
+    def _add_sample(self, samples_by_name, name, seconds):
+        # Taken for every sample, as the counters' += is not atomic and
+        # DisplayManager draws displays from several threads at once
+        with self._lock:
+            samples = samples_by_name.get(name)
+            if samples is None:
+                samples = samples_by_name[name] = _Samples(self.window)
+            samples.add(seconds)
+
+
+class _ThreadState(threading.local):
+    """Phases being timed and the frame being drawn by each thread
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.frame = None
+
+
+class _Phase(object):
+    """Context manager for one timed phase
+
+    A class rather than a generator, as it is entered several times per frame.
+    """
+
+    __slots__ = ('recorder', 'name', 'entry')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.entry = None
+
+    def __enter__(self):
+        recorder = self.recorder
+        if recorder.enabled:
+            self.entry = [recorder.clock(), 0.0]
+            recorder._local.stack.append(self.entry)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        entry = self.entry
+        if entry is None:
+            return
+
+        recorder = self.recorder
+        state = recorder._local
+        elapsed = recorder.clock() - entry[0]
+        stack = state.stack
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+
+        seconds = elapsed - entry[1]
+        recorder._add_sample(recorder._phases, self.name, seconds)
+        if state.frame is not None:
+            state.frame[self.name] = state.frame.get(self.name, 0.0) + seconds
+
+
+class _Samples(object):
+
+    def __init__(self, window):
+        self.recent = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+def _stats(samples):
+    ordered = sorted(samples.recent)
+    return PhaseStats(samples.count, samples.total, _percentile(ordered, 50), _percentile(ordered, 95), samples.max)
+
+
+def _percentile(ordered, percent):
+    """Returns the nearest rank percentile of sorted samples
+    """
+    if not ordered:
+        return 0.0
+    rank = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(rank)]
+
+
+_recorder = Recorder()
+
+phase = _recorder.phase
+frame = _recorder.frame
+add_callback = _recorder.add_callback
+remove_callback = _recorder.remove_callback
+register_cache = _recorder.register_cache
+snapshot = _recorder.snapshot
+reset = _recorder.reset
+
+
+def set_enabled(enabled):
+    """Turns timing on or off for every frame drawn from now on
+    """
+    _recorder.enabled = enabled
@@ -0,0 +1,131 @@
+import collections
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+
+# Seconds each display took to draw in the last call to DisplayManager.draw,
+# in the order the displays were added, and the time the whole call took
+DrawTimes = collections.namedtuple('DrawTimes', ['displays', 'seconds'])
+
+
+class DisplayManager(object):
+    """Draws several displays at once
+
+    Each display's Panel or TextListMenu is drawn by a thread from a pool,
+    so one display renders while another's data is on the bus and displays
+    on separate buses transfer at the same time. Displays sharing a bus are
+    given the same bus lock, so their transfers take turns. A frame takes
+    about as long as the slowest display or the busiest bus, rather than
+    the sum of all of them.
+
+    Rendering is Python code and runs under the GIL, so it overlaps with
+    transfers rather than using several cores.
+
+    A DisplayManager has draw and needs_draw, so a FrameScheduler can pace it
+    like a single Panel.
+    """
+
+    def __init__(self, workers=None):
+        """Creates a manager without any displays
+
+        Args:
+            workers (int): Number of drawing threads, defaults to one per display
+        """
+        self.workers = workers
+        self.last_draw = None
+
+        self._targets = []
+        self._bus_locks = {}
+        self._pool = None
+        self._pool_size = 0
+
+    def add(self, target, bus=None):
+        """Adds a display
+
+        Args:
+            target (Panel): Panel, TextListMenu or any object with a draw
+                method and an ssd_display attribute
+            bus: Hashable name of the bus the display is on, such as
+                ('spi', 0) or ('i2c', 1). Displays given the same bus send
+                one at a time. None puts the display on a bus of its own.
+        """
+        if bus is not None:
+            target.ssd_display.bus_lock = self._bus_locks.setdefault(bus, threading.Lock())
+        self._targets.append(target)
+
+    def remove(self, target):
+        """Removes a display, leaving its bus lock in place
+        """
+        self._targets.remove(target)
+
+    def __len__(self):
+        return len(self._targets)
+
+    @property
+    def needs_draw(self):
+        """True if any display has changes to draw
+        """
+        return any(getattr(target, 'needs_draw', False) for target in self._targets)
+
+    def draw(self, timeout=None):
+        """Draws every display and waits for them to finish
+
+        Args:
+            timeout (float): Seconds to wait for each display, or None to wait
+                for as long as it takes
+
+        Returns:
+            DrawTimes namedtuple
+
+        Raises:
+            Exception: The first error raised while drawing a display. The
+                other displays are still drawn.
+        """
+        targets = list(self._targets)
+        start = time.time()
+
+        if not targets:
+            results = []
+        elif len(targets) == 1:
+            results = [_draw(targets[0])]
+        else:
+            pool = self._get_pool(len(targets))
+            pending = [pool.apply_async(_draw, (target,)) for target in targets]
+            results = [result.get(timeout) for result in pending]
+
+        for seconds, error in results:
+            if error is not None:
+                raise error
+
+        self.last_draw = DrawTimes([seconds for seconds, _ in results], time.time() - start)
+        return self.last_draw
+
+    def close(self):
+        """Stops the drawing threads
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._pool_size = 0
+
+    def _get_pool(self, display_count):
+        size = self.workers or display_count
+        if self._pool is not None and self._pool_size != size:
+            self.close()
+        if self._pool is None:
+            self._pool = ThreadPool(size)
+            self._pool_size = size
+        return self._pool
+
+
+def _draw(target):
+    """Draws one display, returning the time it took and any error raised
+    """
+    start = time.time()
+    try:
+        target.draw()
+    except Exception as e:
+        return time.time() - start, e
+    return time.time() - start, None
@@ -1,6 +1,10 @@
 import os.path
 
 import bitmap
+import glyph
+import instrument
+import present
+import textcache
 import util.text
 
 
@@ -12,6 +16,7 @@ class TextItem(object):
     _font_file = None
     _height = 16
     _margin = util.text.Margin(0, 0, 0, 0)
+    _use_glyph_atlas = False
 
     def __init__(self, text, width, height):
         """Create a new Item instance
@@ -53,10 +58,38 @@ class TextItem(object):
     def set_indent(cls, value):
         cls._margin = cls._margin._replace(left=value)
 
+    @classmethod
+    def set_glyph_atlas(cls, value):
+        """Composes packed bitmaps from a glyph atlas instead of rendering through PIL
+
+        Only used when a font file is set.
+        """
+        cls._use_glyph_atlas = value
+
     def create_bitmap(self):
-        img = util.text.image(self.text, self._font_file, self._font_size, self._width, self._height,
-                              margin=self._margin)
-        self._bitmap = img
+        with instrument.phase(instrument.RENDER):
+            # Copied, as the cached image is shared with other items and widgets
+            self._bitmap = self._render().image.copy()
+
+    def get_packed_bitmap(self, invert=False):
+        """Returns the item as a Bitmap, shared through the rendered text cache
+
+        The bitmap is not copied, as this is called for every item drawn. It
+        is shared with every item and widget showing the same text, so it must
+        be treated as read-only. Copy it before drawing on it.
+
+        Args:
+            invert (bool): If True, returns the inverted bitmap used for selected items
+        """
+        with instrument.phase(instrument.RENDER):
+            if self._use_glyph_atlas and self._font_file is not None:
+                return glyph.render(self.text, self._font_file, self._font_size, self._width, self._height,
+                                    margin=self._margin, invert=invert)
+            return self._render(invert).bitmap
+
+    def _render(self, invert=False):
+        return textcache.render(self.text, self._font_file, self._font_size, self._width, self._height,
+                                margin=self._margin, invert=invert)
 
     def ready(self):
         """Returns status of item bitmap
@@ -92,18 +125,151 @@ class TextItem(object):
         cls._margin = cls._margin._replace(top=vertical_margin.top)
 
 
+class VirtualItems(object):
+    """Creates the TextItems of a menu on demand and keeps only a window of them
+
+    Items are created when first accessed. update_window renders the items
+    around the visible page ahead of time and drops every item outside the
+    window along with its bitmaps, so memory use does not grow with the
+    length of the list.
+    """
+
+    def __init__(self, menu, item_list, item_count=None):
+        """Creates an empty window
+
+        Args:
+            menu (TextListMenu): Menu the items belong to
+            item_list (sequence or function): Sequence of item texts, or a
+                function returning the text for an index
+            item_count (int): Number of items, required when item_list is a function
+        """
+        if callable(item_list) and item_count is None:
+            raise ValueError('item_count is required when items come from a function')
+
+        self._menu = menu
+        self._item_list = item_list
+        self._item_count = item_count
+        self._items = {}
+        self.window_start = 0
+        self.window_end = 0
+
+    def __len__(self):
+        if self._item_count is not None:
+            return self._item_count
+        return len(self._item_list)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Menu item index out of range')
+
+        try:
+            return self._items[index]
+        except KeyError:
+            pass
+
+        menu = self._menu
+        item = menu.TextItem(self.text(index), menu.item_width, menu.item_height)
+        self._items[index] = item
+        return item
+
+    def text(self, index):
+        """Returns the text of an item without creating it
+        """
+        if callable(self._item_list):
+            return self._item_list(index)
+        return self._item_list[index]
+
+    def cached_indexes(self):
+        """Returns the sorted indexes of the items currently held
+        """
+        return sorted(self._items)
+
+    def update_window(self, page_start, items_per_page, prefetch_pages):
+        """Moves the window to cover a page and its neighbours
+
+        Items of the neighbouring pages are rendered so paging to them does
+        not have to wait on text rendering. Items outside the window are
+        dropped.
+
+        Args:
+            page_start (int): Index of the first visible item
+            items_per_page (int): Number of visible items
+            prefetch_pages (int): Number of pages kept before and after the visible page
+        """
+        self.window_start = max(0, page_start - (prefetch_pages * items_per_page))
+        self.window_end = min(len(self), page_start + ((prefetch_pages + 1) * items_per_page))
+
+        for index in [index for index in self._items if not self.window_start <= index < self.window_end]:
+            self._items.pop(index).clear_bitmap()
+
+        for index in range(self.window_start, self.window_end):
+            self[index].get_packed_bitmap()
+
+
 class TextListMenu(object):
     """Display a scrollable list of options.
     """
 
-    def __init__(self, ssd_display, item_list):
+    # Pages of items rendered ahead of time before and after the visible page
+    # of a virtual menu
+    prefetch_pages = 1
+
+    def __init__(self, ssd_display, item_list, virtual=False, item_count=None, hardware_scroll=False,
+                 double_buffer=True, transmitter=None):
+        """Creates a menu
+
+        Args:
+            ssd_display (SSD1306): Display the menu is drawn on
+            item_list (sequence or function): Texts of the items. A virtual
+                menu also accepts a function returning the text for an index.
+            virtual (bool): If True, items are created and rendered only for
+                the visible page and its neighbours. Use this for long lists.
+            item_count (int): Number of items when item_list is a function
+            hardware_scroll (bool): If True, the framebuffer covers the whole
+                display RAM and is used as a ring. Scrolling by one item moves
+                the display start line instead of scrolling and diffing the
+                framebuffer, and sends the exposed item and the previous
+                selection, a fixed two items per step. This is no less than
+                moving the selection within a page, so it saves bus traffic
+                only for items with dense pixels. The default path sends just
+                the text that changed, which is usually fewer bytes. Needs an
+                ssd1306extras.ssd1306.SSD1306 display whose RAM has at least
+                one item of rows off screen, where the exposed item is written
+                before the start line moves.
+            double_buffer (bool): If True, frames are presented by diffing
+                against the last frame sent
+            transmitter (BackgroundTransmitter): Optional transmitter that
+                sends double buffered frames from a background thread
+
+        Raises:
+            ValueError: If hardware_scroll is set and the display RAM has
+                fewer than item_height rows off screen
+        """
         self.ssd_display = ssd_display
         self.item_list = item_list
+        self.virtual = virtual
+        self.hardware_scroll = hardware_scroll
+        self.item_height = 16
+
+        if hardware_scroll and ssd_display.rows + self.item_height > ssd_display.GDDRAM_PAGES * 8:
+            # The exposed item would be written over rows still on screen
+            raise ValueError('Hardware scrolling needs {0} display RAM rows off screen'.format(self.item_height))
 
-        self._bitmap = bitmap.Bitmap(ssd_display.cols, ssd_display.rows)
+        if hardware_scroll:
+            self._bitmap = bitmap.Bitmap(ssd_display.cols, ssd_display.GDDRAM_PAGES * 8, bitmap.PAGE_LAYOUT)
+        else:
+            self._bitmap = bitmap.Bitmap(ssd_display.cols, ssd_display.rows, bitmap.PAGE_LAYOUT)
         self._items = []
 
-        self.item_height = 16
+        self._presenter = None
+        if double_buffer:
+            self._presenter = present.Presenter(ssd_display, self._bitmap, transmitter=transmitter)
+
+        # Framebuffer row shown at the top of the display when using hardware scrolling
+        self._start_line = 0
+
         self.item_width = ssd_display.cols
 
         self.items_per_page = ssd_display.rows / self.item_height
@@ -112,14 +278,23 @@ class TextListMenu(object):
         self.selected_index = 0
         self.page_start_index = 0
 
+        # Page start and selection shown by the last draw, or None when the
+        # whole screen needs to be drawn
+        self._drawn_page_start = None
+        self._drawn_selected_index = None
+
         # Create a new TextItem class that can be modified without affecting other menus
         self.TextItem = type('TextItem', TextItem.__bases__, dict(TextItem.__dict__))
         self.TextItem.adjust_margin()
         self.TextItem.set_indent(5)
 
-        self._create_items()
+        self._create_items(item_count)
+
+    def _create_items(self, item_count=None):
+        if self.virtual:
+            self._items = VirtualItems(self, self.item_list, item_count)
+            return
 
-    def _create_items(self):
         for text in self.item_list:
             new_item = self.TextItem(text, self.item_width, self.item_height)
             self._items.append(new_item)
@@ -129,12 +304,97 @@ class TextListMenu(object):
             raise IOError('Cannot find font: {0}'.format(font_file))
         self.TextItem.set_font_file(font_file)
         self.TextItem.set_font_size(size)
+        self.invalidate()
+
+    def invalidate(self):
+        """Makes the next draw render every visible item
+
+        Call this after changing how items look.
+        """
+        self._drawn_page_start = None
+        self._drawn_selected_index = None
 
     def draw(self):
-        for item, start_row, selected in self._find_displayable_items():
-            self._bitmap.draw_image(item.bitmap, 0, start_row, invert=selected)
-        bmap = self._bitmap.get_bitmap()
-        self.ssd_display.display_block(bmap, 0, 0, self._bitmap.width)
+        """Draws the visible items and sends the changed areas to the display
+
+        When the selection moved within the page only the two affected items
+        are drawn. When the page moved by one item the framebuffer is scrolled,
+        or the display start line moved when using hardware scrolling, and
+        only the newly exposed item and the selection are drawn.
+        """
+        with instrument.frame('menu'):
+            self._draw()
+
+    def _draw(self):
+        with instrument.phase(instrument.COMPOSITE):
+            displayable_items = self._find_displayable_items()
+            start_line = self._start_line
+            redraw = self._find_redraw_indexes()
+
+            for i, (item, start_row, selected) in enumerate(displayable_items):
+                if redraw is None or self.page_start_index + i in redraw:
+                    self._draw_item(item.get_packed_bitmap(invert=selected), start_row)
+
+            self._drawn_page_start = self.page_start_index
+            self._drawn_selected_index = self.selected_index
+
+            if self.virtual:
+                self._items.update_window(self.page_start_index, self.items_per_page, self.prefetch_pages)
+
+        if self._presenter is not None:
+            self._presenter.present()
+        else:
+            with instrument.phase(instrument.PACK):
+                blocks = self._bitmap.get_dirty_blocks()
+            with instrument.phase(instrument.TRANSMIT), self.ssd_display.frame_stats():
+                for row, col, block in blocks:
+                    self.ssd_display.display_block(block, row, col, block.cols)
+
+        # Move the start line only once the exposed item is in the display RAM
+        if self.hardware_scroll and (redraw is None or self._start_line != start_line):
+            with instrument.phase(instrument.TRANSMIT):
+                if self._presenter is not None and self._presenter.transmitter is not None:
+                    self._presenter.transmitter.flush()
+                self.ssd_display.set_start_line(self._start_line)
+
+    def _draw_item(self, item_bitmap, start_row):
+        if not self.hardware_scroll:
+            self._bitmap.draw_bitmap(item_bitmap, 0, start_row)
+            return
+
+        # Items that run past the end of the ring wrap around to the top
+        ring_rows = self._bitmap.height
+        row = (self._start_line + start_row) % ring_rows
+        self._bitmap.draw_bitmap(item_bitmap, 0, row)
+        if row + item_bitmap.height > ring_rows:
+            self._bitmap.draw_bitmap(item_bitmap, 0, row - ring_rows)
+
+    def _find_redraw_indexes(self):
+        """Prepares the framebuffer for an incremental draw
+
+        Returns:
+            Set of the item indexes that need to be drawn, or None if every
+            visible item does
+        """
+        if self._drawn_page_start is None:
+            return None
+
+        scrolled = self.page_start_index - self._drawn_page_start
+        if abs(scrolled) > 1:
+            return None
+
+        redraw = set([self.selected_index, self._drawn_selected_index])
+        if scrolled and self.hardware_scroll:
+            self._start_line = (self._start_line + (scrolled * self.item_height)) % self._bitmap.height
+        elif scrolled:
+            self._bitmap.scroll(-scrolled * self.item_height)
+
+        if scrolled > 0:
+            redraw.add(self.page_start_index + self.items_per_page - 1)
+        elif scrolled < 0:
+            redraw.add(self.page_start_index)
+
+        return redraw
 
     def _find_displayable_items(self):
         """Finds the items to be rendered on the display
@@ -1,41 +1,208 @@
 import bitmap
+import instrument
+import present
 
 
 class Panel(object):
     """Panel that can contain other panels
     """
 
-    def __init__(self, ssd_display, width=None, height=None, top=0, left=0):
+    def __init__(self, ssd_display, width=None, height=None, top=0, left=0, double_buffer=True,
+                 transmitter=None):
+        """Creates an empty panel
+
+        Args:
+            ssd_display (SSD1306): Display the panel is drawn on
+            width (int): Width of the panel, defaults to the display width
+            height (int): Height of the panel, defaults to the display height
+            top (int): Display row of the top of the panel
+            left (int): Display column of the left of the panel
+            double_buffer (bool): If True, frames are presented by diffing
+                against the last frame sent and the display is never cleared
+            transmitter (BackgroundTransmitter): Optional transmitter that
+                sends double buffered frames from a background thread
+        """
         self.ssd_display = ssd_display
         self.width = width if width is not None else ssd_display.cols
         self.height = height if height is not None else ssd_display.rows
 
-        self._bitmap = bitmap.Bitmap(self.width, self.height)
+        self._bitmap = bitmap.Bitmap(self.width, self.height, bitmap.PAGE_LAYOUT)
         self.top = top
         self.left = left
         self._item = None
         self._items = []
+        self._marquee = None
+
+        # Areas uncovered by removed widgets since the last composite
+        self._exposed = []
+
+        self._presenter = None
+        if double_buffer:
+            self._presenter = present.Presenter(ssd_display, self._bitmap, top, left, transmitter)
 
     def draw(self, refresh=False):
-        bitmap = self.bitmap
-        self.ssd_display.clear_display()
+        """Sends the parts of the panel that changed since the last draw
+
+        Nothing is sent while a marquee is running. The changes are kept and
+        sent by the first draw after stop_marquee.
 
-        if refresh:
-            self.ssd_display.display()
+        Args:
+            refresh (bool): If True the whole panel is sent. Without double
+                buffering the display is blanked first.
+        """
+        with instrument.frame('panel'):
+            with instrument.phase(instrument.COMPOSITE):
+                bitmap = self.bitmap
 
-        self.ssd_display.display_block(bitmap.get_bitmap(), self.top, self.left, self.width)
+            if self._marquee is not None:
+                return
+
+            if self._presenter is not None:
+                self._presenter.present(refresh)
+                return
+
+            if refresh:
+                with instrument.phase(instrument.TRANSMIT):
+                    self.ssd_display.clear_display()
+                    self.ssd_display.display()
+                bitmap.mark_dirty(0, 0, self.width, self.height)
+
+            with instrument.phase(instrument.PACK):
+                blocks = bitmap.get_dirty_blocks()
+
+            with instrument.phase(instrument.TRANSMIT), self.ssd_display.frame_stats():
+                for row, col, block in blocks:
+                    self.ssd_display.display_block(block, self.top + row, self.left + col, block.cols)
+
+    @property
+    def needs_draw(self):
+        """True if a widget changed, moved or was removed since the last composite
+
+        Widgets without a version are never reported as changed.
+        """
+        if self._exposed:
+            return True
+
+        for item in self._items:
+            version = getattr(item['obj'], 'version', None)
+            if item['rect'] is None or (version is not None and version != item['version']):
+                return True
+            widget_bitmap = item['obj'].bitmap
+            if (item['x'], item['y'], widget_bitmap.width, widget_bitmap.height) != item['rect']:
+                return True
+
+        return False
 
     @property
     def bitmap(self):
-        """Returms the bitmap for the panel
+        """Returns the bitmap for the panel
+
+        Only widgets whose version or position changed since the last call
+        are drawn again, along with any widget overlapping an area that was
+        drawn or uncovered. Widgets without a version are always drawn.
         """
+        damage = self._exposed
+        self._exposed = []
+
+        # Clear the areas of widgets that moved or changed size first, so a
+        # widget drawn before them is drawn again if it was partly cleared
+        layout = []
         for item in self._items:
-            self._bitmap.draw_bitmap(item['obj'].bitmap, item['x'], item['y'])
+            widget_bitmap = item['obj'].bitmap
+            rect = (item['x'], item['y'], widget_bitmap.width, widget_bitmap.height)
+            layout.append((item, widget_bitmap, rect))
+
+            if item['rect'] is not None and item['rect'] != rect:
+                self._bitmap.clear_block(*item['rect'])
+                damage.append(item['rect'])
+
+        for item, widget_bitmap, rect in layout:
+            version = getattr(item['obj'], 'version', None)
+
+            if (version is not None and version == item['version'] and rect == item['rect'] and
+                    not any(_overlaps(rect, area) for area in damage)):
+                continue
+
+            self._bitmap.draw_bitmap(widget_bitmap, item['x'], item['y'])
+            damage.append(rect)
+            item['version'] = version
+            item['rect'] = rect
 
         return self._bitmap
 
     def add_widget(self, widget, x=0, y=0):
         """Adds a widget to be rendered at the given location
         """
-        item = {'obj': widget, 'x': x, 'y': y}
+        item = {'obj': widget, 'x': x, 'y': y, 'version': None, 'rect': None}
         self._items.append(item)
+
+    def move_widget(self, widget, x, y):
+        """Moves a widget, clearing the area it leaves on the next draw
+        """
+        item = self._find_item(widget)
+        item['x'] = x
+        item['y'] = y
+
+    def remove_widget(self, widget):
+        """Removes a widget, clearing its area on the next draw
+        """
+        item = self._find_item(widget)
+        self._items.remove(item)
+
+        if item['rect'] is not None:
+            self._bitmap.clear_block(*item['rect'])
+            self._exposed.append(item['rect'])
+
+    def start_marquee(self, widget, frames=5, direction='left'):
+        """Scrolls a TextWidget's text using the display's hardware scroll
+
+        The text is sent once and the controller then scrolls it with no
+        further transfers. Hardware scrolling moves whole pages across the
+        full width of the display RAM, so the widget must start and end on a
+        page boundary and its rows scroll across the whole display.
+
+        Args:
+            widget (TextWidget): Widget added to this panel
+            frames (int): Frames between scroll steps
+            direction (str): 'left' or 'right'
+
+        Raises:
+            ValueError: If the widget is not in the panel or does not cover whole pages
+        """
+        item = self._find_item(widget)
+        row = self.top + item['y']
+        marquee = widget.marquee_bitmap(self.ssd_display.GDDRAM_COLS)
+
+        if row % 8 or marquee.height % 8:
+            raise ValueError('A marquee must start and end on a display page boundary')
+
+        self.stop_marquee()
+        if self._presenter is not None and self._presenter.transmitter is not None:
+            self._presenter.transmitter.flush()
+        self.ssd_display.display_block(marquee.get_bitmap(), row, 0, marquee.width)
+        self.ssd_display.start_horizontal_scroll(row / 8, ((row + marquee.height) / 8) - 1, frames, direction)
+        self._marquee = item
+
+    def stop_marquee(self):
+        """Stops a running marquee and marks the panel to be sent by the next draw
+        """
+        if self._marquee is None:
+            return
+
+        self.ssd_display.stop_scroll()
+        self._marquee = None
+        self._bitmap.mark_dirty(0, 0, self.width, self.height)
+        if self._presenter is not None:
+            self._presenter.invalidate()
+
+    def _find_item(self, widget):
+        for item in self._items:
+            if item['obj'] is widget:
+                return item
+        raise ValueError('Widget is not in this panel')
+
+
+def _overlaps(rect, other):
+    x, y, width, height = rect
+    other_x, other_y, other_width, other_height = other
+    return x < other_x + other_width and other_x < x + width and y < other_y + other_height and other_y < y + height
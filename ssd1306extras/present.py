@@ -0,0 +1,107 @@
+import bitmap
+import instrument
+
+
+class Presenter(object):
+    """Double buffered presentation of a Bitmap to a display
+
+    The owner draws into the back buffer. present() compares it against the
+    front buffer, a copy of the last frame sent, and sends only the columns
+    that differ. The display is never cleared between frames, so nothing
+    flickers and no blank frame is sent.
+    """
+
+    def __init__(self, ssd_display, back, top=0, left=0, transmitter=None):
+        """Creates a presenter for a back buffer
+
+        Args:
+            ssd_display (SSD1306): Display frames are sent to
+            back (Bitmap): PAGE_LAYOUT bitmap the owner draws into
+            top (int): Display row the bitmap is shown at
+            left (int): Display column the bitmap is shown at
+            transmitter (BackgroundTransmitter): Optional transmitter that
+                sends the frames from a background thread
+
+        Raises:
+            ValueError: If the back buffer is not a PAGE_LAYOUT bitmap
+        """
+        if back.layout != bitmap.PAGE_LAYOUT:
+            raise ValueError('The back buffer must use PAGE_LAYOUT')
+
+        self.ssd_display = ssd_display
+        self.back = back
+        self.front = None
+        self.top = top
+        self.left = left
+        self.transmitter = transmitter
+        self.frames = 0
+
+    def invalidate(self):
+        """Forgets the front buffer so the next frame is sent in full
+
+        Call this after the display was written to by something else.
+        """
+        self.front = None
+        self._invalidate_shadow()
+
+    def present(self, refresh=False):
+        """Sends the parts of the back buffer that differ from the last frame
+
+        Only the pages the back buffer recorded as dirty are compared, and
+        the dirty column spans are narrowed to the columns that really
+        changed.
+
+        Args:
+            refresh (bool): If True the whole frame is sent
+        """
+        back = self.back
+
+        with instrument.phase(instrument.PACK):
+            if refresh or self.front is None:
+                # The display would otherwise diff the frame against its own
+                # shadow of the display RAM and send nothing
+                self._invalidate_shadow()
+                changed = [(page, 0, back.width) for page in range(back.page_count)]
+            else:
+                changed = [span for span in (self._changed_span(*span) for span in back.dirty_spans())
+                           if span is not None]
+
+            back.mark_clean()
+            for page, col_start, col_end in changed:
+                back.mark_dirty(col_start, page * 8, col_end - col_start, 8)
+
+            blocks = back.get_dirty_blocks()
+            self.front = back.copy()
+
+        with instrument.phase(instrument.TRANSMIT):
+            if self.transmitter is not None:
+                self.transmitter.submit([(block, self.top + row, self.left + col) for row, col, block in blocks])
+            else:
+                with self.ssd_display.frame_stats():
+                    for row, col, block in blocks:
+                        self.ssd_display.display_block(block, self.top + row, self.left + col, block.cols)
+
+        self.frames += 1
+
+    def _invalidate_shadow(self):
+        invalidate_shadow = getattr(self.ssd_display, 'invalidate_shadow', None)
+        if invalidate_shadow is not None:
+            invalidate_shadow()
+
+    def _changed_span(self, page, col_start, col_end):
+        """Narrows a dirty page span to the columns that differ from the front buffer
+
+        Returns:
+            3-tuple of the page, first changed column and the column after the
+            last changed one, or None if nothing changed
+        """
+        start = ((page * self.back.width) + col_start) * 8
+        end = ((page * self.back.width) + col_end) * 8
+        diff = (self.back.bits[start:end] ^ self.front.bits[start:end]).tobytes()
+
+        trailing = len(diff.rstrip('\0'))
+        if not trailing:
+            return None
+
+        leading = len(diff) - len(diff.lstrip('\0'))
+        return (page, col_start + leading, col_start + trailing)
@@ -0,0 +1,423 @@
+"""Drawing primitives for Bitmap
+
+Every primitive is reduced to horizontal and vertical spans, and each span is
+written with a single bitarray slice assignment instead of pixel by pixel.
+The functions take whole batches, such as every sample of a chart, and mark
+the bitmap dirty once per call.
+"""
+import math
+
+import bitmap
+
+
+def hspans(bmap, spans, status=True):
+    """Sets or clears horizontal runs of pixels
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        spans (iterable): (x, y, length) tuples
+        status (bool): True to set the pixels, False to clear them
+    """
+    _draw_spans(bmap, [(x, y, length, 1) for x, y, length in spans], status)
+
+
+def vspans(bmap, spans, status=True):
+    """Sets or clears vertical runs of pixels
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        spans (iterable): (x, y, length) tuples
+        status (bool): True to set the pixels, False to clear them
+    """
+    _draw_spans(bmap, [(x, y, 1, length) for x, y, length in spans], status)
+
+
+def line(bmap, x0, y0, x1, y1, status=True):
+    """Draws a line between two points, including both end points
+    """
+    lines(bmap, [(x0, y0, x1, y1)], status)
+
+
+def lines(bmap, segments, status=True):
+    """Draws a batch of lines
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        segments (iterable): (x0, y0, x1, y1) tuples
+        status (bool): True to set the pixels, False to clear them
+    """
+    spans = []
+    for x0, y0, x1, y1 in segments:
+        spans.extend(_line_spans(x0, y0, x1, y1))
+    _draw_spans(bmap, spans, status)
+
+
+def polyline(bmap, points, status=True, closed=False):
+    """Draws lines joining a sequence of points
+
+    Points one column apart from left to right, such as the samples of a
+    chart, take the same path as chart and draw as fast.
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        points (sequence): (x, y) tuples, such as the samples of a chart
+        status (bool): True to set the pixels, False to clear them
+        closed (bool): If True, the last point is joined to the first
+    """
+    points = list(points)
+    if len(points) == 1:
+        points = points * 2
+
+    # Points one column apart, such as the samples of a chart, are drawn as
+    # one vertical span per column
+    start = points[0][0]
+    if not closed and [px for px, _ in points] == range(start, start + len(points)):
+        _draw_spans(bmap, _column_spans(start, [py for _, py in points]), status)
+        return
+
+    if closed and len(points) > 2:
+        points.append(points[0])
+
+    spans = []
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        segment = _line_spans(x0, y0, x1, y1)
+        if spans:
+            _join_spans(spans, segment)
+        spans.extend(segment)
+    _draw_spans(bmap, spans, status)
+
+
+def chart(bmap, values, x=0, y=0, height=None, status=True):
+    """Draws a line chart with one sample per column
+
+    Produces the same pixels as a polyline through the samples, but as one
+    vertical span per column.
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        values (sequence): Samples between 0.0 and 1.0, drawn left to right
+        x (int): Column of the first sample
+        y (int): Top row of the chart
+        height (int): Number of rows for the chart, defaults to the bitmap height
+        status (bool): True to set the pixels, False to clear them
+    """
+    if height is None:
+        height = bmap.height - y
+
+    bottom = y + height - 1
+    rows = [bottom - int(round(min(1.0, max(0.0, value)) * (height - 1))) for value in values]
+    _draw_spans(bmap, _column_spans(x, rows), status)
+
+
+def _column_spans(x, rows):
+    """Returns the vertical spans of a polyline through one point per column
+
+    Args:
+        x (int): Column of the first point
+        rows (list): Row of the point in each column
+
+    Returns:
+        List of (x, y, width, height) spans, one per column
+    """
+    lows = list(rows)
+    highs = list(rows)
+
+    # A line one column wide and s rows tall puts its first ceil(s / 2) rows
+    # in the left column and the rest in the right one
+    for i in range(len(rows) - 1):
+        start, end = rows[i], rows[i + 1]
+        if end > start + 1:
+            split = start + ((end - start + 1) / 2)
+            if split - 1 > highs[i]:
+                highs[i] = split - 1
+            if split < lows[i + 1]:
+                lows[i + 1] = split
+        elif start > end + 1:
+            split = start - ((start - end + 1) / 2)
+            if split + 1 < lows[i]:
+                lows[i] = split + 1
+            if split > highs[i + 1]:
+                highs[i + 1] = split
+
+    return [(x + i, lows[i], 1, highs[i] - lows[i] + 1) for i in range(len(rows))]
+
+
+def circle(bmap, cx, cy, radius, status=True, fill=False):
+    """Draws a circle
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        cx (int): Column of the centre
+        cy (int): Row of the centre
+        radius (int): Radius in pixels
+        status (bool): True to set the pixels, False to clear them
+        fill (bool): If True, the inside of the circle is filled
+    """
+    if fill:
+        rows = {}
+        for x, y in _circle_points(radius):
+            rows[y] = max(rows.get(y, 0), abs(x))
+        spans = [(cx - half_width, cy + y, (2 * half_width) + 1, 1) for y, half_width in rows.items()]
+    else:
+        spans = _point_spans((cx + x, cy + y) for x, y in _circle_points(radius))
+
+    _draw_spans(bmap, spans, status)
+
+
+def arc(bmap, cx, cy, radius, start_angle, end_angle, status=True):
+    """Draws part of a circle's outline
+
+    Angles are in degrees, counter-clockwise from the right of the centre,
+    so 90 is straight up.
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        cx (int): Column of the centre
+        cy (int): Row of the centre
+        radius (int): Radius in pixels
+        start_angle (float): Angle the arc starts at
+        end_angle (float): Angle the arc ends at, going counter-clockwise
+        status (bool): True to set the pixels, False to clear them
+    """
+    sweep = (end_angle - start_angle) % 360
+    if end_angle != start_angle and sweep == 0:
+        sweep = 360
+
+    points = []
+    for x, y in _circle_points(radius):
+        angle = math.degrees(math.atan2(-y, x))
+        if (angle - start_angle) % 360 <= sweep:
+            points.append((cx + x, cy + y))
+
+    _draw_spans(bmap, _point_spans(points), status)
+
+
+def polygon(bmap, points, status=True, fill=True):
+    """Draws a polygon, filled by default
+
+    The fill covers every pixel whose centre is inside the polygon by the
+    even-odd rule, and the outline is always drawn so thin polygons stay
+    visible.
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        points (sequence): (x, y) tuples of the corners
+        status (bool): True to set the pixels, False to clear them
+        fill (bool): If True, the inside of the polygon is filled
+    """
+    points = list(points)
+    spans = []
+
+    if fill and len(points) > 2:
+        edges = [(points[i], points[(i + 1) % len(points)]) for i in range(len(points))]
+        top = max(0, min(py for _, py in points))
+        bottom = min(bmap.height - 1, max(py for _, py in points))
+
+        for row in range(top, bottom + 1):
+            centre = row + 0.5
+            crossings = []
+            for (ax, ay), (bx, by) in edges:
+                if min(ay, by) <= centre < max(ay, by):
+                    crossings.append(ax + ((centre - ay) * (bx - ax) / float(by - ay)))
+            crossings.sort()
+
+            for left, right in zip(crossings[::2], crossings[1::2]):
+                start = int(math.ceil(left - 0.5))
+                end = int(math.floor(right - 0.5))
+                if end >= start:
+                    spans.append((start, row, end - start + 1, 1))
+
+    closed = points + points[:1] if len(points) > 2 else points
+    for i in range(len(closed) - 1):
+        spans.extend(_line_spans(*(closed[i] + closed[i + 1])))
+
+    _draw_spans(bmap, spans, status)
+
+
+def _line_spans(x0, y0, x1, y1):
+    """Splits a line into the runs of pixels Bresenham's algorithm would set
+
+    The minor coordinate of step i along the major axis is
+    round(i * minor / major), so the steps sharing a minor coordinate are
+    found directly instead of stepping through every pixel.
+
+    Returns:
+        List of (x, y, width, height) spans
+    """
+    dx = x1 - x0
+    dy = y1 - y0
+    horizontal = abs(dx) >= abs(dy)
+
+    major, minor = (dx, dy) if horizontal else (dy, dx)
+    steps = abs(major)
+    major_step = 1 if major >= 0 else -1
+    minor_step = 1 if minor >= 0 else -1
+    minor = abs(minor)
+
+    if minor == 0:
+        if horizontal:
+            return [(min(x0, x1), y0, steps + 1, 1)]
+        return [(x0, min(y0, y1), 1, steps + 1)]
+
+    if minor == 1:
+        # The first half of the steps, rounded up, keep the starting minor
+        # coordinate. Lines through neighbouring chart samples all take this path.
+        split = (steps + 1) // 2
+        runs = ((0, 0, split - 1), (1, split, steps))
+    else:
+        # Step i has minor coordinate k for ceil((2k - 1) * steps / 2minor) <= i
+        # and i < ceil((2k + 1) * steps / 2minor). The numerator of the second
+        # bound grows by 2 * steps for each k.
+        runs = []
+        denominator = 2 * minor
+        numerator = steps
+        first = 0
+        for k in range(minor + 1):
+            following = -(-numerator // denominator)
+            numerator += 2 * steps
+            last = following - 1 if following <= steps else steps
+            if last >= first:
+                runs.append((k, first, last))
+            first = following
+
+    spans = []
+    for k, first, last in runs:
+        # Runs that go backwards start from their far end
+        major_pos = first if major_step > 0 else -last
+        minor_pos = k * minor_step
+        if horizontal:
+            spans.append((x0 + major_pos, y0 + minor_pos, last - first + 1, 1))
+        else:
+            spans.append((x0 + minor_pos, y0 + major_pos, 1, last - first + 1))
+
+    return spans
+
+
+def _join_spans(spans, segment):
+    """Merges the first span of a polyline segment into the last span drawn
+
+    Both spans hold the point the segments share, so when they run the
+    same way they overlap and can be drawn as one.
+    """
+    x, y, width, height = spans[-1]
+    next_x, next_y, next_width, next_height = segment[0]
+
+    if width == 1 and next_width == 1:
+        top = min(y, next_y)
+        spans[-1] = (x, top, 1, max(y + height, next_y + next_height) - top)
+        del segment[0]
+    elif height == 1 and next_height == 1:
+        left = min(x, next_x)
+        spans[-1] = (left, y, max(x + width, next_x + next_width) - left, 1)
+        del segment[0]
+
+
+def _circle_points(radius):
+    """Returns the outline of a circle centred on 0, 0 by the midpoint algorithm
+    """
+    points = set()
+    x = radius
+    y = 0
+    error = 1 - radius
+
+    while x >= y:
+        for px, py in ((x, y), (y, x), (-y, x), (-x, y), (-x, -y), (-y, -x), (y, -x), (x, -y)):
+            points.add((px, py))
+        y += 1
+        if error < 0:
+            error += (2 * y) + 1
+        else:
+            x -= 1
+            error += (2 * (y - x)) + 1
+
+    return points
+
+
+def _point_spans(points):
+    """Joins points that sit next to each other on a row into horizontal spans
+    """
+    rows = {}
+    for x, y in points:
+        rows.setdefault(y, []).append(x)
+
+    spans = []
+    for y, columns in rows.items():
+        columns.sort()
+        start = previous = columns[0]
+        for x in columns[1:]:
+            if x == previous or x == previous + 1:
+                previous = x
+                continue
+            spans.append((start, y, previous - start + 1, 1))
+            start = previous = x
+        spans.append((start, y, previous - start + 1, 1))
+
+    return spans
+
+
+def _draw_spans(bmap, spans, status):
+    """Writes spans to a bitmap, each with one slice assignment
+
+    Args:
+        bmap (Bitmap): Bitmap to draw on
+        spans (list): (x, y, width, height) tuples where width or height is 1
+        status (bool): True to set the pixels, False to clear them
+    """
+    bits = bmap.bits
+    width = bmap.width
+    height = bmap.height
+    page_layout = bmap.layout == bitmap.PAGE_LAYOUT
+    left = top = right = bottom = None
+
+    for x, y, span_width, span_height in spans:
+        if x < 0 or y < 0 or x + span_width > width or y + span_height > height:
+            x, y, span_width, span_height = _clip(x, y, span_width, span_height, width, height)
+            if span_width <= 0 or span_height <= 0:
+                continue
+
+        if span_height == 1:
+            if page_layout:
+                start = ((((y >> 3) * width) + x) << 3) + (y & 7)
+                bits[start:start + (span_width << 3):8] = status
+            else:
+                start = (y * width) + x
+                bits[start:start + span_width] = status
+        elif page_layout:
+            # A column's rows are contiguous within each page
+            row = y
+            end = y + span_height
+            while row < end:
+                page_rows = 8 - (row & 7)
+                if page_rows > end - row:
+                    page_rows = end - row
+                start = ((((row >> 3) * width) + x) << 3) + (row & 7)
+                bits[start:start + page_rows] = status
+                row += page_rows
+        else:
+            start = (y * width) + x
+            bits[start:start + (span_height * width):width] = status
+
+        if left is None:
+            left, top, right, bottom = x, y, x + span_width, y + span_height
+            continue
+        if x < left:
+            left = x
+        if y < top:
+            top = y
+        if x + span_width > right:
+            right = x + span_width
+        if y + span_height > bottom:
+            bottom = y + span_height
+
+    if left is not None:
+        bmap.mark_dirty(left, top, right - left, bottom - top)
+
+
+def _clip(x, y, span_width, span_height, width, height):
+    if x < 0:
+        span_width += x
+        x = 0
+    if y < 0:
+        span_height += y
+        y = 0
+    return x, y, min(span_width, width - x), min(span_height, height - y)
@@ -0,0 +1,208 @@
+import collections
+import threading
+import time
+
+
+# Timing of one rendered frame. start is the clock time the frame started,
+# seconds is how long drawing it took and skipped is the number of frame
+# slots that were dropped because it overran the next deadline.
+FrameTiming = collections.namedtuple('FrameTiming', ['frame', 'start', 'seconds', 'skipped'])
+
+# Counters for a FrameScheduler. missed_deadlines counts the frames that took
+# longer than one frame interval, skipped_frames the frame slots given up
+# because of them.
+SchedulerStats = collections.namedtuple('SchedulerStats', ['frames', 'invalidations', 'skipped_frames',
+                                                           'missed_deadlines', 'last_frame_seconds',
+                                                           'max_frame_seconds', 'mean_frame_seconds'])
+
+
+class FrameScheduler(object):
+    """Paces the drawing of a Panel to a target frame rate
+
+    Widget updates only mark the panel as needing a frame. The scheduler draws
+    at most once per frame interval, so any number of updates between two
+    frames is sent to the display as one frame showing the latest state. A
+    frame that takes longer than the interval makes the scheduler skip the
+    slots it overran instead of trying to catch up.
+
+    Widgets may be updated from other threads while the scheduler thread runs
+    as long as the update is made while holding lock:
+
+        with scheduler.lock:
+            progress.percent = reading
+        scheduler.invalidate()
+    """
+
+    # Seconds between checks for changed widget versions when nothing called
+    # invalidate, None to check once per frame interval
+    poll_interval = None
+
+    def __init__(self, panel, fps=30, on_frame=None, clock=time.time):
+        """Creates a scheduler
+
+        Args:
+            panel (Panel): Panel to draw. Any object with a draw method works,
+                and its needs_draw property is checked if it has one.
+            fps (float): Target frame rate
+            on_frame (callable): Called with a FrameTiming after every frame
+            clock (callable): Returns the current time in seconds
+
+        Raises:
+            ValueError: If fps is not positive
+        """
+        if fps <= 0:
+            raise ValueError('fps must be positive')
+
+        self.panel = panel
+        self.fps = fps
+        self.on_frame = on_frame
+        self.clock = clock
+        self.lock = threading.RLock()
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._invalidated = False
+        self._next_frame = None
+
+        self.frames = 0
+        self.invalidations = 0
+        self.skipped_frames = 0
+        self.missed_deadlines = 0
+        self.last_frame_seconds = 0.0
+        self.max_frame_seconds = 0.0
+        self.total_frame_seconds = 0.0
+
+    @property
+    def interval(self):
+        """Seconds between frames
+        """
+        return 1.0 / self.fps
+
+    def invalidate(self):
+        """Marks the panel as needing a frame
+
+        Safe to call from any thread and as often as needed.
+        """
+        with self._condition:
+            self._invalidated = True
+            self.invalidations += 1
+            self._condition.notify_all()
+
+    def pending(self):
+        """Returns True if a frame would be drawn once its slot comes up
+        """
+        if self._invalidated:
+            return True
+        with self.lock:
+            return getattr(self.panel, 'needs_draw', False)
+
+    def tick(self, now=None):
+        """Draws a frame if one is pending and its slot has come up
+
+        Call this from an existing main loop instead of using start().
+
+        Args:
+            now (float): Current clock time, read from the clock if not given
+
+        Returns:
+            True if a frame was drawn
+        """
+        if now is None:
+            now = self.clock()
+
+        interval = self.interval
+        deadline = self._next_frame
+
+        if deadline is not None and now < deadline:
+            return False
+        if not self.pending():
+            return False
+
+        # After an idle spell the schedule restarts from now rather than
+        # counting the quiet slots as skipped
+        if deadline is None or now - deadline >= interval:
+            deadline = now
+
+        with self._condition:
+            self._invalidated = False
+
+        with self.lock:
+            start = self.clock()
+            self.panel.draw()
+            seconds = self.clock() - start
+
+        next_frame = deadline + interval
+        skipped = 0
+        if start + seconds > next_frame:
+            skipped = int((start + seconds - next_frame) / interval) + 1
+            next_frame += skipped * interval
+            self.missed_deadlines += 1
+            self.skipped_frames += skipped
+        self._next_frame = next_frame
+
+        self.frames += 1
+        self.last_frame_seconds = seconds
+        self.max_frame_seconds = max(self.max_frame_seconds, seconds)
+        self.total_frame_seconds += seconds
+
+        if self.on_frame is not None:
+            self.on_frame(FrameTiming(self.frames, start, seconds, skipped))
+
+        return True
+
+    def start(self):
+        """Starts drawing frames from a background thread
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ssd1306-scheduler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stops the background thread, waiting for the frame being drawn
+        """
+        with self._condition:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+
+        thread.join()
+        self._thread = None
+
+    def stats(self):
+        """Returns the scheduler counters
+
+        Returns:
+            SchedulerStats namedtuple
+        """
+        mean = self.total_frame_seconds / self.frames if self.frames else 0.0
+        return SchedulerStats(self.frames, self.invalidations, self.skipped_frames, self.missed_deadlines,
+                              self.last_frame_seconds, self.max_frame_seconds, mean)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+
+                now = self.clock()
+                if self._next_frame is not None and now < self._next_frame:
+                    self._condition.wait(self._next_frame - now)
+                    continue
+
+            # lock is taken outside the condition, since callers may
+            # invalidate while holding it
+            if self.tick():
+                continue
+
+            # Widgets updated without invalidate are found by polling
+            poll = self.poll_interval if self.poll_interval is not None else self.interval
+            with self._condition:
+                if not self._invalidated and not self._stopping:
+                    self._condition.wait(poll)
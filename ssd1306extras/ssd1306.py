@@ -1,9 +1,191 @@
-import gaugette.ssd1306
+import collections
+import contextlib
+import re
 
+from bitarray import bitarray
 
-class SSD1306(gaugette.ssd1306.SSD1306):
+try:
+    from gaugette import ssd1306 as gaugette_ssd1306
+except ImportError:
+    # Lets EmulatedSSD1306 and the benchmarks run without the hardware stack
+    import fake_gaugette as gaugette_ssd1306
+
+
+# Byte counts for a frame, the blocks sent inside one frame_stats block or a
+# single display_block call outside one. total_bytes is what would have been
+# sent without diffing, spans is the number of column spans sent.
+FrameStats = collections.namedtuple('FrameStats', ['total_bytes', 'sent_bytes', 'saved_bytes', 'spans'])
+
+
+class SSD1306(gaugette_ssd1306.SSD1306):
+
+    # Size of the controller's display RAM
+    GDDRAM_PAGES = 8
+    GDDRAM_COLS = 128
+
+    # Scrolling commands
+    RIGHT_HORIZ_SCROLL = 0x26
+    LEFT_HORIZ_SCROLL = 0x27
+    VERT_AND_RIGHT_HORIZ_SCROLL = 0x29
+    VERT_AND_LEFT_HORIZ_SCROLL = 0x2A
+    DEACTIVATE_SCROLL = 0x2E
+    ACTIVATE_SCROLL = 0x2F
+    SET_VERTICAL_SCROLL_AREA = 0xA3
+    SET_START_LINE = 0x40
+
+    SCROLL_LEFT = 'left'
+    SCROLL_RIGHT = 'right'
+
+    # Frames between scroll steps, mapped to the value the controller expects
+    SCROLL_INTERVALS = {2: 0x07, 3: 0x04, 4: 0x05, 5: 0x00, 25: 0x06, 64: 0x01, 128: 0x02, 256: 0x03}
+
+    # When True, display_block compares the data against a shadow copy of the
+    # display RAM and only sends the column spans that changed
+    diff_updates = True
+
+    # Changed spans separated by this many unchanged columns or fewer are sent
+    # as one span. Starting a new span costs 6 command bytes.
+    merge_gap = 6
+
+    # Largest number of bytes passed to data() at once. spidev refuses
+    # transfers larger than its buffer, 4096 bytes by default.
+    max_transfer = 4096
+
+    # Lock held while display_block sends a block, shared by displays on the
+    # same bus so their transfers do not interleave. None for no locking.
+    bus_lock = None
+
+    _shadow = None
+    _shadow_known = None
+    _frame_totals = None
+    last_frame_stats = None
+    bytes_sent = 0
+    bytes_saved = 0
+
+    # True while the controller is scrolling the display RAM
+    scrolling = False
+
+    # Display RAM row shown at the top of the display
+    start_line = 0
+
+    def reset(self):
+        gaugette_ssd1306.SSD1306.reset(self)
+        self.invalidate_shadow()
+        self.scrolling = False
+        self.start_line = 0
+
+    def start_horizontal_scroll(self, page_start=0, page_end=None, frames=5, direction=SCROLL_LEFT):
+        """Starts the controller scrolling pages of the display RAM sideways
+
+        The pages scroll across the full width of the display RAM and wrap
+        around without any data being sent. Do not write to the display while
+        it scrolls.
+
+        Args:
+            page_start (int): First page to scroll
+            page_end (int): Last page to scroll, defaults to the last page
+            frames (int): Frames between steps, one of SCROLL_INTERVALS
+            direction (str): SCROLL_LEFT or SCROLL_RIGHT
+        """
+        if page_end is None:
+            page_end = self.GDDRAM_PAGES - 1
+
+        command = self.LEFT_HORIZ_SCROLL if direction == self.SCROLL_LEFT else self.RIGHT_HORIZ_SCROLL
+
+        self.command(self.DEACTIVATE_SCROLL)
+        self.command(command, 0x00, page_start, self._scroll_interval(frames), page_end, 0x00, 0xFF)
+        self.command(self.ACTIVATE_SCROLL)
+        self.scrolling = True
+
+    def start_diagonal_scroll(self, vertical_offset, page_start=0, page_end=None, frames=5,
+                              direction=SCROLL_LEFT, area_top=0, area_rows=None):
+        """Starts the controller scrolling sideways and vertically at once
+
+        Args:
+            vertical_offset (int): Rows moved up on each step
+            page_start (int): First page to scroll sideways
+            page_end (int): Last page to scroll sideways, defaults to the last page
+            frames (int): Frames between steps, one of SCROLL_INTERVALS
+            direction (str): SCROLL_LEFT or SCROLL_RIGHT
+            area_top (int): First row of the vertically scrolling area
+            area_rows (int): Number of rows in the vertically scrolling area,
+                defaults to the rows of the display
+        """
+        if page_end is None:
+            page_end = self.GDDRAM_PAGES - 1
+        if area_rows is None:
+            area_rows = self.rows
+
+        if direction == self.SCROLL_LEFT:
+            command = self.VERT_AND_LEFT_HORIZ_SCROLL
+        else:
+            command = self.VERT_AND_RIGHT_HORIZ_SCROLL
+
+        self.command(self.DEACTIVATE_SCROLL)
+        self.command(self.SET_VERTICAL_SCROLL_AREA, area_top, area_rows)
+        self.command(command, 0x00, page_start, self._scroll_interval(frames), page_end, vertical_offset)
+        self.command(self.ACTIVATE_SCROLL)
+        self.scrolling = True
+
+    def stop_scroll(self):
+        """Stops hardware scrolling
+
+        Scrolling moves the contents of the display RAM, so the shadow is
+        invalidated and the next blocks are sent in full.
+        """
+        self.command(self.DEACTIVATE_SCROLL)
+        self.scrolling = False
+        self.invalidate_shadow()
+
+    def set_start_line(self, line):
+        """Sets the display RAM row shown at the top of the display
+
+        Moving the start line scrolls the display vertically without sending
+        any data. Rows past the end of the display RAM wrap around to row 0.
+
+        Args:
+            line (int): Display RAM row, wrapped to the rows of the display RAM
+        """
+        self.start_line = line % (self.GDDRAM_PAGES * 8)
+        self.command(self.SET_START_LINE | self.start_line)
+
+    def _scroll_interval(self, frames):
+        try:
+            return self.SCROLL_INTERVALS[frames]
+        except KeyError:
+            raise ValueError('Scroll interval must be one of {0} frames'.format(sorted(self.SCROLL_INTERVALS)))
+
+    def invalidate_shadow(self):
+        """Forgets the shadow display RAM so the next blocks are sent in full
+
+        Call this after writing to the display without display_block.
+        """
+        self._shadow = None
+
+    @contextlib.contextmanager
+    def frame_stats(self):
+        """Counts every block sent inside the with block as one frame
+
+        last_frame_stats is set once the block ends, rather than after each
+        display_block call.
+        """
+        self._frame_totals = [0, 0, 0]
+        try:
+            yield
+        finally:
+            total_bytes, sent_bytes, spans = self._frame_totals
+            self._frame_totals = None
+            self.last_frame_stats = FrameStats(total_bytes, sent_bytes, total_bytes - sent_bytes, spans)
 
     def display_block(self, bitmap, row, col, col_count, col_offset=0):
+        if self.bus_lock is None:
+            self._display_block(bitmap, row, col, col_count, col_offset)
+            return
+
+        with self.bus_lock:
+            self._display_block(bitmap, row, col, col_count, col_offset)
+
+    def _display_block(self, bitmap, row, col, col_count, col_offset):
         mode = self.MEMORY_MODE_VERT
 
         try:
@@ -17,17 +199,156 @@ class SSD1306(gaugette.ssd1306.SSD1306):
         page_end = page_start + page_count - 1
         col_start = col
         col_end = col + col_count - 1
+        start = col_offset * page_count
+        length = col_count * page_count
+        data = bitmap.data
+        if start or length != len(data):
+            data = data[start:start+length]
+
+        if self.diff_updates and page_end < self.GDDRAM_PAGES and col_end < self.GDDRAM_COLS:
+            pages = self._split_pages(data, mode, page_count, col_count)
+            self._display_changes(pages, page_start, col_start)
+            return
+
+        # Whatever lies outside the display RAM wraps around, so stop trusting the shadow
+        self.invalidate_shadow()
         self.command(self.SET_MEMORY_MODE, mode)
         self.command(self.SET_PAGE_ADDRESS, page_start, page_end)
         self.command(self.SET_COL_ADDRESS, col_start, col_end)
-        start = col_offset * page_count
-        length = col_count * page_count
-        self.data(bitmap.data[start:start+length])
+        self.write_data(data)
+        self._record_frame(len(data), len(data), 1)
+
+    def write_data(self, data):
+        """Sends display data in writes of at most max_transfer bytes
+
+        Data that fits in one write is passed to data() as it is, without
+        being copied.
+
+        Args:
+            data (bytearray): Bytes to send, a list of ints also works
+        """
+        max_transfer = self.max_transfer
+        if len(data) <= max_transfer:
+            self.data(data)
+            return
+
+        for start in range(0, len(data), max_transfer):
+            self.data(data[start:start + max_transfer])
+
+    def _split_pages(self, data, mode, page_count, col_count):
+        """Splits block data into the bytes written to each page
+
+        Returns:
+            List with a bytearray of col_count bytes for every page
+        """
+        data = bytearray(data) if isinstance(data, list) else data
+
+        if mode == self.MEMORY_MODE_VERT:
+            return [data[page::page_count] for page in range(page_count)]
+
+        return [data[page * col_count:(page + 1) * col_count] for page in range(page_count)]
+
+    def _display_changes(self, pages, page_start, col_start):
+        """Sends the column spans of each page that differ from the shadow display RAM
+
+        Pages whose only span covers the same columns as the span on the page
+        above are sent together in one window.
 
-    class Bitmap(gaugette.ssd1306.SSD1306.Bitmap):
+        Args:
+            pages (list): List of new bytes for each page
+            page_start (int): Page the first list is written to
+            col_start (int): Column the lists start at
+        """
+        if self._shadow is None:
+            self._shadow = bytearray(self.GDDRAM_PAGES * self.GDDRAM_COLS)
+            self._shadow_known = bytearray(len(self._shadow))
+
+        shadow = self._shadow
+        known = self._shadow_known
+        total_bytes = 0
+        windows = []
+
+        for i, page_data in enumerate(pages):
+            page = page_start + i
+            offset = (page * self.GDDRAM_COLS) + col_start
+            end = offset + len(page_data)
+            total_bytes += len(page_data)
+
+            if shadow[offset:end] == page_data and known.find('\0', offset, end) < 0:
+                continue
+
+            spans = self._changed_spans(shadow, known, offset, page_data)
+            shadow[offset:end] = page_data
+            known[offset:end] = '\xff' * len(page_data)
+
+            if len(spans) == 1 and windows:
+                last = windows[-1]
+                if last[1] == page - 1 and last[2:4] == spans[0]:
+                    last[1] = page
+                    last[4].extend(page_data[spans[0][0]:spans[0][1]])
+                    continue
+
+            for span_start, span_end in spans:
+                windows.append([page, page, span_start, span_end, page_data[span_start:span_end]])
+
+        if windows:
+            self.command(self.SET_MEMORY_MODE, self.MEMORY_MODE_HORIZ)
+
+        sent_bytes = 0
+        for first_page, last_page, span_start, span_end, window_data in windows:
+            self.command(self.SET_PAGE_ADDRESS, first_page, last_page)
+            self.command(self.SET_COL_ADDRESS, col_start + span_start, col_start + span_end - 1)
+            self.write_data(window_data)
+            sent_bytes += len(window_data)
+
+        self._record_frame(total_bytes, sent_bytes, len(windows))
+
+    def _changed_spans(self, shadow, known, offset, page_data):
+        """Finds the column spans of page_data that differ from the shadow
+
+        Args:
+            shadow (bytearray): Shadow of the display RAM
+            known (bytearray): 0xFF for every shadow byte that holds what the
+                display RAM holds, 0 for the others
+            offset (int): Shadow index of the first byte of page_data
+            page_data (bytearray): New bytes for the page
+
+        Returns:
+            List of [start, end) column pairs relative to the start of
+            page_data, combining spans no more than merge_gap columns apart
+        """
+        end = offset + len(page_data)
+        changed = _bits(page_data) ^ _bits(shadow[offset:end])
+        if known.find('\0', offset, end) >= 0:
+            changed |= ~_bits(known[offset:end])
+
+        # Every changed byte is non zero, so each match is a run of changed
+        # bytes with gaps of at most merge_gap unchanged ones
+        pattern = '[^\0](?:\0{{0,{0}}}[^\0])*'.format(self.merge_gap)
+        return [[match.start(), match.end()] for match in re.finditer(pattern, changed.tobytes())]
+
+    def _record_frame(self, total_bytes, sent_bytes, spans):
+        totals = self._frame_totals
+        if totals is None:
+            self.last_frame_stats = FrameStats(total_bytes, sent_bytes, total_bytes - sent_bytes, spans)
+        else:
+            totals[0] += total_bytes
+            totals[1] += sent_bytes
+            totals[2] += spans
+        self.bytes_sent += sent_bytes
+        self.bytes_saved += total_bytes - sent_bytes
+
+    class Bitmap(gaugette_ssd1306.SSD1306.Bitmap):
 
         def __init__(self, cols, rows, data=None, mode=None):
-            """Creates a bitmap without initializing a data list
+            """Creates a bitmap around existing data
+
+            Args:
+                cols (int): Number of columns
+                rows (int): Number of rows, a multiple of 8
+                data (bytearray): Packed bytes, kept without being copied.
+                    Defaults to a blank bytearray.
+                mode (int): Memory addressing mode the bytes are ordered for
             """
             self.mode = mode
             self.rows = rows
@@ -36,10 +357,10 @@ class SSD1306(gaugette.ssd1306.SSD1306):
             self.data = data
 
             if self.data is None:
-                self.data = [0] * (self.cols * self.bytes_per_col)
+                self.data = bytearray(self.cols * self.bytes_per_col)
 
         def dump(self):
-            if self.mode == gaugette.ssd1306.SSD1306.MEMORY_MODE_VERT or self.mode is None:
+            if self.mode == gaugette_ssd1306.SSD1306.MEMORY_MODE_VERT or self.mode is None:
                 super(SSD1306.Bitmap, self).dump()
                 return
 
@@ -55,3 +376,9 @@ class SSD1306(gaugette.ssd1306.SSD1306):
                         else:
                             line += ' '
                     print('|'+line+'|')
+
+
+def _bits(data):
+    bits = bitarray()
+    bits.frombytes(bytes(data))
+    return bits
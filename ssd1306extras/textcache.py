@@ -0,0 +1,84 @@
+import collections
+
+import bitmap
+import instrument
+import util.cache
+import util.text
+
+
+# A rendered string as a PIL image and as a Bitmap. Both are shared between
+# every user of the cache and must not be modified.
+RenderedText = collections.namedtuple('RenderedText', ['image', 'bitmap'])
+
+# Bytes of rendered text kept unless changed with set_cache_size
+DEFAULT_CACHE_SIZE = 128 * 1024
+
+# Bytes of overhead counted for each cache entry besides its pixel data
+ENTRY_OVERHEAD = 256
+
+
+def _sizeof(rendered):
+    width, height = rendered.image.size
+    return ((width * height) / 8) + (len(rendered.bitmap.bits) / 8) + ENTRY_OVERHEAD
+
+
+_cache = util.cache.LRUCache(max_size=DEFAULT_CACHE_SIZE, sizeof=_sizeof)
+instrument.register_cache('text', _cache.info)
+
+
+def render(text, font_file, size, width, height, expand=False, margin=None, invert=False):
+    """Returns a rendered string, rasterizing it through PIL only on a cache miss
+
+    Args:
+        text (str): Text to be rendered
+        font_file (str): Path to the font file
+        size (int): Font size of the text
+        width (int): Width of the image
+        height (int): Height of the image
+        expand (bool): If True, the image will be horizontally expanded to fit the text
+        margin (Margin): Placement for text
+        invert (bool): If True, the bitmap has the text inverted. The image is
+            never inverted.
+
+    Returns:
+        RenderedText namedtuple
+    """
+    if margin is None:
+        margin = util.text.Margin(0, 0, 0, 0)
+
+    key = (text, font_file, size, width, height, expand, margin, invert)
+    return _cache.get(key, lambda: _render(text, font_file, size, width, height, expand, margin, invert))
+
+
+def _render(text, font_file, size, width, height, expand, margin, invert):
+    if invert:
+        image = render(text, font_file, size, width, height, expand, margin).image
+    else:
+        image = util.text.image(text, font_file, size, width, height, expand=expand, margin=margin)
+
+    text_bitmap = bitmap.Bitmap(*image.size[:])
+    text_bitmap.draw_image(image, invert=invert)
+    text_bitmap.mark_clean()
+
+    return RenderedText(image, text_bitmap)
+
+
+def cache_info():
+    """Returns the rendered text cache counters
+
+    Returns:
+        CacheInfo namedtuple, with sizes in bytes
+    """
+    return _cache.info()
+
+
+def set_cache_size(max_bytes):
+    """Sets the number of bytes of rendered text kept in the cache
+    """
+    _cache.max_size = max_bytes
+
+
+def clear_cache():
+    """Empties the rendered text cache
+    """
+    _cache.clear()
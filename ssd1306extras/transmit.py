@@ -0,0 +1,199 @@
+import collections
+import threading
+import time
+
+
+# Counters for a BackgroundTransmitter. dropped frames were entirely replaced
+# by a newer frame before being sent, merged frames were sent together with a
+# newer frame after losing the blocks it covered.
+TransmitStats = collections.namedtuple('TransmitStats', ['submitted', 'sent', 'dropped', 'merged', 'blocks_dropped',
+                                                         'queue_depth', 'busy', 'transmit_seconds'])
+
+
+class BackgroundTransmitter(object):
+    """Sends frames to a display from a background thread
+
+    submit() returns straight away, so the next frame can be rendered while
+    the current one is on the bus. Only one frame waits at a time. A frame
+    submitted while another is waiting replaces every waiting block it
+    completely covers, and the rest of the waiting frame is sent first so
+    nothing is lost when frames only hold the parts of the screen that
+    changed.
+    """
+
+    def __init__(self, ssd_display, start=True):
+        """Creates a transmitter
+
+        Args:
+            ssd_display (SSD1306): Display the frames are sent to. It must not
+                be used from other threads while the transmitter runs.
+            start (bool): If True, the thread is started straight away
+        """
+        self.ssd_display = ssd_display
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._pending = []
+        self._pending_frames = 0
+        self._busy = False
+        self._error = None
+
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.merged = 0
+        self.blocks_dropped = 0
+        self.transmit_seconds = 0.0
+
+        if start:
+            self.start()
+
+    def start(self):
+        """Starts the background thread
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ssd1306-transmit')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, flush=True):
+        """Stops the background thread
+
+        Args:
+            flush (bool): If True, the waiting frame is sent first, otherwise
+                it is discarded
+        """
+        with self._condition:
+            if self._thread is None:
+                return
+            if not flush:
+                self._pending = []
+                self._pending_frames = 0
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+
+        thread.join()
+        self._thread = None
+
+    def submit(self, blocks):
+        """Queues a frame to be sent
+
+        Args:
+            blocks (list): (bitmap, row, col) tuples, with row and col the
+                display position of each gaugette bitmap, as returned by
+                Bitmap.get_dirty_blocks once offset for the panel
+
+        Raises:
+            Exception: The error that stopped the last transmission, if any
+        """
+        blocks = list(blocks)
+
+        with self._condition:
+            self._raise_error()
+            self.submitted += 1
+
+            if self._pending:
+                kept = [block for block in self._pending if not any(_covers(new, block) for new in blocks)]
+                self.blocks_dropped += len(self._pending) - len(kept)
+                # Each waiting frame is counted once: its surviving blocks now
+                # belong to the new frame, so a later frame replacing them
+                # does not count it again.
+                if kept:
+                    self.merged += self._pending_frames
+                else:
+                    self.dropped += self._pending_frames
+                self._pending_frames = 0
+                self._pending = kept
+
+            self._pending.extend(blocks)
+            self._pending_frames += 1
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until every submitted frame has been sent
+
+        Args:
+            timeout (float): Seconds to wait, or None to wait for as long as it takes
+
+        Returns:
+            True if everything was sent, False if the timeout ran out
+
+        Raises:
+            Exception: The error that stopped the last transmission, if any
+        """
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self._condition:
+            while self._pending or self._busy:
+                if self._thread is None:
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._raise_error()
+            return not self._pending and not self._busy
+
+    @property
+    def queue_depth(self):
+        """Number of submitted frames waiting to be sent
+        """
+        return self._pending_frames
+
+    def stats(self):
+        """Returns the transmitter counters
+
+        Returns:
+            TransmitStats namedtuple
+        """
+        with self._condition:
+            return TransmitStats(self.submitted, self.sent, self.dropped, self.merged, self.blocks_dropped,
+                                 self._pending_frames, self._busy, self.transmit_seconds)
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+
+                blocks = self._pending
+                self._pending = []
+                self._pending_frames = 0
+                self._busy = True
+
+            start = time.time()
+            try:
+                with self.ssd_display.frame_stats():
+                    for block, row, col in blocks:
+                        self.ssd_display.display_block(block, row, col, block.cols)
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self.sent += 1
+                    self.transmit_seconds += time.time() - start
+                    self._condition.notify_all()
+
+
+def _covers(block, other):
+    """Returns True if the first block's display area contains the second's
+    """
+    bitmap, row, col = block
+    other_bitmap, other_row, other_col = other
+    return (row <= other_row and col <= other_col and
+            other_row + other_bitmap.rows <= row + bitmap.rows and
+            other_col + other_bitmap.cols <= col + bitmap.cols)
@@ -0,0 +1,115 @@
+import collections
+import threading
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'entries', 'max_entries', 'size',
+                                              'max_size'])
+
+
+class LRUCache(object):
+    """Least recently used cache that counts hits, misses and evictions
+
+    Safe to share between threads. Values are created outside the lock, so two
+    threads missing on the same key at once may both create the value.
+    """
+
+    def __init__(self, max_entries=None, max_size=None, sizeof=None):
+        """Creates an empty cache
+
+        Args:
+            max_entries (int): Number of values kept before the least recently
+                used one is evicted, or None for no limit
+            max_size (int): Total size of the values kept before the least
+                recently used one is evicted, or None for no limit
+            sizeof (function): Returns the size of a value, required when
+                max_size is given
+        """
+        self._max_entries = max_entries
+        self._max_size = max_size
+        self._sizeof = sizeof
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entries(self):
+        return self._max_entries
+
+    @max_entries.setter
+    def max_entries(self, value):
+        with self._lock:
+            self._max_entries = value
+            self._evict()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        with self._lock:
+            self._max_size = value
+            self._evict()
+
+    def get(self, key, create):
+        """Returns the cached value for a key, creating it on a miss
+
+        Args:
+            key (hashable): Key for the value
+            create (function): Called without arguments to create a missing value
+
+        Returns:
+            The cached or newly created value
+        """
+        with self._lock:
+            try:
+                value, size = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[key] = (value, size)
+                return value
+
+        value = create()
+        size = self._sizeof(value) if self._sizeof is not None else 0
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            self._evict()
+
+        return value
+
+    def clear(self):
+        """Removes every value, keeping the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def info(self):
+        """Returns a CacheInfo with the current counters
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, len(self._entries), self._max_entries,
+                             self.size, self._max_size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while self._entries and (self._over(len(self._entries), self._max_entries) or
+                                 self._over(self.size, self._max_size)):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+    @staticmethod
+    def _over(value, limit):
+        return limit is not None and value > limit
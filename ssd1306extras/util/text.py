@@ -2,9 +2,23 @@ import collections
 
 from PIL import Image, ImageDraw, ImageFont
 
+import cache
+import ssd1306extras.instrument
+
 
 Margin = collections.namedtuple('Margin', ['top', 'right', 'bottom', 'left'])
 
+TextCacheInfo = collections.namedtuple('TextCacheInfo', ['fonts', 'margins'])
+
+# Loaded fonts keyed by (font_file, size)
+_font_cache = cache.LRUCache(16)
+
+# Top margins keyed by (font_file, size, height)
+_margin_cache = cache.LRUCache(64)
+
+ssd1306extras.instrument.register_cache('fonts', _font_cache.info)
+ssd1306extras.instrument.register_cache('margins', _margin_cache.info)
+
 
 def image(text, font_file, size, width=None, height=None, expand=False, margin=None):
     """Creates a text image
@@ -54,6 +68,10 @@ def find_top_margin(font_file, size, height):
     Returns:
         Margin namedtuple containing a top margin
     """
+    return _margin_cache.get((font_file, size, height), lambda: _find_top_margin(font_file, size, height))
+
+
+def _find_top_margin(font_file, size, height):
     font = _create_font(font_file, size)
 
     ascender_bbox = _get_bounding_box('ATP', font)
@@ -97,9 +115,44 @@ def _get_bounding_box(text, font):
 
 
 def _create_font(font_file=None, size=14):
+    return _font_cache.get((font_file, size), lambda: _load_font(font_file, size))
+
+
+def _load_font(font_file, size):
     font = None
 
     if font_file is not None:
-        font = ImageFont.truetype(filename=font_file, size=size)
+        font = ImageFont.truetype(font_file, size)
 
     return font
+
+
+def cache_info():
+    """Returns the font and margin cache counters
+
+    Returns:
+        TextCacheInfo namedtuple holding a CacheInfo for each cache
+    """
+    return TextCacheInfo(fonts=_font_cache.info(), margins=_margin_cache.info())
+
+
+def set_cache_size(fonts=None, margins=None):
+    """Sets the number of entries kept by the font and margin caches
+
+    Args:
+        fonts (int): Number of loaded fonts to keep
+        margins (int): Number of top margins to keep
+    """
+    if fonts is not None:
+        _font_cache.max_entries = fonts
+    if margins is not None:
+        _margin_cache.max_entries = margins
+
+
+def clear_caches():
+    """Empties the font and margin caches
+
+    Useful after a font file has been replaced on disk.
+    """
+    _font_cache.clear()
+    _margin_cache.clear()
@@ -1,9 +1,27 @@
+import json
+import time
+
 import bitmap
+import glyph
+import instrument
+import textcache
 import util.text
 
 
 class TextWidget(object):
 
+    # Incremented whenever the bitmap changes, so a Panel knows to redraw the widget
+    version = 0
+
+    # When True, text is composed from a glyph atlas instead of being rendered
+    # through PIL, which is much faster for text that changes every frame.
+    # Only used when a font file is set.
+    use_glyph_atlas = False
+
+    # Blank columns between the end of the text and its start when it wraps
+    # around in a marquee
+    marquee_gap = 16
+
     def __init__(self, width, height):
         self._bitmap = None
         self._text = ''
@@ -17,6 +35,8 @@ class TextWidget(object):
 
     @property
     def bitmap(self):
+        """Bitmap of the rendered text, owned by this widget
+        """
         if self._bitmap is None:
             self.create_bitmap()
         return self._bitmap
@@ -27,8 +47,11 @@ class TextWidget(object):
 
     @text.setter
     def text(self, text):
+        if text == self._text:
+            return
         self._text = text
         self._bitmap = None
+        self.version += 1
 
     @property
     def font_file(self):
@@ -53,25 +76,89 @@ class TextWidget(object):
         """
         vertical_margin = util.text.find_top_margin(self._font_file, self._font_size, self._height)
         self._margin = self._margin._replace(top=vertical_margin.top)
+        self._bitmap = None
+        self.version += 1
 
     def create_bitmap(self):
-        image = util.text.image(self._text, self._font_file, self._font_size, self._width, self._height,
-                                expand=True, margin=self._margin)
-        self._bitmap = bitmap.Bitmap(*image.size[:])
-        self._bitmap.draw_image(image)
+        with instrument.phase(instrument.RENDER):
+            if self.use_glyph_atlas and self._font_file is not None:
+                self._bitmap = glyph.render(self._text, self._font_file, self._font_size, self._width,
+                                            self._height, expand=True, margin=self._margin)
+                return
+
+            rendered = textcache.render(self._text, self._font_file, self._font_size, self._width, self._height,
+                                        expand=True, margin=self._margin)
+            # The cached bitmap is shared with every widget and menu showing
+            # the same text, so the widget gets a copy it is free to modify
+            self._bitmap = rendered.bitmap.copy()
+
+    @property
+    def needs_marquee(self):
+        """True if the rendered text is wider than the widget
+        """
+        return self.bitmap.width > self._width
+
+    def marquee_bitmap(self, width):
+        """Returns the text on a bitmap as wide as the area a marquee scrolls through
+
+        Args:
+            width (int): Number of columns the marquee wraps around in
+
+        Raises:
+            ValueError: If the text and marquee_gap do not fit in width
+        """
+        text_bitmap = self.bitmap
+        if text_bitmap.width + self.marquee_gap > width and text_bitmap.width > self._width:
+            raise ValueError('Text is too wide for a {0} column marquee'.format(width))
+
+        marquee = bitmap.Bitmap(width, self._height)
+        marquee.draw_bitmap(text_bitmap)
+        return marquee
 
 
 class ProgressWidget(object):
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, min_interval=0.0, clock=time.time):
+        """Creates an empty progress bar
+
+        Args:
+            width (int): Width of the bar in pixels
+            height (int): Height of the bar in pixels
+            min_interval (float): Least number of seconds between redraws.
+                Changes arriving sooner are merged, and the latest one is
+                drawn once the interval has passed. 0 draws every change.
+            clock (callable): Returns the current time in seconds
+        """
         self._width = width
         self._height = height
 
         self._bitmap = bitmap.Bitmap(self._width, self._height)
         self._percent = 0.0
 
+        self.min_interval = min_interval
+        self.clock = clock
+
+        # First column and the column after the last one changed by the last
+        # redraw, or None before the first
+        self.dirty_columns = None
+
+        self._version = 0
+        self._filled = 0
+        self._pending = False
+        self._last_update = None
+
+    @property
+    def version(self):
+        """Incremented whenever the bitmap changes, so a Panel knows to redraw the widget
+
+        Reading it draws a merged change once min_interval has passed.
+        """
+        self._update_if_due()
+        return self._version
+
     @property
     def bitmap(self):
+        self._update_if_due()
         return self._bitmap
 
     @property
@@ -85,12 +172,41 @@ class ProgressWidget(object):
             raise ValueError('Percent must be a float between 0.0 and 1.0')
 
         self._percent = value
-        self.update_bitmap()
+
+        # Changes too small to move the end of the bar are not drawn
+        self._pending = int(self._width * value) != self._filled
+        self._update_if_due()
+
+    def flush(self):
+        """Draws a merged change now, without waiting for min_interval
+        """
+        if self._pending:
+            self._update()
 
     def update_bitmap(self):
-        self._bitmap.clear()
-        width = int(self._width * self._percent)
-        self._bitmap.draw_rect(0, 0, width, self._height)
+        """Fills or clears only the columns between the drawn and current ends of the bar
+        """
+        with instrument.phase(instrument.RENDER):
+            width = int(self._width * self._percent)
+
+            if width > self._filled:
+                self._bitmap.draw_rect(self._filled, 0, width - self._filled, self._height)
+            elif width < self._filled:
+                self._bitmap.clear_block(width, 0, self._filled - width, self._height)
+
+            self.dirty_columns = (min(width, self._filled), max(width, self._filled))
+            self._filled = width
+
+    def _update_if_due(self):
+        if self._pending and (self.min_interval <= 0 or self._last_update is None or
+                              self.clock() - self._last_update >= self.min_interval):
+            self._update()
+
+    def _update(self):
+        self._pending = False
+        self._last_update = self.clock()
+        self.update_bitmap()
+        self._version += 1
 
 
 class IconOptionWidget(object):
@@ -100,12 +216,21 @@ class IconOptionWidget(object):
             self.id = id
             self.label = label
             self.bitmap = bitmap
-            self.selected_bitmap = bitmap.copy()
-            self.selected_bitmap.invert()
             self.option = option
             self.selected = False
             self.enabled = True
 
+        @property
+        def selected_bitmap(self):
+            """Returns an inverted copy of the icon
+
+            The widget itself highlights the selected icon by inverting it in
+            place, so the copy is only made when asked for.
+            """
+            selected_bitmap = self.bitmap.copy()
+            selected_bitmap.invert()
+            return selected_bitmap
+
         @property
         def width(self):
             return self.bitmap.width
@@ -114,32 +239,175 @@ class IconOptionWidget(object):
         def height(self):
             return self.bitmap.height
 
+    # Incremented whenever the icons, the selection or the viewport change, so
+    # a Panel knows to redraw the widget
+    version = 0
+
     def __init__(self, width, height):
         self._width = width
         self._height = height
 
         self._bitmap = bitmap.Bitmap(self._width, self._height)
         self._icons = []
+        self._drawn_version = None
         self.selected = None
 
+        # Position in _icons of the first icon added with each id
+        self._icon_indexes = {}
+
+        # Column of each icon along the strip of enabled icons, None for a
+        # disabled icon. None until laid out after the icons change.
+        self._positions = None
+        self._strip_width = 0
+
+        # Strip column shown at the left edge of the widget
+        self._offset = 0
+
+        # Viewport and selected icon currently drawn in the bitmap
+        self._drawn_offset = None
+        self._drawn_selected = None
+
     @property
     def bitmap(self):
-        self._bitmap.clear()
-        x = y = 0
+        """Returns the bitmap for the widget
 
-        for icon in self._icons:
-            if not icon.enabled:
-                continue
+        The bitmap is kept between calls. When only the selection changed,
+        just the previously and newly selected icons are drawn again, so only
+        their areas are marked dirty. Icons outside the viewport are not drawn.
+        """
+        if self._drawn_version == self.version:
+            return self._bitmap
 
-            self._draw_icon(icon, x, y)
-            x += icon.width
+        self._drawn_version = self.version
+
+        with instrument.phase(instrument.RENDER):
+            if self._positions is None:
+                self._layout()
+
+            selected = self.find_selected()
+            if selected is not None:
+                self._scroll_into_view(selected)
+            self._offset = max(0, min(self._offset, self._strip_width - self._width))
+
+            if self._drawn_offset != self._offset:
+                self._bitmap.clear()
+                for i in range(len(self._icons)):
+                    self._redraw_icon(i)
+            elif self._drawn_selected != selected:
+                for i in set([self._drawn_selected, selected]) - set([None]):
+                    self._redraw_icon(i)
+
+            self._drawn_offset = self._offset
+            self._drawn_selected = selected
 
         return self._bitmap
 
+    @property
+    def offset(self):
+        """Strip column shown at the left edge of the widget
+
+        The viewport scrolls by itself to keep the selected icon in view.
+        """
+        return self._offset
+
+    @offset.setter
+    def offset(self, value):
+        self._offset = value
+        self.version += 1
+
+    def _layout(self):
+        self._positions = []
+        x = 0
+        for icon in self._icons:
+            if icon.enabled:
+                self._positions.append(x)
+                x += icon.width
+            else:
+                self._positions.append(None)
+
+        self._strip_width = x
+        self._drawn_offset = None
+
+    def _scroll_into_view(self, i):
+        x = self._positions[i]
+        if x is None:
+            return
+
+        if x < self._offset:
+            self._offset = x
+        elif x + self._icons[i].width > self._offset + self._width:
+            self._offset = x + self._icons[i].width - self._width
+
+    def _redraw_icon(self, i):
+        x = self._positions[i]
+        icon = self._icons[i]
+        if x is None or x + icon.width <= self._offset or x >= self._offset + self._width:
+            return
+
+        self._draw_icon(icon, x - self._offset, 0)
+
     def add_icon(self, image_path, label, id, option):
         bitmap_img = bitmap.image_to_bitmap(image_path)
-        icon = IconOptionWidget.Icon(id, bitmap_img, label, option)
+        self._add_icon(IconOptionWidget.Icon(id, bitmap_img, label, option))
+        self.version += 1
+
+    def add_icon_sheet(self, image_path, manifest):
+        """Adds icons cut from a single sprite sheet image
+
+        The image is decoded once however many icons it holds. The manifest
+        lists the icons in the order they are added, either as the path to a
+        JSON file or as its parsed contents:
+
+            {"icon_width": 8, "icon_height": 8,
+             "icons": [{"id": "wifi", "label": "Wi-Fi", "option": "network"},
+                       {"id": "bt", "x": 16, "y": 8, "width": 12, "height": 8}]}
+
+        An icon without x and y is cut from the cell of an icon_width by
+        icon_height grid matching its place in the list, counting left to
+        right and top to bottom. width and height default to the cell size,
+        label to the id and option to None.
+
+        Args:
+            image_path (str): Path to the sprite sheet image
+            manifest (str or dict): Manifest or path to a JSON manifest
+
+        Raises:
+            ValueError: If an icon's position or size cannot be worked out
+        """
+        if not isinstance(manifest, dict):
+            with open(manifest) as manifest_file:
+                manifest = json.load(manifest_file)
+
+        sheet = bitmap.image_to_bitmap(image_path)
+        cell_width = manifest.get('icon_width')
+        cell_height = manifest.get('icon_height')
+
+        for i, entry in enumerate(manifest['icons']):
+            width = entry.get('width', cell_width)
+            height = entry.get('height', cell_height)
+            x = entry.get('x')
+            y = entry.get('y')
+
+            if x is None or y is None:
+                if not cell_width or not cell_height:
+                    raise ValueError('Icon {0} has no position and the manifest has no grid'.format(entry['id']))
+                row, col = divmod(i, sheet.width / cell_width)
+                x = col * cell_width
+                y = row * cell_height
+
+            if width is None or height is None:
+                raise ValueError('Icon {0} has no size'.format(entry['id']))
+
+            icon_bitmap = sheet.crop(x, y, width, height)
+            self._add_icon(IconOptionWidget.Icon(entry['id'], icon_bitmap, entry.get('label', entry['id']),
+                                                 entry.get('option')))
+
+        self.version += 1
+
+    def _add_icon(self, icon):
+        self._icon_indexes.setdefault(icon.id, len(self._icons))
         self._icons.append(icon)
+        self._positions = None
 
     def select_first(self):
         if not len(self._icons):
@@ -176,41 +444,49 @@ class IconOptionWidget(object):
     def select_id(self, id):
         self.clear_selected()
 
-        for i, icon in enumerate(self._icons):
-            if icon.id == id:
-                icon.selected = True
-                self.selected = i
-                return icon.label
+        i = self._icon_indexes.get(id)
+        if i is None:
+            return None
+
+        self._icons[i].selected = True
+        self.selected = i
+        return self._icons[i].label
 
     def find_selected(self):
         """Returns the index of the currently selected icon
         """
-        for i, icon in enumerate(self._icons):
-            if icon.selected:
-                return i
+        if self.selected is not None and self._icons[self.selected].selected:
+            return self.selected
 
     def clear_selected(self):
-        for icon in self._icons:
-            icon.selected = False
+        # Only the icon at self.selected is ever marked as selected
+        if self.selected is not None:
+            self._icons[self.selected].selected = False
+        self.version += 1
 
     def _draw_icon(self, icon, x, y):
-        icon_bitmap = icon.selected_bitmap if icon.selected else icon.bitmap
-        self._bitmap.draw_bitmap(icon_bitmap, x, y)
+        self._bitmap.draw_bitmap(icon.bitmap, x, y)
+        if icon.selected:
+            self._bitmap.invert_block(x, y, icon.width, icon.height)
 
     def disable_icon(self, id):
         icon = self._find_icon(id)
         icon.enabled = False
+        self._positions = None
+        self.version += 1
 
     def enable_icon(self, id):
         icon = self._find_icon(id)
         icon.enabled = True
+        self._positions = None
+        self.version += 1
 
     def get_current(self):
         index = self.find_selected()
         return self._icons[index].option
 
     def _find_icon(self, id):
-        icon = filter(lambda icon: icon.id == id, self._icons)
-        if not len(icon):
+        try:
+            return self._icons[self._icon_indexes[id]]
+        except KeyError:
             raise KeyError('Icon was not found')
-        return icon[0]
@@ -1,3 +1,5 @@
+import random
+
 import pytest
 from ssd1306extras import bitmap
 from PIL import Image
@@ -93,6 +95,28 @@ class TestDrawImage(object):
         bmap.draw_image(small_rec, 0, 0, invert=True)
         assert_bits_set(bmap, expected=[9, 10, 11])
 
+    def test_should_contain_area_of_image(self, bmap, small_rec):
+        bmap.draw_image(small_rec, 1, 2, box=(3, 1, 5, 3))
+        assert_bits_set(bmap, expected=[18, 25, 26])
+
+    @pytest.mark.parametrize('width', [1, 7, 8, 9, 13, 20])
+    def test_should_skip_row_padding(self, width):
+        image = Image.new('1', (width, 5))
+        rand = random.Random(width)
+        for x in range(width):
+            for y in range(5):
+                if rand.random() < 0.5:
+                    image.putpixel((x, y), 255)
+
+        bmap = bitmap.Bitmap(width, 5)
+        bmap.draw_image(image)
+
+        assert bmap.bits.tolist() == [bool(pixel) for pixel in image.getdata()]
+
+    def test_should_contain_greyscale_image(self, bmap, small_rec):
+        bmap.draw_image(small_rec.convert('L'))
+        assert_bits_set(bmap, expected=[0, 1, 2, 3, 4, 8, 12, 16, 17, 18, 19, 20])
+
 
 class TestGetBitmap(object):
 
@@ -106,7 +130,29 @@ class TestGetBitmap(object):
         bmap.draw_image(small_rec, 11, 13)
         gaugette_bitmap = bmap.get_bitmap()
 
-        assert gaugette_bitmap.data == expected
+        assert gaugette_bitmap.data == bytearray(expected)
+
+    def test_should_match_per_bit_packing(self):
+        bmap = bitmap.Bitmap(128, 64)
+        rand = random.Random(1306)
+        for i in range(len(bmap.bits)):
+            bmap.bits[i] = rand.random() < 0.5
+
+        expected = [0] * (bmap.width * bmap.height / 8)
+        for i, bit in enumerate(bmap.bits):
+            if bit:
+                page, row = divmod(i / bmap.width, 8)
+                expected[(page * bmap.width) + (i % bmap.width)] |= 0x01 << row
+
+        assert bmap.get_bitmap().data == bytearray(expected)
+
+    def test_should_pad_partial_page(self, small_rec):
+        bmap = bitmap.Bitmap(5, 3)
+        bmap.draw_image(small_rec)
+        gaugette_bitmap = bmap.get_bitmap()
+
+        assert gaugette_bitmap.rows == 8
+        assert gaugette_bitmap.data == bytearray([7, 5, 5, 5, 7])
 
 
 class TestInvert(object):
@@ -158,3 +204,229 @@ class TestClearBlock(object):
         bmap.draw_image(small_rec, 0, 0)
         bmap.clear_block(1, 1, 1000, 1000)
         assert_bits_set(bmap, expected=[0, 1, 2, 3, 4, 8, 16])
+
+
+class TestPageLayout(object):
+
+    def draw_scene(self, layout, small_rec):
+        bmap = bitmap.Bitmap(16, 20, layout)
+        bmap.draw_image(small_rec, 0, 0)
+        bmap.draw_image(small_rec, 8, 8, invert=True)
+        bmap.draw_image(small_rec, 13, 18)
+        bmap.draw_image(small_rec, -2, -1)
+        bmap.draw_rect(3, 10, 4, 6)
+        bmap.clear_block(4, 11, 2, 2)
+        return bmap
+
+    def assert_same_pixels(self, bmap, other):
+        for y in range(bmap.height):
+            for x in range(bmap.width):
+                assert bmap.get_pixel(x, y) == other.get_pixel(x, y), 'Pixel {0},{1} differs'.format(x, y)
+
+    def test_should_match_row_layout(self, small_rec):
+        row_bmap = self.draw_scene(bitmap.ROW_LAYOUT, small_rec)
+        page_bmap = self.draw_scene(bitmap.PAGE_LAYOUT, small_rec)
+
+        self.assert_same_pixels(row_bmap, page_bmap)
+        assert page_bmap.get_bitmap().data == row_bmap.get_bitmap().data
+
+    def test_should_match_row_layout_after_invert(self, small_rec):
+        row_bmap = self.draw_scene(bitmap.ROW_LAYOUT, small_rec)
+        page_bmap = self.draw_scene(bitmap.PAGE_LAYOUT, small_rec)
+        row_bmap.invert()
+        page_bmap.invert()
+
+        assert page_bmap.get_bitmap().data == row_bmap.get_bitmap().data
+
+    def test_should_copy_layout(self, small_rec):
+        page_bmap = self.draw_scene(bitmap.PAGE_LAYOUT, small_rec)
+        copied = page_bmap.copy()
+
+        assert copied.layout == bitmap.PAGE_LAYOUT
+        assert copied.get_bitmap().data == page_bmap.get_bitmap().data
+
+    @pytest.mark.parametrize('source_layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    @pytest.mark.parametrize('position', [(0, 0), (3, 8), (-4, -8), (9, 5), (2, 16)])
+    def test_should_draw_bitmaps_between_layouts(self, small_rec, source_layout, position):
+        source = self.draw_scene(source_layout, small_rec)
+        row_bmap = bitmap.Bitmap(24, 24, bitmap.ROW_LAYOUT)
+        page_bmap = bitmap.Bitmap(24, 24, bitmap.PAGE_LAYOUT)
+
+        row_bmap.draw_bitmap(source, *position)
+        page_bmap.draw_bitmap(source, *position)
+
+        self.assert_same_pixels(row_bmap, page_bmap)
+
+    def test_should_reject_unknown_layout(self):
+        with pytest.raises(ValueError):
+            bitmap.Bitmap(8, 8, 'column')
+
+
+class TestSetPixels(object):
+
+    def test_should_set_block_away_from_diagonal(self, bmap):
+        bmap.draw_rect(4, 1, 2, 2)
+        assert_bits_set(bmap, expected=[12, 13, 20, 21])
+
+
+class TestDirtyTracking(object):
+
+    @pytest.fixture
+    def clean_bmap(self):
+        bmap = bitmap.Bitmap(16, 16, bitmap.PAGE_LAYOUT)
+        bmap.mark_clean()
+        return bmap
+
+    def test_new_bitmap_should_be_dirty(self):
+        bmap = bitmap.Bitmap(16, 16)
+        assert bmap.dirty_spans() == [(0, 0, 16), (1, 0, 16)]
+
+    def test_should_record_drawn_image(self, clean_bmap, small_rec):
+        clean_bmap.draw_image(small_rec, 4, 6)
+        assert clean_bmap.dirty_spans() == [(0, 4, 9), (1, 4, 9)]
+
+    def test_should_not_record_unchanged_pixels(self, clean_bmap, small_rec):
+        clean_bmap.clear_block(0, 0, 16, 16)
+        clean_bmap.draw_image(small_rec, 2, 2)
+        clean_bmap.mark_clean()
+        clean_bmap.draw_image(small_rec, 2, 2)
+        assert not clean_bmap.is_dirty
+
+    def test_should_record_set_pixels(self, clean_bmap):
+        clean_bmap.draw_rect(10, 9, 3, 2)
+        assert clean_bmap.dirty_spans() == [(1, 10, 13)]
+
+    def test_should_combine_pages_with_same_columns(self, clean_bmap):
+        clean_bmap.draw_rect(2, 4, 6, 8)
+        blocks = clean_bmap.get_dirty_blocks()
+
+        assert len(blocks) == 1
+        row, col, block = blocks[0]
+        assert (row, col, block.cols, block.rows) == (0, 2, 6, 8 * 2)
+        assert block.data == bytearray([0xf0] * 6 + [0x0f] * 6)
+        assert not clean_bmap.is_dirty
+
+    @pytest.mark.parametrize('layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    def test_dirty_blocks_should_match_full_bitmap(self, layout, small_rec):
+        bmap = bitmap.Bitmap(16, 16, layout)
+        bmap.draw_image(small_rec, 3, 5)
+        bmap.mark_clean()
+        bmap.draw_image(small_rec, 9, 1)
+        bmap.draw_image(small_rec, 1, 12)
+
+        full = bmap.get_bitmap().data
+        for row, col, block in bmap.get_dirty_blocks():
+            for i, byte in enumerate(block.data):
+                page, block_col = divmod(i, block.cols)
+                assert full[((row / 8 + page) * bmap.width) + col + block_col] == byte
+
+
+class TestScroll(object):
+
+    def random_bitmap(self, layout):
+        bmap = bitmap.Bitmap(12, 20, layout)
+        rand = random.Random(20)
+        for y in range(bmap.height):
+            for x in range(bmap.width):
+                if rand.random() < 0.5:
+                    bmap.draw_rect(x, y, 1, 1)
+        return bmap
+
+    @pytest.mark.parametrize('layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    @pytest.mark.parametrize('dy', [1, 3, 8, 16, -1, -5, -8, -16, 25])
+    def test_should_move_rows(self, layout, dy):
+        bmap = self.random_bitmap(layout)
+        expected = [[bmap.get_pixel(x, y - dy) if 0 <= y - dy < bmap.height else False
+                     for x in range(bmap.width)] for y in range(bmap.height)]
+
+        bmap.scroll(dy)
+
+        assert [[bmap.get_pixel(x, y) for x in range(bmap.width)] for y in range(bmap.height)] == expected
+
+    @pytest.mark.parametrize('dy', [3, 8, 16])
+    def test_should_keep_page_padding_blank(self, dy):
+        bmap = self.random_bitmap(bitmap.PAGE_LAYOUT)
+        bmap.scroll(dy)
+        row_bmap = bitmap.Bitmap(12, 20)
+        row_bmap.draw_bitmap(bmap)
+
+        assert bmap.get_bitmap().data == row_bmap.get_bitmap().data
+
+    def test_should_mark_dirty(self):
+        bmap = self.random_bitmap(bitmap.PAGE_LAYOUT)
+        bmap.mark_clean()
+        bmap.scroll(-8)
+
+        assert bmap.dirty_spans() == [(0, 0, 12), (1, 0, 12), (2, 0, 12)]
+
+
+class TestRasterOps(object):
+
+    def pattern(self, layout, width, height, seed):
+        bmap = bitmap.Bitmap(width, height, layout)
+        rand = random.Random(seed)
+        for y in range(height):
+            for x in range(width):
+                if rand.random() < 0.5:
+                    bmap.draw_rect(x, y, 1, 1)
+        return bmap
+
+    def pixels(self, bmap):
+        return [[bmap.get_pixel(x, y) for x in range(bmap.width)] for y in range(bmap.height)]
+
+    def expected(self, dest, source, x, y, combine, mask=None):
+        result = self.pixels(dest)
+        for row in range(source.height):
+            for col in range(source.width):
+                if not (0 <= x + col < dest.width and 0 <= y + row < dest.height):
+                    continue
+                if mask is not None and not mask.get_pixel(col, row):
+                    continue
+                result[y + row][x + col] = combine(result[y + row][x + col], source.get_pixel(col, row))
+        return result
+
+    @pytest.mark.parametrize('dest_layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    @pytest.mark.parametrize('source_layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    @pytest.mark.parametrize('op, combine', [
+        (bitmap.OP_COPY, lambda dest, source: source),
+        (bitmap.OP_OR, lambda dest, source: dest or source),
+        (bitmap.OP_AND_NOT, lambda dest, source: dest and not source),
+        (bitmap.OP_XOR, lambda dest, source: dest != source),
+    ])
+    @pytest.mark.parametrize('position', [(0, 0), (3, 8), (-2, 5), (6, -8)])
+    def test_should_combine_pixels(self, dest_layout, source_layout, op, combine, position):
+        dest = self.pattern(dest_layout, 16, 20, 1)
+        source = self.pattern(source_layout, 12, 16, 2)
+        expected = self.expected(dest, source, position[0], position[1], combine)
+
+        dest.draw_bitmap(source, position[0], position[1], op=op)
+
+        assert self.pixels(dest) == expected
+
+    @pytest.mark.parametrize('layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    @pytest.mark.parametrize('position', [(0, 0), (3, 8), (1, 3)])
+    def test_should_draw_only_masked_pixels(self, layout, position):
+        dest = self.pattern(layout, 16, 20, 1)
+        source = self.pattern(layout, 12, 16, 2)
+        mask = self.pattern(layout, 12, 16, 3)
+        expected = self.expected(dest, source, position[0], position[1], lambda dest, source: dest != source, mask)
+
+        dest.draw_bitmap(source, position[0], position[1], op=bitmap.OP_XOR, mask=mask)
+
+        assert self.pixels(dest) == expected
+
+    def test_should_reject_unknown_op(self, bmap):
+        with pytest.raises(ValueError):
+            bmap.draw_bitmap(bitmap.Bitmap(2, 2), op='nand')
+
+    @pytest.mark.parametrize('layout', [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT])
+    def test_invert_block_should_match_inverted_copy(self, layout, small_rec):
+        bmap = bitmap.Bitmap(8, 8, layout)
+        bmap.draw_image(small_rec, 1, 1)
+        bmap.mark_clean()
+        bmap.invert_block(1, 1, 5, 3)
+
+        expected = bitmap.Bitmap(8, 8, layout)
+        expected.draw_image(small_rec, 1, 1, invert=True)
+        assert bmap.bits == expected.bits
+        assert bmap.dirty_spans() == [(0, 1, 6)]
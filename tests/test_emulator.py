@@ -0,0 +1,119 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ssd1306extras import bitmap, emulator, menu, panel, widget
+
+
+@pytest.fixture
+def display():
+    return emulator.EmulatedSSD1306(rows=32, cols=128, bus_hz=1000000)
+
+
+def image_pixels(image):
+    width, height = image.size
+    return [(x, y) for y in range(height) for x in range(width) if image.getpixel((x, y))]
+
+
+class TestEmulatedSSD1306(object):
+
+    def test_should_store_blocks_in_gddram(self, display):
+        bmap = bitmap.Bitmap(16, 16, bitmap.PAGE_LAYOUT)
+        bmap.draw_rect(1, 2, 1, 1)
+        bmap.draw_rect(15, 9, 1, 1)
+
+        display.display_block(bmap.get_bitmap(), 8, 20, 16)
+
+        assert display.gddram[(1 * 128) + 21] == 0x04
+        assert display.gddram[(2 * 128) + 35] == 0x02
+        assert image_pixels(display.image()) == [(21, 10), (35, 17)]
+
+    def test_should_follow_vertical_addressing(self, display):
+        display.command(display.SET_MEMORY_MODE, display.MEMORY_MODE_VERT)
+        display.command(display.SET_PAGE_ADDRESS, 2, 3)
+        display.command(display.SET_COL_ADDRESS, 5, 6)
+        display.data([1, 2, 3, 4, 5])
+
+        # The fifth byte wraps around to the start of the window
+        assert [display.gddram[(page * 128) + col] for col in (5, 6) for page in (2, 3)] == [5, 2, 3, 4]
+
+    def test_should_follow_page_addressing(self, display):
+        display.command(display.SET_MEMORY_MODE, display.MEMORY_MODE_PAGE)
+        display.command(0xB3, 0x02, 0x11)
+        display.data([7, 8])
+
+        assert display.gddram[(3 * 128) + 18:(3 * 128) + 20] == bytearray([7, 8])
+
+    def test_should_apply_start_line_and_inversion(self, display):
+        display.command(display.SET_MEMORY_MODE, display.MEMORY_MODE_HORIZ)
+        display.command(display.SET_PAGE_ADDRESS, 1, 1)
+        display.command(display.SET_COL_ADDRESS, 0, 0)
+        display.data([0x01])
+
+        display.set_start_line(8)
+        assert image_pixels(display.image()) == [(0, 0)]
+
+        display.command(0xA7)
+        assert len(image_pixels(display.image())) == (128 * 32) - 1
+
+    def test_should_count_frames(self, display):
+        bmap = bitmap.Bitmap(128, 32, bitmap.PAGE_LAYOUT)
+        bmap.draw_rect(0, 0, 8, 8)
+
+        with display.record('first') as frames:
+            display.display_block(bmap.get_bitmap(), 0, 0, 128)
+        first = frames[0]
+
+        # Only the changed columns are sent the second time
+        bmap.draw_rect(8, 0, 2, 8)
+        with display.record('second') as frames:
+            display.display_block(bmap.get_bitmap(), 0, 0, 128)
+        second = frames[0]
+
+        assert (first.label, first.data_bytes, first.transfers) == ('first', 512, 1)
+        assert (second.label, second.data_bytes) == ('second', 2)
+        assert (second.commands, second.command_bytes) == (3, 8)
+        assert first.seconds == pytest.approx((first.command_bytes + 512) * 8 / 1000000.0)
+        assert display.totals().data_bytes == 514
+        assert [frame.label for frame in display.frames] == ['first', 'second']
+
+    def test_should_run_menu_headless(self):
+        display = emulator.EmulatedSSD1306(rows=64)
+        text_menu = menu.TextListMenu(display, ['apples', 'bananas', 'milk', 'eggs'])
+        text_menu.draw()
+        display.end_frame('draw')
+
+        with display.record('next') as frames:
+            text_menu.next()
+
+        assert 0 < frames[0].data_bytes < display.frames[0].data_bytes
+        assert image_pixels(display.image())
+
+    def test_should_import_without_gaugette(self):
+        # A None entry in sys.modules makes importing gaugette fail
+        script = '; '.join([
+            "import sys",
+            "sys.modules['gaugette'] = None",
+            "from ssd1306extras import emulator",
+            "display = emulator.EmulatedSSD1306()",
+            "display.display_block(display.Bitmap(8, 8), 0, 0, 8)",
+            "assert display.totals().data_bytes == 8",
+        ])
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.check_call([sys.executable, '-c', script], cwd=root)
+
+    def test_should_run_panel_headless(self, display, tmpdir):
+        test_panel = panel.Panel(display)
+        progress = widget.ProgressWidget(64, 8)
+        test_panel.add_widget(progress, 0, 8)
+        progress.percent = 0.5
+        test_panel.draw()
+
+        pixels = image_pixels(display.image())
+        assert pixels[0] == (0, 8) and pixels[-1] == (31, 15)
+
+        path = str(tmpdir.join('screen.png'))
+        display.save(path)
+        assert tmpdir.join('screen.png').check()
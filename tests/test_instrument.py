@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+from mock import MagicMock
+
+from ssd1306extras import instrument, panel, widget
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def recorder(clock):
+    return instrument.Recorder(window=100, clock=clock)
+
+
+@pytest.fixture
+def profiles():
+    profiles = []
+    instrument.reset()
+    instrument.add_callback(profiles.append)
+    yield profiles
+    instrument.remove_callback(profiles.append)
+
+
+class TestRecorder(object):
+
+    def test_should_subtract_nested_phases(self, recorder, clock):
+        with recorder.frame('panel'):
+            with recorder.phase('composite'):
+                clock.now += 1
+                with recorder.phase('render'):
+                    clock.now += 2
+                clock.now += 1
+
+        snapshot = recorder.snapshot()
+        assert snapshot.phases['composite'].total == 2
+        assert snapshot.phases['render'].total == 2
+        assert snapshot.frames['panel'].total == 4
+
+    def test_should_count_phases_from_every_thread(self, recorder):
+        def time_phases():
+            for _ in range(2000):
+                with recorder.phase('pack'):
+                    pass
+
+        threads = [threading.Thread(target=time_phases) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert recorder.snapshot().phases['pack'].count == 8000
+
+    def test_should_pass_frames_to_callbacks(self, recorder, clock):
+        profiles = []
+        recorder.add_callback(profiles.append)
+
+        with recorder.frame('menu'):
+            with recorder.phase('pack'):
+                clock.now += 0.5
+            with recorder.phase('transmit'):
+                clock.now += 0.25
+            with recorder.phase('pack'):
+                clock.now += 0.5
+
+        assert profiles == [instrument.FrameProfile('menu', 1.25, {'pack': 1.0, 'transmit': 0.25})]
+
+    def test_should_fold_nested_frames_into_outer_frame(self, recorder, clock):
+        profiles = []
+        recorder.add_callback(profiles.append)
+
+        with recorder.frame('outer'):
+            with recorder.frame('inner'):
+                clock.now += 1
+
+        assert [profile.name for profile in profiles] == ['outer']
+
+    def test_should_compute_percentiles(self, recorder, clock):
+        for seconds in range(1, 101):
+            with recorder.phase('render'):
+                clock.now += seconds
+
+        stats = recorder.snapshot().phases['render']
+        assert (stats.count, stats.p50, stats.p95, stats.max) == (100, 50, 95, 100)
+
+    def test_should_keep_window_of_samples(self, clock):
+        recorder = instrument.Recorder(window=10, clock=clock)
+        for seconds in [100] + [1] * 10:
+            with recorder.phase('render'):
+                clock.now += seconds
+
+        stats = recorder.snapshot().phases['render']
+        assert (stats.count, stats.p95, stats.max) == (11, 1, 100)
+
+    def test_should_report_cache_hit_rates(self, recorder):
+        info = MagicMock(return_value=MagicMock(hits=3, misses=1))
+        recorder.register_cache('text', info)
+        recorder.register_cache('empty', MagicMock(return_value=MagicMock(hits=0, misses=0)))
+
+        caches = recorder.snapshot().caches
+        assert caches['text'] == instrument.CacheStats(3, 1, 0.75)
+        assert caches['empty'].hit_rate is None
+
+    def test_should_record_nothing_when_disabled(self, recorder, clock):
+        recorder.enabled = False
+        with recorder.frame('panel'):
+            with recorder.phase('render'):
+                clock.now += 1
+
+        assert recorder.snapshot().phases == {}
+
+
+class TestDrawInstrumentation(object):
+
+    def test_should_time_panel_phases(self, profiles):
+        test_panel = panel.Panel(MagicMock(rows=32, cols=128, GDDRAM_COLS=128))
+        text = widget.TextWidget(64, 16)
+        text.text = 'Hello'
+        test_panel.add_widget(text)
+        test_panel.draw()
+
+        assert [profile.name for profile in profiles] == ['panel']
+        assert set(profiles[0].phases) == set([instrument.RENDER, instrument.COMPOSITE, instrument.PACK,
+                                               instrument.TRANSMIT])
+
+    def test_should_report_shared_caches(self):
+        assert set(['text', 'glyph_atlas', 'fonts', 'margins']) <= set(instrument.snapshot().caches)
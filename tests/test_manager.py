@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+from mock import MagicMock
+
+from ssd1306extras import emulator, manager, panel, widget
+
+
+class SlowDisplay(emulator.EmulatedSSD1306):
+    """Emulated display whose data writes take a while and are logged"""
+
+    transfers = None
+
+    def data(self, bytes):
+        start = time.time()
+        time.sleep(0.05)
+        emulator.EmulatedSSD1306.data(self, bytes)
+        self.transfers.append((start, time.time()))
+
+
+def create_panel(transfers):
+    display = SlowDisplay()
+    display.transfers = transfers
+    test_panel = panel.Panel(display)
+    progress = widget.ProgressWidget(64, 8)
+    progress.percent = 0.5
+    test_panel.add_widget(progress)
+    return test_panel
+
+
+def overlapping(intervals):
+    intervals = sorted(intervals)
+    return any(intervals[i + 1][0] < intervals[i][1] for i in range(len(intervals) - 1))
+
+
+@pytest.fixture
+def display_manager():
+    display_manager = manager.DisplayManager()
+    yield display_manager
+    display_manager.close()
+
+
+class TestDisplayManager(object):
+
+    def test_should_transfer_on_separate_buses_at_once(self, display_manager):
+        transfers = []
+        for bus in range(3):
+            display_manager.add(create_panel(transfers), bus=('spi', bus))
+
+        times = display_manager.draw()
+
+        assert len(times.displays) == 3
+        assert overlapping(transfers)
+        assert times.seconds < sum(times.displays)
+
+    def test_should_serialize_transfers_on_shared_bus(self, display_manager):
+        transfers = []
+        panels = [create_panel(transfers) for _ in range(3)]
+        for test_panel in panels:
+            display_manager.add(test_panel, bus=('i2c', 1))
+
+        display_manager.draw()
+
+        assert len(transfers) >= 3
+        assert not overlapping(transfers)
+        assert panels[0].ssd_display.bus_lock is panels[2].ssd_display.bus_lock
+
+    def test_should_draw_every_display_and_raise_first_error(self, display_manager):
+        failing = MagicMock()
+        failing.draw.side_effect = IOError('bus error')
+        working = MagicMock()
+        display_manager.add(failing)
+        display_manager.add(working)
+
+        with pytest.raises(IOError):
+            display_manager.draw()
+        working.draw.assert_called_once_with()
+
+    def test_should_draw_nothing_without_displays(self, display_manager):
+        times = display_manager.draw()
+        assert times.displays == []
+        assert display_manager.last_draw is times
+
+    def test_should_report_pending_changes(self, display_manager):
+        test_panel = create_panel([])
+        display_manager.add(test_panel)
+        assert display_manager.needs_draw
+
+        display_manager.draw()
+        assert not display_manager.needs_draw
+
+    def test_should_limit_workers(self):
+        display_manager = manager.DisplayManager(workers=1)
+        active = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def draw():
+            with lock:
+                active.append(1)
+                overlaps.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.pop()
+
+        for _ in range(3):
+            display_manager.add(MagicMock(draw=draw))
+        try:
+            display_manager.draw()
+        finally:
+            display_manager.close()
+
+        assert overlaps == [1, 1, 1]
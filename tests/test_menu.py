@@ -1,7 +1,7 @@
 import pytest
-from mock import MagicMock
+from mock import MagicMock, patch
 
-from ssd1306extras import menu
+from ssd1306extras import emulator, menu
 
 
 @pytest.fixture
@@ -104,3 +104,186 @@ class TestTextListMenuItem(object):
         test_menu.TextItem.set_font_size(20)
         assert menu.TextItem._font_size == 14
         assert test_menu.TextItem._font_size == 20
+
+
+class TestDraw(object):
+
+    def test_should_send_full_screen_on_first_draw(self, test_menu, ssd_display):
+        test_menu.draw()
+
+        _, row, col, col_count = ssd_display.display_block.call_args[0]
+        assert ssd_display.display_block.call_count == 1
+        assert (row, col, col_count) == (0, 0, 128)
+
+    def test_should_not_send_unchanged_screen(self, test_menu, ssd_display):
+        test_menu.draw()
+        ssd_display.display_block.reset_mock()
+        test_menu.draw()
+
+        assert not ssd_display.display_block.called
+
+
+@pytest.fixture
+def virtual_menu(ssd_display):
+    return menu.TextListMenu(ssd_display, ['item {0}'.format(i) for i in range(1000)], virtual=True)
+
+
+class TestVirtualMenu(object):
+
+    def test_should_not_create_items_up_front(self, virtual_menu):
+        assert len(virtual_menu._items) == 1000
+        assert virtual_menu._items.cached_indexes() == []
+
+    def test_should_keep_window_around_page(self, virtual_menu):
+        virtual_menu.draw()
+        assert virtual_menu._items.cached_indexes() == [0, 1, 2, 3]
+
+        for _ in range(10):
+            virtual_menu.next()
+
+        assert virtual_menu.page_start_index == 9
+        assert virtual_menu._items.cached_indexes() == range(7, 13)
+
+    def test_should_evict_bitmaps_outside_window(self, virtual_menu):
+        virtual_menu.draw()
+        first = virtual_menu._items[0]
+        first.prepare()
+
+        virtual_menu.selected_index = 500
+        virtual_menu.draw()
+
+        assert not first.ready()
+        assert virtual_menu._items.cached_indexes() == range(497, 503)
+
+    def test_should_select_like_regular_menu(self, virtual_menu):
+        virtual_menu.next()
+        virtual_menu.next()
+        virtual_menu.prev()
+        assert virtual_menu.select() == 'item 1'
+
+        for _ in range(1000):
+            virtual_menu.next()
+        assert virtual_menu.select() == 'item 999'
+
+    def test_should_read_items_from_provider(self, ssd_display):
+        requested = []
+
+        def provider(index):
+            requested.append(index)
+            return 'track {0}'.format(index)
+
+        provider_menu = menu.TextListMenu(ssd_display, provider, virtual=True, item_count=50000)
+        provider_menu.selected_index = 20000
+        provider_menu.draw()
+
+        assert provider_menu.select() == 'track 20000'
+        assert sorted(set(requested)) == range(19997, 20003)
+
+    def test_provider_should_require_item_count(self, ssd_display):
+        with pytest.raises(ValueError):
+            menu.TextListMenu(ssd_display, lambda index: str(index), virtual=True)
+
+
+class TestIncrementalDraw(object):
+
+    @pytest.fixture
+    def long_menu(self, ssd_display):
+        return menu.TextListMenu(ssd_display, ['item {0}'.format(i) for i in range(8)])
+
+    def rendered_items(self, long_menu, action):
+        with patch.object(long_menu.TextItem, 'get_packed_bitmap', autospec=True,
+                          side_effect=menu.TextItem.get_packed_bitmap.__func__) as render:
+            action()
+        return sorted(call[0][0].text for call in render.call_args_list)
+
+    def full_draw(self, ssd_display, long_menu):
+        fresh = menu.TextListMenu(ssd_display, long_menu.item_list)
+        fresh.selected_index = long_menu.selected_index
+        fresh.page_start_index = long_menu.page_start_index
+        fresh.draw()
+        return fresh._bitmap.bits
+
+    def test_should_draw_all_items_first(self, long_menu):
+        assert self.rendered_items(long_menu, long_menu.draw) == ['item 0', 'item 1']
+
+    def test_should_draw_two_items_when_selection_moves_in_page(self, ssd_display):
+        ssd_display.rows = 64
+        tall_menu = menu.TextListMenu(ssd_display, ['item {0}'.format(i) for i in range(8)])
+        tall_menu.draw()
+
+        assert self.rendered_items(tall_menu, tall_menu.next) == ['item 0', 'item 1']
+        assert self.rendered_items(tall_menu, tall_menu.next) == ['item 1', 'item 2']
+        assert tall_menu._bitmap.bits == self.full_draw(ssd_display, tall_menu)
+
+    def test_should_scroll_by_one_item(self, long_menu, ssd_display):
+        long_menu.draw()
+        long_menu.next()
+
+        assert self.rendered_items(long_menu, long_menu.next) == ['item 1', 'item 2']
+        assert long_menu._bitmap.bits == self.full_draw(ssd_display, long_menu)
+
+        assert self.rendered_items(long_menu, long_menu.prev) == ['item 1', 'item 2']
+        assert self.rendered_items(long_menu, long_menu.prev) == ['item 0', 'item 1']
+        assert long_menu._bitmap.bits == self.full_draw(ssd_display, long_menu)
+
+    def test_should_draw_all_items_after_jump(self, long_menu, ssd_display):
+        long_menu.draw()
+        long_menu.selected_index = 6
+
+        assert self.rendered_items(long_menu, long_menu.draw) == ['item 5', 'item 6']
+        assert long_menu._bitmap.bits == self.full_draw(ssd_display, long_menu)
+
+
+class TestHardwareScroll(object):
+
+    @pytest.fixture
+    def ring_menu(self, ssd_display):
+        ssd_display.GDDRAM_PAGES = 8
+        return menu.TextListMenu(ssd_display, ['item {0}'.format(i) for i in range(8)], hardware_scroll=True)
+
+    def visible_bits(self, ring_menu, rows):
+        ring = ring_menu._bitmap
+        return [[ring.get_pixel(x, (ring_menu._start_line + y) % ring.height) for x in range(ring.width)]
+                for y in range(rows)]
+
+    def test_should_move_start_line_instead_of_scrolling_framebuffer(self, ring_menu, ssd_display):
+        ring_menu.draw()
+        ring_menu.next()
+        ssd_display.display_block.reset_mock()
+        ring_menu.next()
+
+        ssd_display.set_start_line.assert_called_with(16)
+        rows = [call[0][1] for call in ssd_display.display_block.call_args_list]
+        assert rows == [16]
+
+    def test_should_show_same_pixels_as_software_scrolling(self, ring_menu, ssd_display):
+        software_menu = menu.TextListMenu(ssd_display, ring_menu.item_list)
+        ring_menu.draw()
+        software_menu.draw()
+
+        for action in ['next'] * 7 + ['prev'] * 7:
+            getattr(ring_menu, action)()
+            getattr(software_menu, action)()
+            software = software_menu._bitmap
+            expected = [[software.get_pixel(x, y) for x in range(software.width)] for y in range(software.height)]
+            assert self.visible_bits(ring_menu, software.height) == expected
+
+    def test_should_send_two_items_per_scroll_step(self):
+        display = emulator.EmulatedSSD1306(rows=32)
+        ring_menu = menu.TextListMenu(display, ['item {0}'.format(i) for i in range(8)], hardware_scroll=True)
+        ring_menu.draw()
+        ring_menu.next()
+
+        with display.record('next') as frames:
+            ring_menu.next()
+
+        # The exposed item goes to the display RAM rows below the screen and
+        # the previous selection is redrawn, each 16 rows by 128 columns
+        assert display.start_line == 16
+        assert display.last_frame_stats.sent_bytes == frames[0].data_bytes == 2 * 128 * 16 / 8
+
+    def test_should_require_display_ram_rows_off_screen(self):
+        display = emulator.EmulatedSSD1306(rows=64)
+
+        with pytest.raises(ValueError):
+            menu.TextListMenu(display, ['item {0}'.format(i) for i in range(8)], hardware_scroll=True)
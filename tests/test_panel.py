@@ -0,0 +1,127 @@
+import pytest
+from mock import MagicMock, patch
+
+from ssd1306extras import bitmap, panel, widget
+
+
+@pytest.fixture
+def ssd_display():
+    return MagicMock(rows=32, cols=128, GDDRAM_COLS=128)
+
+
+@pytest.fixture
+def text_widget():
+    text = widget.TextWidget(64, 16)
+    text.text = 'Long line of text'
+    return text
+
+
+class TestMarquee(object):
+
+    def test_should_send_text_once_and_scroll_its_pages(self, ssd_display, text_widget):
+        test_panel = panel.Panel(ssd_display)
+        test_panel.add_widget(text_widget, 0, 16)
+        test_panel.start_marquee(text_widget, frames=2)
+
+        block, row, col, col_count = ssd_display.display_block.call_args[0]
+        assert (row, col, col_count) == (16, 0, 128)
+        ssd_display.start_horizontal_scroll.assert_called_once_with(2, 3, 2, 'left')
+
+    def test_should_hold_draws_until_stopped(self, ssd_display, text_widget):
+        test_panel = panel.Panel(ssd_display)
+        test_panel.add_widget(text_widget, 0, 0)
+        test_panel.start_marquee(text_widget)
+        ssd_display.display_block.reset_mock()
+
+        test_panel.draw()
+        assert not ssd_display.display_block.called
+
+        test_panel.stop_marquee()
+        test_panel.draw()
+        ssd_display.stop_scroll.assert_called_once_with()
+        assert ssd_display.display_block.called
+
+    def test_should_require_page_aligned_widget(self, ssd_display, text_widget):
+        test_panel = panel.Panel(ssd_display)
+        test_panel.add_widget(text_widget, 0, 4)
+
+        with pytest.raises(ValueError):
+            test_panel.start_marquee(text_widget)
+
+    def test_should_require_widget_in_panel(self, ssd_display, text_widget):
+        with pytest.raises(ValueError):
+            panel.Panel(ssd_display).start_marquee(text_widget)
+
+
+class Block(object):
+    """Widget showing a filled block"""
+
+    def __init__(self, width, height):
+        self.version = 0
+        self.bitmap = bitmap.Bitmap(width, height)
+        self.bitmap.draw_rect(0, 0, width, height)
+
+
+class TestCompositor(object):
+
+    @pytest.fixture
+    def test_panel(self, ssd_display):
+        return panel.Panel(ssd_display, 32, 16)
+
+    def drawn(self, test_panel):
+        with patch.object(test_panel._bitmap, 'draw_bitmap', wraps=test_panel._bitmap.draw_bitmap) as draw:
+            test_panel.bitmap
+        return [call[0][0] for call in draw.call_args_list]
+
+    def pixels(self, test_panel):
+        result = test_panel.bitmap
+        return [[result.get_pixel(x, y) for x in range(result.width)] for y in range(result.height)]
+
+    def test_should_not_redraw_unchanged_widgets(self, test_panel):
+        progress = widget.ProgressWidget(32, 4)
+        test_panel.add_widget(progress, 0, 0)
+        test_panel.add_widget(Block(4, 4), 0, 8)
+        test_panel.bitmap
+
+        assert self.drawn(test_panel) == []
+
+        progress.percent = 0.5
+        assert self.drawn(test_panel) == [progress.bitmap]
+
+    def test_should_always_draw_widgets_without_version(self, test_panel):
+        legacy = MagicMock(bitmap=bitmap.Bitmap(4, 4), spec=['bitmap'])
+        test_panel.add_widget(legacy)
+        test_panel.bitmap
+
+        assert self.drawn(test_panel) == [legacy.bitmap]
+
+    def test_should_clear_area_left_by_moved_widget(self, test_panel):
+        block = Block(4, 4)
+        test_panel.add_widget(block, 0, 0)
+        test_panel.bitmap
+        test_panel.move_widget(block, 8, 4)
+
+        pixels = self.pixels(test_panel)
+        assert not any(pixels[0][:4])
+        assert all(pixels[4][8:12])
+
+    def test_should_redraw_widgets_under_cleared_area(self, test_panel):
+        under = Block(8, 8)
+        over = Block(4, 4)
+        test_panel.add_widget(under, 0, 0)
+        test_panel.add_widget(over, 6, 0)
+        test_panel.bitmap
+        test_panel.move_widget(over, 20, 0)
+
+        assert self.drawn(test_panel) == [under.bitmap, over.bitmap]
+        assert all(self.pixels(test_panel)[0][:8])
+
+    def test_should_clear_removed_widget(self, test_panel):
+        block = Block(4, 4)
+        test_panel.add_widget(block, 2, 2)
+        test_panel.bitmap
+        test_panel._bitmap.mark_clean()
+        test_panel.remove_widget(block)
+
+        assert not any(any(row) for row in self.pixels(test_panel))
+        assert test_panel._bitmap.dirty_spans() == [(0, 2, 6)]
@@ -0,0 +1,114 @@
+import pytest
+from mock import MagicMock
+
+from ssd1306extras import bitmap, emulator, panel, present, widget
+
+
+@pytest.fixture
+def ssd_display():
+    return MagicMock(rows=32, cols=128)
+
+
+@pytest.fixture
+def presenter(ssd_display):
+    return present.Presenter(ssd_display, bitmap.Bitmap(32, 16, bitmap.PAGE_LAYOUT), top=8, left=4)
+
+
+def sent_areas(ssd_display):
+    return [(row, col, block.cols, block.rows) for block, row, col, _ in
+            [call[0] for call in ssd_display.display_block.call_args_list]]
+
+
+class TestPresenter(object):
+
+    def test_should_send_first_frame_in_full(self, presenter, ssd_display):
+        presenter.present()
+
+        assert sent_areas(ssd_display) == [(8, 4, 32, 16)]
+
+    def test_should_send_only_changed_columns(self, presenter, ssd_display):
+        presenter.present()
+        ssd_display.display_block.reset_mock()
+
+        presenter.back.draw_rect(10, 9, 3, 1)
+        presenter.back.mark_dirty(0, 0, 32, 16)
+        presenter.present()
+
+        assert sent_areas(ssd_display) == [(16, 14, 3, 8)]
+
+    def test_should_skip_frame_identical_to_last(self, presenter, ssd_display):
+        presenter.present()
+        ssd_display.display_block.reset_mock()
+
+        presenter.back.draw_rect(0, 0, 4, 4)
+        presenter.back.clear_block(0, 0, 4, 4)
+        presenter.present()
+
+        assert not ssd_display.display_block.called
+        assert not presenter.back.is_dirty
+
+    def test_should_send_in_full_after_invalidating(self, presenter, ssd_display):
+        presenter.present()
+        presenter.invalidate()
+        ssd_display.display_block.reset_mock()
+        presenter.present()
+
+        assert sent_areas(ssd_display) == [(8, 4, 32, 16)]
+
+    def test_should_match_back_buffer(self, presenter, ssd_display):
+        presenter.back.draw_rect(3, 3, 20, 7)
+        presenter.present()
+        presenter.back.clear_block(5, 4, 2, 2)
+        presenter.present()
+
+        assert presenter.front.bits == presenter.back.bits
+
+    def test_should_require_page_layout(self, ssd_display):
+        with pytest.raises(ValueError):
+            present.Presenter(ssd_display, bitmap.Bitmap(8, 8))
+
+
+class TestPanelPresent(object):
+
+    def test_refresh_should_not_clear_display(self, ssd_display):
+        test_panel = panel.Panel(ssd_display)
+        test_panel.draw()
+        ssd_display.display_block.reset_mock()
+        test_panel.draw(refresh=True)
+
+        assert not ssd_display.clear_display.called
+        assert sent_areas(ssd_display) == [(0, 0, 128, 32)]
+
+    def test_single_buffer_refresh_should_clear_display(self, ssd_display):
+        test_panel = panel.Panel(ssd_display, double_buffer=False)
+        test_panel.draw(refresh=True)
+
+        assert ssd_display.clear_display.called
+
+    def test_refresh_should_restore_display_ram(self):
+        display = emulator.EmulatedSSD1306(rows=32, cols=128)
+        test_panel = panel.Panel(display)
+        progress = widget.ProgressWidget(64, 8)
+        test_panel.add_widget(progress, 0, 8)
+        progress.percent = 0.5
+        test_panel.draw()
+        drawn = bytearray(display.gddram)
+
+        display.gddram[:] = bytearray(len(display.gddram))
+        test_panel.draw(refresh=True)
+
+        assert display.gddram == drawn
+        assert display.last_frame_stats.sent_bytes == 512
+
+    def test_invalidate_should_resend_frame(self):
+        display = emulator.EmulatedSSD1306(rows=32, cols=128)
+        presenter = present.Presenter(display, bitmap.Bitmap(32, 16, bitmap.PAGE_LAYOUT))
+        presenter.back.draw_rect(3, 3, 20, 7)
+        presenter.present()
+        drawn = bytearray(display.gddram)
+
+        display.gddram[:] = bytearray(len(display.gddram))
+        presenter.invalidate()
+        presenter.present()
+
+        assert display.gddram == drawn
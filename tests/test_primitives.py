@@ -0,0 +1,177 @@
+import random
+
+import pytest
+
+from ssd1306extras import bitmap, primitives
+
+
+LAYOUTS = [bitmap.ROW_LAYOUT, bitmap.PAGE_LAYOUT]
+
+
+def pixels(bmap):
+    return set((x, y) for y in range(bmap.height) for x in range(bmap.width) if bmap.get_pixel(x, y))
+
+
+def reference_line(x0, y0, x1, y1):
+    """Per pixel line with the minor coordinate rounded half up"""
+    dx = x1 - x0
+    dy = y1 - y0
+    steps = max(abs(dx), abs(dy))
+    if not steps:
+        return set([(x0, y0)])
+
+    points = set()
+    for i in range(steps + 1):
+        if abs(dx) >= abs(dy):
+            x = x0 + (i if dx >= 0 else -i)
+            y = y0 + (1 if dy >= 0 else -1) * ((2 * i * abs(dy) + steps) // (2 * steps))
+        else:
+            y = y0 + (i if dy >= 0 else -i)
+            x = x0 + (1 if dx >= 0 else -1) * ((2 * i * abs(dx) + steps) // (2 * steps))
+        points.add((x, y))
+    return points
+
+
+def visible(points, width, height):
+    return set((x, y) for x, y in points if 0 <= x < width and 0 <= y < height)
+
+
+class TestLines(object):
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_should_match_reference_line(self, layout):
+        rand = random.Random(15)
+        for _ in range(200):
+            bmap = bitmap.Bitmap(40, 24, layout)
+            coords = [rand.randint(-5, 44), rand.randint(-5, 28), rand.randint(-5, 44), rand.randint(-5, 28)]
+            primitives.line(bmap, *coords)
+
+            assert pixels(bmap) == visible(reference_line(*coords), 40, 24), coords
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_polyline_should_join_points(self, layout):
+        bmap = bitmap.Bitmap(20, 20, layout)
+        points = [(0, 0), (10, 5), (10, 15), (2, 19)]
+        primitives.polyline(bmap, points)
+
+        expected = set()
+        for i in range(len(points) - 1):
+            expected |= reference_line(*(points[i] + points[i + 1]))
+        assert pixels(bmap) == expected
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_polyline_through_columns_should_join_points(self, layout):
+        rand = random.Random(64)
+        bmap = bitmap.Bitmap(48, 40, layout)
+        points = [(x, rand.randint(-4, 43)) for x in range(3, 45)]
+        primitives.polyline(bmap, points)
+
+        expected = set()
+        for i in range(len(points) - 1):
+            expected |= reference_line(*(points[i] + points[i + 1]))
+        assert pixels(bmap) == visible(expected, 48, 40)
+
+    def test_should_mark_area_dirty(self):
+        bmap = bitmap.Bitmap(32, 32, bitmap.PAGE_LAYOUT)
+        bmap.mark_clean()
+        primitives.line(bmap, 3, 2, 20, 12)
+
+        assert bmap.dirty_spans() == [(0, 3, 21), (1, 3, 21)]
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_chart_should_match_polyline(self, layout):
+        rand = random.Random(128)
+        values = [rand.random() for _ in range(64)]
+        charted = bitmap.Bitmap(64, 40, layout)
+        joined = bitmap.Bitmap(64, 40, layout)
+
+        primitives.chart(charted, values, y=4, height=32)
+        primitives.polyline(joined, [(i, 35 - int(round(value * 31))) for i, value in enumerate(values)])
+
+        assert pixels(charted) == pixels(joined)
+
+    def test_chart_should_draw_one_sample_per_column(self):
+        bmap = bitmap.Bitmap(8, 8)
+        primitives.chart(bmap, [0.0, 1.0, 0.5, 2.0])
+
+        assert set([(0, 7), (1, 0), (2, 3), (3, 0)]) <= pixels(bmap)
+        assert max(x for x, _ in pixels(bmap)) == 3
+
+
+class TestSpans(object):
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_should_draw_spans(self, layout):
+        bmap = bitmap.Bitmap(16, 20, layout)
+        primitives.hspans(bmap, [(2, 3, 5), (-2, 19, 4)])
+        primitives.vspans(bmap, [(15, 5, 10), (0, -3, 4)])
+
+        expected = set([(x, 3) for x in range(2, 7)] + [(x, 19) for x in range(2)] +
+                       [(15, y) for y in range(5, 15)] + [(0, 0)])
+        assert pixels(bmap) == expected
+
+    def test_should_clear_spans(self):
+        bmap = bitmap.Bitmap(8, 8)
+        bmap.draw_rect(0, 0, 8, 8)
+        primitives.hspans(bmap, [(0, 0, 8)], status=False)
+
+        assert not any(bmap.get_pixel(x, 0) for x in range(8))
+
+
+class TestCircles(object):
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_circle_should_be_symmetric(self, layout):
+        bmap = bitmap.Bitmap(21, 21, layout)
+        primitives.circle(bmap, 10, 10, 7)
+        drawn = pixels(bmap)
+
+        assert set([(17, 10), (3, 10), (10, 3), (10, 17)]) <= drawn
+        assert drawn == set((20 - x, y) for x, y in drawn) == set((x, 20 - y) for x, y in drawn)
+        assert drawn == set((y, x) for x, y in drawn)
+
+    def test_filled_circle_should_cover_outline(self):
+        outline = bitmap.Bitmap(21, 21)
+        filled = bitmap.Bitmap(21, 21)
+        primitives.circle(outline, 10, 10, 6)
+        primitives.circle(filled, 10, 10, 6, fill=True)
+
+        assert pixels(outline) < pixels(filled)
+        assert (10, 10) in pixels(filled)
+
+    def test_arc_should_draw_part_of_circle(self):
+        full = bitmap.Bitmap(21, 21)
+        quarter = bitmap.Bitmap(21, 21)
+        primitives.circle(full, 10, 10, 8)
+        primitives.arc(quarter, 10, 10, 8, 0, 90)
+
+        drawn = pixels(quarter)
+        assert drawn < pixels(full)
+        assert set([(18, 10), (10, 2)]) <= drawn
+        assert all(x >= 10 and y <= 10 for x, y in drawn)
+
+
+class TestPolygon(object):
+
+    @pytest.mark.parametrize('layout', LAYOUTS)
+    def test_should_fill_rectangle(self, layout):
+        bmap = bitmap.Bitmap(16, 16, layout)
+        primitives.polygon(bmap, [(2, 3), (9, 3), (9, 12), (2, 12)])
+
+        assert pixels(bmap) == set((x, y) for x in range(2, 10) for y in range(3, 13))
+
+    def test_should_fill_triangle_inside_outline(self):
+        bmap = bitmap.Bitmap(32, 32)
+        primitives.polygon(bmap, [(1, 1), (30, 5), (8, 28)])
+        drawn = pixels(bmap)
+
+        assert (12, 10) in drawn
+        assert (25, 25) not in drawn
+        assert reference_line(1, 1, 30, 5) <= drawn
+
+    def test_outline_only(self):
+        bmap = bitmap.Bitmap(16, 16)
+        primitives.polygon(bmap, [(2, 2), (12, 2), (12, 12), (2, 12)], fill=False)
+
+        assert (7, 7) not in pixels(bmap)
+        assert (12, 7) in pixels(bmap)
@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+from mock import MagicMock
+
+from ssd1306extras import panel, scheduler, widget
+
+
+class Clock(object):
+    """Clock that only moves when told to, or while drawing"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.draw_seconds = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingPanel(object):
+    """Panel stand-in counting draws and taking a set time to draw"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.draws = 0
+        self.needs_draw = False
+
+    def draw(self):
+        self.draws += 1
+        self.needs_draw = False
+        self.clock.now += self.clock.draw_seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def test_panel(clock):
+    return CountingPanel(clock)
+
+
+class TestFrameScheduler(object):
+
+    def test_should_draw_at_most_once_per_interval(self, clock, test_panel):
+        frame_scheduler = scheduler.FrameScheduler(test_panel, fps=10, clock=clock)
+
+        # 50 updates a second for one second
+        for _ in range(50):
+            frame_scheduler.invalidate()
+            frame_scheduler.tick()
+            clock.now += 0.02
+
+        assert test_panel.draws == 10
+        assert frame_scheduler.stats().invalidations == 50
+
+    def test_should_not_draw_without_changes(self, clock, test_panel):
+        frame_scheduler = scheduler.FrameScheduler(test_panel, fps=10, clock=clock)
+
+        assert not frame_scheduler.tick()
+        assert test_panel.draws == 0
+
+    def test_should_pick_up_widget_changes_without_invalidate(self, clock, test_panel):
+        frame_scheduler = scheduler.FrameScheduler(test_panel, fps=10, clock=clock)
+        test_panel.needs_draw = True
+
+        assert frame_scheduler.tick()
+        assert test_panel.draws == 1
+
+    def test_should_skip_frames_under_load(self, clock, test_panel):
+        timings = []
+        frame_scheduler = scheduler.FrameScheduler(test_panel, fps=10, clock=clock, on_frame=timings.append)
+        clock.draw_seconds = 0.25
+
+        frame_scheduler.invalidate()
+        frame_scheduler.tick()
+        frame_scheduler.invalidate()
+
+        # The frame overran the next two slots, so the third one is next
+        clock.now = 100.29
+        assert not frame_scheduler.tick()
+        clock.now = 100.3
+        assert frame_scheduler.tick()
+
+        stats = frame_scheduler.stats()
+        assert (stats.frames, stats.missed_deadlines, stats.skipped_frames) == (2, 2, 4)
+        assert stats.max_frame_seconds == pytest.approx(0.25)
+        assert [timing.skipped for timing in timings] == [2, 2]
+        assert timings[0].start == 100.0
+
+    def test_should_restart_schedule_after_idle(self, clock, test_panel):
+        frame_scheduler = scheduler.FrameScheduler(test_panel, fps=10, clock=clock)
+        frame_scheduler.invalidate()
+        frame_scheduler.tick()
+
+        clock.now += 5
+        frame_scheduler.invalidate()
+        frame_scheduler.tick()
+
+        assert frame_scheduler.stats().skipped_frames == 0
+        frame_scheduler.invalidate()
+        clock.now += 0.05
+        assert not frame_scheduler.tick()
+        clock.now += 0.05
+        assert frame_scheduler.tick()
+
+    def test_should_reject_bad_fps(self, test_panel):
+        with pytest.raises(ValueError):
+            scheduler.FrameScheduler(test_panel, fps=0)
+
+    def test_should_draw_from_thread(self):
+        ssd_display = MagicMock(rows=32, cols=128, GDDRAM_COLS=128)
+        test_panel = panel.Panel(ssd_display)
+        progress = widget.ProgressWidget(64, 8)
+        test_panel.add_widget(progress)
+
+        drawn = threading.Event()
+        frame_scheduler = scheduler.FrameScheduler(test_panel, fps=50, on_frame=lambda timing: drawn.set())
+        frame_scheduler.start()
+        try:
+            assert drawn.wait(5)
+            drawn.clear()
+
+            with frame_scheduler.lock:
+                progress.percent = 0.5
+            frame_scheduler.invalidate()
+            assert drawn.wait(5)
+        finally:
+            frame_scheduler.stop()
+
+        assert frame_scheduler.stats().frames >= 2
+
+
+class TestPanelNeedsDraw(object):
+
+    def test_should_follow_widget_versions(self):
+        test_panel = panel.Panel(MagicMock(rows=32, cols=128, GDDRAM_COLS=128))
+        progress = widget.ProgressWidget(64, 8)
+        test_panel.add_widget(progress)
+        assert test_panel.needs_draw
+
+        test_panel.draw()
+        assert not test_panel.needs_draw
+
+        progress.percent = 0.25
+        assert test_panel.needs_draw
+
+        test_panel.draw()
+        test_panel.move_widget(progress, 0, 8)
+        assert test_panel.needs_draw
@@ -0,0 +1,212 @@
+import pytest
+from mock import MagicMock, patch
+
+from ssd1306extras import ssd1306
+
+
+@pytest.fixture
+def ssd():
+    with patch.object(ssd1306.SSD1306, '__init__', return_value=None):
+        display = ssd1306.SSD1306()
+    display.cols = 128
+    display.rows = 32
+    display.command = MagicMock()
+    display.data = MagicMock()
+    return display
+
+
+def horiz_bitmap(cols, rows, data):
+    return ssd1306.SSD1306.Bitmap(cols, rows, list(data), ssd1306.SSD1306.MEMORY_MODE_HORIZ)
+
+
+def sent_data(ssd):
+    return [list(call[0][0]) for call in ssd.data.call_args_list]
+
+
+def sent_windows(ssd):
+    windows = []
+    for call in ssd.command.call_args_list:
+        args = call[0]
+        if args[0] == ssd.SET_PAGE_ADDRESS:
+            windows.append([args[1:]])
+        elif args[0] == ssd.SET_COL_ADDRESS:
+            windows[-1].append(args[1:])
+    return [tuple(window) for window in windows]
+
+
+class TestShadowDiffing(object):
+
+    def test_should_send_first_block_in_full(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 16, range(1, 9)), 0, 10, 4)
+
+        assert sent_windows(ssd) == [((0, 1), (10, 13))]
+        assert sent_data(ssd) == [range(1, 9)]
+        assert ssd.last_frame_stats == ssd1306.FrameStats(8, 8, 0, 1)
+
+    def test_should_skip_unchanged_block(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 16, range(1, 9)), 0, 10, 4)
+        ssd.data.reset_mock()
+        ssd.display_block(horiz_bitmap(4, 16, range(1, 9)), 0, 10, 4)
+
+        assert not ssd.data.called
+        assert ssd.last_frame_stats == ssd1306.FrameStats(8, 0, 8, 0)
+
+    def test_should_count_blocks_sent_in_frame_stats_as_one_frame(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 8, range(1, 5)), 0, 10, 4)
+
+        with ssd.frame_stats():
+            ssd.display_block(horiz_bitmap(4, 8, range(1, 5)), 0, 10, 4)
+            ssd.display_block(horiz_bitmap(4, 16, range(1, 9)), 8, 40, 4)
+            assert ssd.last_frame_stats == ssd1306.FrameStats(4, 4, 0, 1)
+
+        assert ssd.last_frame_stats == ssd1306.FrameStats(12, 8, 4, 1)
+
+    def test_should_send_changed_span(self, ssd):
+        ssd.display_block(horiz_bitmap(128, 8, [0] * 128), 0, 0, 128)
+        ssd.command.reset_mock()
+        ssd.data.reset_mock()
+
+        data = [0] * 128
+        data[40] = data[42] = 0xff
+        ssd.display_block(horiz_bitmap(128, 8, data), 0, 0, 128)
+
+        assert sent_windows(ssd) == [((0, 0), (40, 42))]
+        assert sent_data(ssd) == [[0xff, 0, 0xff]]
+        assert ssd.last_frame_stats.saved_bytes == 125
+
+    def test_should_split_spans_further_apart_than_merge_gap(self, ssd):
+        ssd.display_block(horiz_bitmap(128, 8, [0] * 128), 0, 0, 128)
+        ssd.command.reset_mock()
+
+        data = [0] * 128
+        data[10] = data[10 + ssd.merge_gap + 2] = 1
+        ssd.display_block(horiz_bitmap(128, 8, data), 0, 0, 128)
+
+        assert sent_windows(ssd) == [((0, 0), (10, 10)), ((0, 0), (18, 18))]
+
+    def test_should_merge_spans_up_to_merge_gap_apart(self, ssd):
+        ssd.display_block(horiz_bitmap(128, 8, [0] * 128), 0, 0, 128)
+        ssd.command.reset_mock()
+
+        data = [0] * 128
+        data[10] = data[10 + ssd.merge_gap + 1] = 1
+        ssd.display_block(horiz_bitmap(128, 8, data), 0, 0, 128)
+
+        assert sent_windows(ssd) == [((0, 0), (10, 17))]
+
+    def test_should_send_columns_not_yet_written(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 8, [0] * 4), 0, 20, 4)
+        ssd.command.reset_mock()
+
+        data = [0] * 12
+        data[2] = 1
+        ssd.display_block(horiz_bitmap(12, 8, data), 0, 20, 12)
+
+        assert sent_windows(ssd) == [((0, 0), (22, 31))]
+
+    def test_should_combine_pages_with_same_span(self, ssd):
+        ssd.display_block(horiz_bitmap(8, 16, [0] * 16), 0, 0, 8)
+        ssd.command.reset_mock()
+        ssd.data.reset_mock()
+
+        data = [0] * 16
+        data[2] = data[10] = 7
+        ssd.display_block(horiz_bitmap(8, 16, data), 0, 0, 8)
+
+        assert sent_windows(ssd) == [((0, 1), (2, 2))]
+        assert sent_data(ssd) == [[7, 7]]
+
+    def test_should_diff_vertical_mode_blocks(self, ssd):
+        ssd.display_block(horiz_bitmap(2, 16, [1, 2, 3, 4]), 0, 0, 2)
+        ssd.data.reset_mock()
+
+        vert_bitmap = ssd1306.SSD1306.Bitmap(2, 16, [1, 3, 2, 9], ssd.MEMORY_MODE_VERT)
+        ssd.display_block(vert_bitmap, 0, 0, 2)
+
+        assert sent_data(ssd) == [[9]]
+
+    def test_should_send_in_full_after_invalidating(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+        ssd.invalidate_shadow()
+        ssd.data.reset_mock()
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+
+        assert sent_data(ssd) == [range(4)]
+
+    def test_should_send_as_given_when_diffing_disabled(self, ssd):
+        ssd.diff_updates = False
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+
+        assert sent_data(ssd) == [range(4), range(4)]
+
+
+class TestDataTransfer(object):
+
+    def test_should_pass_whole_block_without_copying(self, ssd):
+        ssd.diff_updates = False
+        block = horiz_bitmap(4, 8, range(4))
+        block.data = bytearray(block.data)
+        ssd.display_block(block, 0, 0, 4)
+
+        assert ssd.data.call_args[0][0] is block.data
+
+    def test_should_split_writes_at_max_transfer(self, ssd):
+        ssd.diff_updates = False
+        ssd.max_transfer = 3
+        ssd.display_block(horiz_bitmap(8, 8, range(8)), 0, 0, 8)
+
+        assert sent_data(ssd) == [[0, 1, 2], [3, 4, 5], [6, 7]]
+
+    def test_should_split_diffed_windows_at_max_transfer(self, ssd):
+        ssd.max_transfer = 4
+        ssd.display_block(horiz_bitmap(3, 16, range(1, 7)), 0, 0, 3)
+
+        assert sent_data(ssd) == [[1, 2, 3, 4], [5, 6]]
+
+    def test_should_send_bytearrays(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+
+        assert isinstance(ssd.data.call_args[0][0], bytearray)
+
+
+class TestScrolling(object):
+
+    def commands(self, ssd):
+        return [call[0] for call in ssd.command.call_args_list]
+
+    def test_should_start_horizontal_scroll(self, ssd):
+        ssd.start_horizontal_scroll(2, 3, frames=2, direction=ssd.SCROLL_RIGHT)
+
+        assert self.commands(ssd) == [(ssd.DEACTIVATE_SCROLL,),
+                                      (ssd.RIGHT_HORIZ_SCROLL, 0x00, 2, 0x07, 3, 0x00, 0xFF),
+                                      (ssd.ACTIVATE_SCROLL,)]
+        assert ssd.scrolling
+
+    def test_should_start_diagonal_scroll(self, ssd):
+        ssd.start_diagonal_scroll(1, frames=5)
+
+        assert self.commands(ssd) == [(ssd.DEACTIVATE_SCROLL,),
+                                      (ssd.SET_VERTICAL_SCROLL_AREA, 0, 32),
+                                      (ssd.VERT_AND_LEFT_HORIZ_SCROLL, 0x00, 0, 0x00, 7, 1),
+                                      (ssd.ACTIVATE_SCROLL,)]
+
+    def test_should_reject_unknown_interval(self, ssd):
+        with pytest.raises(ValueError):
+            ssd.start_horizontal_scroll(frames=6)
+
+    def test_stop_should_invalidate_shadow(self, ssd):
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+        ssd.start_horizontal_scroll()
+        ssd.stop_scroll()
+        ssd.data.reset_mock()
+        ssd.display_block(horiz_bitmap(4, 8, range(4)), 0, 0, 4)
+
+        assert not ssd.scrolling
+        assert sent_data(ssd) == [range(4)]
+
+    def test_should_wrap_start_line(self, ssd):
+        ssd.set_start_line(70)
+
+        assert ssd.start_line == 6
+        assert self.commands(ssd) == [(ssd.SET_START_LINE | 6,)]
@@ -0,0 +1,186 @@
+import os.path
+
+import pytest
+from mock import patch
+
+from ssd1306extras import glyph, textcache
+from ssd1306extras.util import cache, text
+
+
+MONO_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSansMono-Bold.ttf'
+SANS_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+SERIF_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf'
+
+needs_mono_font = pytest.mark.skipif(not os.path.isfile(MONO_FONT), reason='DejaVu Sans Mono is not installed')
+needs_proportional_fonts = pytest.mark.skipif(not (os.path.isfile(SANS_FONT) and os.path.isfile(SERIF_FONT)),
+                                              reason='DejaVu Sans and Serif are not installed')
+
+
+@pytest.fixture
+def truetype():
+    text.clear_caches()
+    with patch.object(text.ImageFont, 'truetype') as truetype:
+        yield truetype
+    text.clear_caches()
+
+
+class TestLRUCache(object):
+
+    def test_should_create_value_once(self):
+        lru = cache.LRUCache(2)
+        values = [lru.get('a', lambda: object()) for _ in range(3)]
+
+        assert values[0] is values[1] is values[2]
+        assert lru.info() == cache.CacheInfo(hits=2, misses=1, evictions=0, entries=1, max_entries=2, size=0,
+                                            max_size=None)
+
+    def test_should_evict_least_recently_used(self):
+        lru = cache.LRUCache(2)
+        lru.get('a', lambda: 1)
+        lru.get('b', lambda: 2)
+        lru.get('a', lambda: 1)
+        lru.get('c', lambda: 3)
+
+        assert lru.get('a', lambda: None) == 1
+        assert lru.get('b', lambda: None) is None
+        assert lru.info().evictions == 2
+
+    def test_should_evict_when_shrunk(self):
+        lru = cache.LRUCache(3)
+        for key in 'abc':
+            lru.get(key, lambda: key)
+        lru.max_entries = 1
+
+        assert len(lru) == 1
+        assert lru.info().evictions == 2
+
+    def test_should_evict_over_size_budget(self):
+        lru = cache.LRUCache(max_size=10, sizeof=len)
+        lru.get('a', lambda: 'aaaa')
+        lru.get('b', lambda: 'bbbb')
+        lru.get('c', lambda: 'cccc')
+
+        assert lru.info().size == 8
+        assert lru.get('a', lambda: '') == ''
+
+
+class TestFontCache(object):
+
+    def test_should_load_font_once(self, truetype):
+        hits = text.cache_info().fonts.hits
+        text._create_font('font.ttf', 12)
+        text._create_font('font.ttf', 12)
+        text._create_font('font.ttf', 14)
+
+        assert truetype.call_count == 2
+        assert text.cache_info().fonts.hits == hits + 1
+
+    def test_should_memoize_top_margin(self, truetype):
+        hits = text.cache_info().margins.hits
+        with patch.object(text, '_find_top_margin', return_value=text.Margin(3, 0, 0, 0)) as find:
+            text.find_top_margin('font.ttf', 12, 16)
+            margin = text.find_top_margin('font.ttf', 12, 16)
+            text.find_top_margin('font.ttf', 12, 20)
+
+        assert margin.top == 3
+        assert find.call_count == 2
+        assert text.cache_info().margins.hits == hits + 1
+
+
+class TestRenderedTextCache(object):
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        textcache.clear_cache()
+
+    def test_should_render_through_pil_once(self):
+        with patch.object(text, 'image', wraps=text.image) as image:
+            first = textcache.render('OK', None, 14, 20, 16)
+            second = textcache.render('OK', None, 14, 20, 16)
+
+        assert first is second
+        assert image.call_count == 1
+
+    def test_should_match_pil_image(self):
+        rendered = textcache.render('Back', None, 14, 40, 16, margin=text.Margin(2, 0, 0, 3))
+        pixels = list(rendered.image.getdata())
+
+        assert any(pixels)
+        for i, pixel in enumerate(pixels):
+            assert rendered.bitmap.get_pixel(i % 40, i / 40) == bool(pixel)
+
+    def test_inverted_render_should_share_image(self):
+        rendered = textcache.render('OK', None, 14, 20, 16)
+        inverted = textcache.render('OK', None, 14, 20, 16, invert=True)
+
+        assert inverted.image is rendered.image
+        assert inverted.bitmap.bits == ~rendered.bitmap.bits
+
+    def test_should_evict_over_byte_budget(self):
+        textcache.set_cache_size(textcache.ENTRY_OVERHEAD * 3)
+        try:
+            for label in ['a', 'b', 'c', 'd']:
+                textcache.render(label, None, 14, 16, 16)
+            assert textcache.cache_info().entries < 4
+            assert textcache.cache_info().size <= textcache.ENTRY_OVERHEAD * 3
+        finally:
+            textcache.set_cache_size(textcache.DEFAULT_CACHE_SIZE)
+
+
+@needs_mono_font
+class TestGlyphAtlas(object):
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        glyph.clear_cache()
+
+    @pytest.mark.parametrize('size', [9, 12, 24])
+    @pytest.mark.parametrize('label', ['12:45:07 -3.2dB', 'Volume 100%', 'jgpq fi Wa', 'T.V. (x)[y]'])
+    def test_should_match_pil_image(self, label, size):
+        margin = text.Margin(1, 0, 0, 2)
+        image = text.image(label, MONO_FONT, size, 200, 32, margin=margin)
+        composed = glyph.render(label, MONO_FONT, size, 200, 32, margin=margin)
+
+        assert composed.bits.tolist() == [bool(pixel) for pixel in image.getdata()]
+
+    @needs_proportional_fonts
+    @pytest.mark.parametrize('font_file', [SANS_FONT, SERIF_FONT])
+    @pytest.mark.parametrize('size', [9, 12, 24])
+    @pytest.mark.parametrize('label', ['Volume 100%', 'AVATAR Tokyo', 'ffi yy LT', 'jgpq fi Wa', "$:m8I `'"])
+    def test_should_match_pil_image_for_proportional_font(self, font_file, label, size):
+        margin = text.Margin(1, 0, 0, 2)
+        image = text.image(label, font_file, size, 4, 32, expand=True, margin=margin)
+        composed = glyph.render(label, font_file, size, 4, 32, expand=True, margin=margin)
+
+        assert composed.width == image.size[0]
+        assert composed.bits.tolist() == [bool(pixel) for pixel in image.getdata()]
+
+    def test_should_invert(self):
+        plain = glyph.render('OK', MONO_FONT, 12, 20, 16)
+        inverted = glyph.render('OK', MONO_FONT, 12, 20, 16, invert=True)
+
+        assert inverted.bits == ~plain.bits
+
+    def test_should_expand_to_fit_text(self):
+        composed = glyph.render('Expanded', MONO_FONT, 12, 10, 16, expand=True, margin=text.Margin(0, 3, 0, 2))
+
+        assert composed.width == glyph.atlas(MONO_FONT, 12).text_width('Expanded') + 5
+
+    def test_should_rasterize_each_glyph_once(self):
+        glyph.render('1111', MONO_FONT, 12, 40, 16)
+        atlas = glyph.atlas(MONO_FONT, 12)
+        glyphs = len(atlas)
+
+        with patch.object(glyph.ImageDraw, 'Draw') as draw:
+            glyph.render('1111', MONO_FONT, 12, 40, 16)
+
+        assert not draw.called
+        assert len(atlas) == glyphs == 2
+
+    def test_should_share_atlas_per_font(self):
+        assert glyph.atlas(MONO_FONT, 12) is glyph.atlas(MONO_FONT, 12)
+        assert glyph.atlas(MONO_FONT, 12) is not glyph.atlas(MONO_FONT, 14)
+
+    def test_should_require_font_file(self):
+        with pytest.raises(ValueError):
+            glyph.atlas(None, 12)
@@ -0,0 +1,130 @@
+import contextlib
+import threading
+
+import pytest
+from mock import MagicMock
+
+from ssd1306extras import panel, transmit
+from ssd1306extras.ssd1306 import SSD1306
+
+
+class BlockedDisplay(object):
+    """Display whose first transfer waits until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.sent = []
+
+    def display_block(self, block, row, col, col_count):
+        self.started.set()
+        self.release.wait(5)
+        self.sent.append((row, col, block.cols, block.rows))
+
+    @contextlib.contextmanager
+    def frame_stats(self):
+        yield
+
+
+def block(cols, rows):
+    return SSD1306.Bitmap(cols, rows, mode=SSD1306.MEMORY_MODE_HORIZ)
+
+
+@pytest.fixture
+def display():
+    return BlockedDisplay()
+
+
+@pytest.fixture
+def transmitter(display):
+    transmitter = transmit.BackgroundTransmitter(display)
+    yield transmitter
+    display.release.set()
+    transmitter.stop()
+
+
+class TestBackgroundTransmitter(object):
+
+    def test_should_send_in_background(self, transmitter, display):
+        transmitter.submit([(block(8, 8), 0, 0)])
+        assert display.started.wait(5)
+        assert display.sent == []
+
+        display.release.set()
+        assert transmitter.flush(5)
+        assert display.sent == [(0, 0, 8, 8)]
+
+    def test_newer_frame_should_replace_covered_pending_frame(self, transmitter, display):
+        transmitter.submit([(block(8, 8), 0, 0)])
+        display.started.wait(5)
+
+        transmitter.submit([(block(8, 8), 8, 0)])
+        transmitter.submit([(block(16, 16), 8, 0)])
+        assert transmitter.queue_depth == 1
+
+        display.release.set()
+        transmitter.flush(5)
+
+        assert display.sent == [(0, 0, 8, 8), (8, 0, 16, 16)]
+        stats = transmitter.stats()
+        assert (stats.submitted, stats.sent, stats.dropped, stats.queue_depth) == (3, 2, 1, 0)
+
+    def test_should_keep_pending_blocks_newer_frame_does_not_cover(self, transmitter, display):
+        transmitter.submit([(block(8, 8), 0, 0)])
+        display.started.wait(5)
+
+        transmitter.submit([(block(8, 8), 8, 0), (block(8, 8), 8, 64)])
+        transmitter.submit([(block(8, 8), 8, 64)])
+
+        display.release.set()
+        transmitter.flush(5)
+
+        assert display.sent == [(0, 0, 8, 8), (8, 0, 8, 8), (8, 64, 8, 8)]
+        stats = transmitter.stats()
+        assert (stats.merged, stats.blocks_dropped) == (1, 1)
+
+    def test_should_count_each_replaced_frame_once(self, transmitter, display):
+        transmitter.submit([(block(8, 8), 0, 0)])
+        display.started.wait(5)
+
+        transmitter.submit([(block(8, 8), 8, 0), (block(8, 8), 8, 64)])
+        transmitter.submit([(block(8, 8), 8, 64)])
+        transmitter.submit([(block(128, 64), 0, 0)])
+        assert transmitter.queue_depth == 1
+
+        display.release.set()
+        transmitter.flush(5)
+
+        assert display.sent == [(0, 0, 8, 8), (0, 0, 128, 64)]
+        stats = transmitter.stats()
+        assert (stats.submitted, stats.sent, stats.dropped, stats.merged) == (4, 2, 1, 1)
+
+    def test_flush_should_time_out_while_busy(self, transmitter, display):
+        transmitter.submit([(block(8, 8), 0, 0)])
+        display.started.wait(5)
+
+        assert not transmitter.flush(0.01)
+
+    def test_should_raise_transmit_errors(self):
+        failing = MagicMock()
+        failing.display_block.side_effect = IOError('bus error')
+        transmitter = transmit.BackgroundTransmitter(failing)
+        try:
+            transmitter.submit([(block(8, 8), 0, 0)])
+            with pytest.raises(IOError):
+                transmitter.flush(5)
+        finally:
+            transmitter.stop()
+
+    def test_panel_should_submit_frames(self):
+        display = MagicMock(rows=32, cols=128)
+        transmitter = transmit.BackgroundTransmitter(display)
+        try:
+            test_panel = panel.Panel(display, 32, 16, top=8, left=4, transmitter=transmitter)
+            test_panel.draw()
+            transmitter.flush(5)
+        finally:
+            transmitter.stop()
+
+        sent_block, row, col, col_count = display.display_block.call_args[0]
+        assert (row, col, col_count, sent_block.rows) == (8, 4, 32, 16)
@@ -0,0 +1,203 @@
+import json
+
+import pytest
+from PIL import Image
+
+from ssd1306extras import widget
+
+
+@pytest.fixture
+def icon_file(tmpdir):
+    image = Image.new('1', (6, 8))
+    for x in range(6):
+        image.putpixel((x, x), 255)
+    path = str(tmpdir.join('icon.png'))
+    image.save(path)
+    return path
+
+
+@pytest.fixture
+def icons(icon_file):
+    icon_widget = widget.IconOptionWidget(24, 8)
+    for i in range(3):
+        icon_widget.add_icon(icon_file, 'icon {0}'.format(i), i, 'option {0}'.format(i))
+    return icon_widget
+
+
+@pytest.fixture
+def icon_sheet(tmpdir):
+    # Three 4x4 icons in a row, each with its index + 1 pixels set on the top row
+    image = Image.new('1', (12, 4))
+    for i in range(3):
+        for x in range(i + 1):
+            image.putpixel((i * 4 + x, 0), 255)
+    path = str(tmpdir.join('sheet.png'))
+    image.save(path)
+    return path
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTextWidget(object):
+
+    def test_should_not_share_bitmap_with_other_widgets(self):
+        first = widget.TextWidget(64, 16)
+        second = widget.TextWidget(64, 16)
+        first.text = second.text = 'shared'
+        expected = second.bitmap.bits.copy()
+
+        first.bitmap.invert()
+        second.text = 'other'
+        second.text = 'shared'
+
+        assert second.bitmap.bits == expected
+
+
+class TestProgressWidget(object):
+
+    def test_should_only_change_columns_between_old_and_new_width(self):
+        progress = widget.ProgressWidget(100, 8)
+        progress.percent = 0.5
+        progress.bitmap.mark_clean()
+
+        progress.percent = 0.75
+        assert progress.dirty_columns == (50, 75)
+        assert progress.bitmap.dirty_spans() == [(0, 50, 75)]
+
+        progress.bitmap.mark_clean()
+        progress.percent = 0.25
+        assert progress.dirty_columns == (25, 75)
+        assert progress.bitmap.dirty_spans() == [(0, 25, 75)]
+        assert [progress.bitmap.get_pixel(x, 4) for x in (24, 25)] == [True, False]
+
+    def test_should_skip_changes_within_a_column(self):
+        progress = widget.ProgressWidget(100, 8)
+        progress.percent = 0.5
+        version = progress.version
+
+        progress.percent = 0.505
+        assert progress.version == version
+
+    def test_should_merge_changes_arriving_faster_than_min_interval(self):
+        clock = Clock()
+        progress = widget.ProgressWidget(100, 8, min_interval=0.1, clock=clock)
+        progress.percent = 0.1
+        version = progress.version
+
+        clock.now += 0.05
+        progress.percent = 0.2
+        progress.percent = 0.3
+        assert progress.version == version
+
+        clock.now += 0.05
+        assert progress.version == version + 1
+        assert progress.dirty_columns == (10, 30)
+
+    def test_should_flush_merged_change(self):
+        clock = Clock()
+        progress = widget.ProgressWidget(100, 8, min_interval=1.0, clock=clock)
+        progress.percent = 0.1
+        progress.percent = 1.0
+        progress.flush()
+
+        assert progress.bitmap.get_pixel(99, 0)
+
+
+class TestIconOptionWidget(object):
+
+    def test_should_draw_selected_icon_inverted(self, icons):
+        icons.select_first()
+        icons.select_next()
+        result = icons.bitmap
+
+        icon = icons._icons[1]
+        for y in range(8):
+            for x in range(6):
+                assert result.get_pixel(x, y) == icon.bitmap.get_pixel(x, y)
+                assert result.get_pixel(6 + x, y) == icon.selected_bitmap.get_pixel(x, y)
+
+    def test_should_not_redraw_unchanged_icons(self, icons):
+        icons.select_first()
+        icons.bitmap.mark_clean()
+
+        assert not icons.bitmap.is_dirty
+
+    def test_should_cut_icons_from_sheet(self, icon_sheet):
+        icons = widget.IconOptionWidget(24, 4)
+        icons.add_icon_sheet(icon_sheet, {'icon_width': 4, 'icon_height': 4,
+                                          'icons': [{'id': 'a'}, {'id': 'b', 'label': 'B'},
+                                                    {'id': 'c', 'x': 8, 'y': 0, 'width': 3, 'height': 2}]})
+
+        assert [icon.id for icon in icons._icons] == ['a', 'b', 'c']
+        assert icons._find_icon('b').label == 'B'
+        assert icons._find_icon('c').bitmap.width == 3
+        for i, icon in enumerate(icons._icons):
+            assert [icon.bitmap.get_pixel(x, 0) for x in range(3)] == [x <= i for x in range(3)]
+
+    def test_should_load_manifest_file(self, icon_sheet, tmpdir):
+        manifest = str(tmpdir.join('sheet.json'))
+        with open(manifest, 'w') as manifest_file:
+            json.dump({'icon_width': 4, 'icon_height': 4,
+                       'icons': [{'id': 'a', 'option': 'first'}, {'id': 'b', 'option': 'second'}]}, manifest_file)
+
+        icons = widget.IconOptionWidget(24, 4)
+        icons.add_icon_sheet(icon_sheet, manifest)
+
+        assert icons._find_icon('b').option == 'second'
+
+    def test_should_select_by_id(self, icons):
+        assert icons.select_id(2) == 'icon 2'
+        assert icons.find_selected() == 2
+
+        assert icons.select_id('missing') is None
+        assert icons.find_selected() is None
+        assert not any(icon.selected for icon in icons._icons)
+
+    def test_should_raise_for_missing_icon(self, icons):
+        with pytest.raises(KeyError):
+            icons.disable_icon('missing')
+
+    def test_should_only_redraw_changed_selection(self, icons):
+        icons.select_first()
+        icons.bitmap.mark_clean()
+        icons.select_next()
+
+        assert icons.bitmap.dirty_spans() == [(0, 0, 12)]
+
+    def test_should_scroll_selected_icon_into_view(self, icon_file):
+        icons = widget.IconOptionWidget(12, 8)
+        for i in range(4):
+            icons.add_icon(icon_file, 'icon {0}'.format(i), i, None)
+
+        icons.select_id(3)
+        result = icons.bitmap
+
+        assert icons.offset == 12
+        icon = icons._icons[3]
+        for y in range(8):
+            for x in range(6):
+                assert result.get_pixel(6 + x, y) == icon.selected_bitmap.get_pixel(x, y)
+
+    def test_should_skip_icons_outside_viewport(self, icon_file):
+        icons = widget.IconOptionWidget(12, 8)
+        for i in range(4):
+            icons.add_icon(icon_file, 'icon {0}'.format(i), i, None)
+        drawn = []
+        draw_icon = icons._draw_icon
+        icons._draw_icon = lambda icon, x, y: drawn.append(icon.id) or draw_icon(icon, x, y)
+
+        icons.select_first()
+        icons.bitmap
+        assert drawn == [0, 1]
+
+        del drawn[:]
+        icons.select_next()
+        icons.bitmap
+        assert sorted(drawn) == [0, 1]